@@ -1,8 +1,9 @@
 # app/api/aggregate_detail_data.py
+import pandas as pd
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
 from app.services import get_data
-from app.services.get_data import get_aggregate_data, KPICode
+from app.services.get_data import get_aggregate_data, get_aggregate_trend_data, KPICode
 from app.core.deps import get_db
 
 router = APIRouter(tags=["aggregate_detail_data"])
@@ -36,3 +37,48 @@ def get_aggregate_detail_data(
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/aggregate-detail-data/{kpi_code}/trend")
+def get_aggregate_detail_trend(
+    kpi_code: KPICode,
+    aggregate_level: str = Query(..., description="Aggregate level"),
+    dates: list[str] = Query(..., description="Dates to compare (repeat the param, at least 2)"),
+    isp: str = Query(..., description="ISP"),
+    account_login_vqt: str = Query(..., description="Account login VQT"),
+    db: Session = Depends(get_db)
+):
+    if len(dates) > 53:
+        raise HTTPException(status_code=422, detail="At most 53 dates are allowed")
+    # Chuẩn hoá về ngày trước khi kiểm tra trùng: '2026-01-05' và '2026-01-05 10:00' là cùng 1 mốc
+    normalized = set()
+    for d in dates:
+        try:
+            ts = pd.Timestamp(d)
+        except (ValueError, TypeError):
+            ts = pd.NaT
+        if pd.isna(ts):
+            raise HTTPException(status_code=422, detail=f"Invalid date: {d!r}")
+        normalized.add(ts.normalize())
+    if len(normalized) < 2:
+        raise HTTPException(status_code=422, detail="At least 2 distinct dates are required")
+
+    try:
+        periods, result = get_aggregate_trend_data(
+            kpi_code=kpi_code,
+            aggregate_level=aggregate_level,
+            dates=[f"{p:%Y-%m-%d}" for p in sorted(normalized)],
+            isp=isp,
+            account_login_vqt=account_login_vqt,
+            db=db
+        )
+
+        return {
+            "success": True,
+            "periods": periods,
+            "total": len(result),
+            "data": result
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from app.core.deps import get_db, get_db_sqlite
+from app.core.pagination import decode_cursor, keyset_clause, keyset_order, ndjson_response, paginate, wants_ndjson
+from app.core.single_flight import query_flight, query_key
 import traceback
 from datetime import datetime, timedelta
 
@@ -9,34 +11,48 @@ router = APIRouter(tags=["ping"])
 
 @router.get("/ping")
 def get_data(
+        request: Request,
         aggregate_level: str = Query(..., description="Aggregate level"),
         kpi_code: str = Query(..., description="KPI Code"),
         account_login_vqt: str = Query(..., description="Account login VQT"),
         server_name: str = Query (..., description="Server name" ),
         duration: int = Query(1, ge=1, le=90, description="Duration"),
+        limit: int | None = Query(None, ge=1, le=10000, description="Page size (keyset pagination)"),
+        cursor: str | None = Query(None, description="next_cursor from the previous page"),
         db: Session = Depends(get_db_sqlite)
     ):
     kpi_code = 'mean_' + kpi_code
+    cursor_params = decode_cursor(cursor) if cursor else {}
     try:
         # Tính toán thời gian bằng Python (Portable & Safe)
         from_time = datetime.now() - timedelta(days=duration)
-        sql = text("""
+        sql = text(f"""
                     SELECT *
                     FROM ping_anomaly_zscore
                     WHERE server_name = :server_name
                     AND testing_time >= :from_time   
                     AND aggregate_level = :aggregate_level
                     AND account_login_vqt LIKE :account_login_vqt
-                    ORDER BY testing_time DESC;""")
-        result = db.execute(sql, {
+                    {keyset_clause(descending=True) if cursor else ""}
+                    {keyset_order(descending=True)}
+                    {"LIMIT :limit" if limit else ""};""")
+        params = {
             "from_time": from_time,
             "aggregate_level": aggregate_level,
             "account_login_vqt": f"{account_login_vqt}_Agent%",
-            "server_name": server_name
-        }).mappings().all()
+            "server_name": server_name,
+            **cursor_params,
+        }
+        if limit:
+            params["limit"] = limit + 1
+        if wants_ndjson(request):
+            return ndjson_response(db, sql, params)
+
+        result, next_cursor = paginate(db.execute(sql, params).mappings().all(), limit)
         return {
             "success": True,
             "total": len(result),
+            "next_cursor": next_cursor,
             "data": result
         }
     except Exception as e:
@@ -64,10 +80,14 @@ def get_server_list(
             ORDER BY server_name ASC
         """)
         
-        result = db.execute(sql, {
-            "from_time": from_time,
-            "account_login_vqt": f"{account_login_vqt}_Agent%",
-        }).scalars().all()
+        # Key theo tham số request (from_time lệch nhau vài ms giữa các request đồng thời)
+        result = query_flight.do(
+            query_key("metadata_servers", {"duration": duration, "account_login_vqt": account_login_vqt}),
+            lambda: db.execute(sql, {
+                "from_time": from_time,
+                "account_login_vqt": f"{account_login_vqt}_Agent%",
+            }).scalars().all(),
+        )
         
         return {
             "success": True,
@@ -3,8 +3,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
-from app.core.deps import get_db
+from app.core.deps import get_db, get_llm, get_tool_registry
 from app.core.llm.agent import ChatAgent
+from app.core.llm.client import LLMRegistry
+from app.core.llm.tools.registry import ToolRegistry
+from app.core.sse import sse_response
 
 router = APIRouter(tags=["Chat-Assistant"])
 
@@ -13,7 +16,12 @@ class ChatRequest(BaseModel):
     session_id: str | None = Field(None, description="Session ID to maintain chat context (optional)")
 
 @router.post("/chat")
-def chat_assistant(payload: ChatRequest, db: Session = Depends(get_db)):
+def chat_assistant(
+    payload: ChatRequest,
+    db: Session = Depends(get_db),
+    llm: LLMRegistry = Depends(get_llm),
+    tools: ToolRegistry = Depends(get_tool_registry),
+):
     """
     Endpoint chat với AI Assistant.
     - Tự động quản lý lịch sử chat (File/Redis).
@@ -26,7 +34,7 @@ def chat_assistant(payload: ChatRequest, db: Session = Depends(get_db)):
             session_id = str(uuid.uuid4())
 
         # 2. Init Agent
-        agent = ChatAgent(session_id=session_id, db=db)
+        agent = ChatAgent(session_id=session_id, db=db, llm=llm, tools=tools)
         
         # 3. Process
         answer = agent.chat(payload.message)
@@ -36,3 +44,27 @@ def chat_assistant(payload: ChatRequest, db: Session = Depends(get_db)):
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/chat/stream")
+def chat_assistant_stream(
+    payload: ChatRequest,
+    db: Session = Depends(get_db),
+    llm: LLMRegistry = Depends(get_llm),
+    tools: ToolRegistry = Depends(get_tool_registry),
+):
+    """
+    Giống /chat nhưng trả về server-sent events: `session`, `tool_call` / `tool_result`,
+    nhiều `token` và cuối cùng là `done` (câu trả lời đầy đủ) hoặc `error`.
+    """
+    session_id = payload.session_id or str(uuid.uuid4())
+    bind = db.get_bind()
+
+    def events():
+        # Session riêng cho tool: session của request đã đóng khi response bắt đầu stream
+        with Session(bind=bind) as stream_db:
+            agent = ChatAgent(session_id=session_id, db=stream_db, llm=llm, tools=tools)
+            yield {"event": "session", "data": {"session_id": session_id}}
+            yield from agent.chat_stream(payload.message)
+
+    return sse_response(events())
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from app.core.deps import get_db
+from app.core.result_cache import result_cache
+from app.core.single_flight import query_flight
 
 router = APIRouter(tags=["health"])
 
@@ -15,3 +17,12 @@ def readyz(db: Session = Depends(get_db)):
         return {"status": "ready"}
     except Exception as e:
         raise HTTPException(status_code=503, detail="Database not ready")
+
+
+@router.get("/query-stats")
+def query_stats():
+    """Số query thực sự chạy / được gộp (single-flight) và hit / miss của result cache."""
+    return {
+        "single_flight": query_flight.stats(),
+        "result_cache": {"hits": result_cache.hits, "misses": result_cache.misses},
+    }
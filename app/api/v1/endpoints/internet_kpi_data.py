@@ -3,7 +3,12 @@ from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
 from app.core.deps import get_db
-from app.services.get_kpi_data import get_internet_kpi_data, get_internet_kpi_change_data, AggregateLevel
+from app.services.get_kpi_data import (
+    get_internet_kpi_data,
+    get_internet_kpi_batch_data,
+    get_internet_kpi_change_data,
+    AggregateLevel,
+)
 
 router = APIRouter(tags=["internet_kpi_data"])
 
@@ -41,6 +46,39 @@ def get_internet_kpi(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/internet-kpi/{aggregate_level}/batch")
+def get_internet_kpi_batch(
+    aggregate_level: AggregateLevel,
+    kpi_code: list[str] = Query(..., max_length=12, description="KPI codes (repeat the param)"),
+    location_level: list[str] = Query(..., max_length=5, description="Location levels (repeat the param)"),
+    duration: int = Query(8, ge=1, le=48, description="Duration"),
+    db: Session = Depends(get_db),
+    time_limit: str | None = Query(
+        None, description="Date and hour (YYYY-MM-DD-HH)"
+    )
+):
+    try:
+        # 1 query (= ANY) cho tất cả kpi_code x location_level thay vì 1 request / KPI
+        result = get_internet_kpi_batch_data(
+            aggregate_level=aggregate_level,
+            kpi_codes=kpi_code,
+            location_levels=location_level,
+            duration=duration,
+            db=db,
+            time_limit=time_limit
+        )
+
+        return {
+            "success": True,
+            "aggregate_level": aggregate_level,
+            "total": sum(len(rows) for levels in result.values() for rows in levels.values()),
+            "data": result
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/internet-kpi/{aggregate_level}/change")
 def get_internet_kpi_change(
     aggregate_level: AggregateLevel,
@@ -1,43 +1,79 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from app.core.deps import get_db
+from app.core.pagination import decode_cursor, keyset_clause, keyset_order, ndjson_response, paginate, wants_ndjson
+from app.services.downsample import DownsampleMethod, downsample_indices
+from app.services.kpi_catalog import get_kpi
 import logging
 
+import numpy as np
+import pandas as pd
+
 router = APIRouter(tags=["log_aggregate_data"])
 logger = logging.getLogger(__name__)
 
+
+def downsample_rows(rows, value_col: str, max_points: int, method: DownsampleMethod) -> list[dict]:
+    """Downsample riêng từng account_login_vqt (mỗi agent là 1 đường trên chart), giữ thứ tự thời gian."""
+    if not rows:
+        return []
+    df = pd.DataFrame(rows)
+    kept = []
+    for _, group in df.groupby("account_login_vqt", sort=True):
+        x = group["testing_time"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        y = pd.to_numeric(group[value_col], errors="coerce").to_numpy(dtype=float)
+        kept.append(group.iloc[downsample_indices(x, y, max_points, method)])
+    out = pd.concat(kept).sort_values(["testing_time", "account_login_vqt"], kind="stable")
+    out[value_col] = out[value_col].astype(float)
+    return out.to_dict("records")
+
 @router.get("/log-aggregate-data")
 def get_internet_kpi(
+    request: Request,
     aggregate_level: str = Query(..., description="Aggregate level"),
     kpi_code: str = Query(..., description="KPI code"),
     account_login_vqt: str = Query(..., description="Account login VQT"),
     server_name: str = Query(..., description="Server name"),
+    server: str | None = Query(
+        None, description="Optional filter on the KPI's own server column (dns_server_isp, server_info, request_url)"
+    ),
     duration: int = Query(1, ge=1, le=90, description="Duration"),
+    max_points: int | None = Query(
+        None, ge=10, le=5000, description="Downsample each series to at most this many points"
+    ),
+    method: DownsampleMethod = Query("lttb", description="Downsampling method: lttb or minmax"),
+    limit: int | None = Query(None, ge=1, le=10000, description="Page size (keyset pagination)"),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
     db: Session = Depends(get_db)
 ):
-    table_map = {
-        "average_latency": "log_data_aggregate.ping_results_aggregate",
-        "jitter": "log_data_aggregate.ping_results_aggregate",
-        "packet_loss_rate": "log_data_aggregate.ping_results_aggregate",
-        "dns_time": "log_data_aggregate.dns_results_aggregate",
-        "data_downloading": "log_data_aggregate.dlul_results_aggregate",
-        "web_browsing": "log_data_aggregate.web_results_size_load_aggregate",
-    }
-
-    table = table_map.get(kpi_code)
-    if not table:
+    try:
+        spec = get_kpi(kpi_code)
+    except KeyError:
         raise HTTPException(status_code=400, detail=f"Unsupported kpi_code: {kpi_code}")
 
+    # Chỉ lấy cột thời gian / agent / server + cột giá trị của KPI thay vì SELECT *
+    value_col = spec.value_column
+    # Downsample cần cả chuỗi -> không phân trang / stream được
+    if max_points and (limit or cursor or wants_ndjson(request)):
+        raise HTTPException(
+            status_code=422, detail="max_points cannot be combined with limit, cursor or NDJSON streaming"
+        )
+    keyset_cols = spec.keyset_columns
+    cursor_params = decode_cursor(cursor, keyset_cols) if cursor else {}
+
     try:
         sql = text(f"""
-            SELECT *
-            FROM {table}
+            SELECT {spec.columns("server_name")}
+            FROM {spec.table}
             WHERE testing_time >= NOW() - (:duration || ' days')::interval
               AND account_login_vqt LIKE :account_login_vqt
               AND server_name = :server_name
+              {f"AND {spec.server_column} = :server" if server else ""}
               AND aggregate_level = :aggregate_level
-            ORDER BY testing_time
+              {keyset_clause(cols=keyset_cols) if cursor else ""}
+            {keyset_order(cols=keyset_cols)}
+            {"LIMIT :limit" if limit else ""}
         """)
 
         params = {
@@ -45,13 +81,24 @@ def get_internet_kpi(
             "aggregate_level": aggregate_level,
             "account_login_vqt": f"{account_login_vqt}_Agent%",
             "server_name": server_name,
+            **({"server": server} if server else {}),
+            **cursor_params,
         }
+        if limit:
+            params["limit"] = limit + 1
+        if wants_ndjson(request):
+            return ndjson_response(db, sql, params)
+
         result = db.execute(sql, params).mappings().all()
+        if max_points:
+            result = downsample_rows(result, value_col, max_points, method)
+        result, next_cursor = paginate(result, limit, keyset_cols)
 
         return {
             "success": True,
             "aggregate_level": aggregate_level,
             "total": len(result),
+            "next_cursor": next_cursor,
             "data": result
         }
 
@@ -1,28 +1,50 @@
-from openai import OpenAI
-import os
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
-from app.core.deps import get_db
+from app.core.deps import get_db, get_llm
+from app.core.llm.client import LLMRegistry
+from app.core.sse import sse_response
 from app.services.get_kpi_data import get_internet_kpi_data, get_internet_kpi_change_data, AggregateLevel
 from app.services.promt_summay import promt_internet_kpi_general, promt_kpi_change
-from dotenv import load_dotenv
 
-# Load your API key from .env file
-load_dotenv()
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-if not OPENROUTER_API_KEY:
-    raise RuntimeError("Missing OPENROUTER_API_KEY")
+# LLM client dùng chung được tạo trong lifespan (app/main.py); đổi endpoint / model qua
+# OPENROUTER_BASE_URL, OPENROUTER_SUMMARY_MODEL (vd: Ollama http://<host>:11434/v1)
+router = APIRouter(tags=["Summary-Assistant"])
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=OPENROUTER_API_KEY,
-)
+SYSTEM_PROMPT = "Bạn là chuyên gia phân tích dữ liệu trong lĩnh vực hệ thống mạng."
+
+
+def build_summary_prompt(
+    aggregate_level: AggregateLevel,
+    isp: str,
+    kpi_code: str,
+    date_hour: str,
+    db: Session,
+) -> str:
+    # Get KPI data
+    result_general = get_internet_kpi_data(
+        aggregate_level=aggregate_level,
+        kpi_code=kpi_code,
+        location_level="network",
+        duration=8,
+        db=db,
+        time_limit=date_hour,
+    )
+
+    # Get KPI change data
+    result_change = get_internet_kpi_change_data(
+        aggregate_level=aggregate_level,
+        isp=isp,
+        kpi_code=kpi_code,
+        date_hour=date_hour,
+        db=db
+    )
+    # Create the prompt (theo tuần hoặc theo ngày tùy aggregate_level)
+    promt_general = "Bối cảnh chung về 3 nhà mạng:\n" + promt_internet_kpi_general(
+        result_general[0:24], aggregate_level
+    )
+    promt_change = promt_kpi_change(result_change, kpi_code, isp, aggregate_level)
+    return promt_general + promt_change
 
-# client = OpenAI(
-#     base_url="http://171.225.223.209:11434/v1",
-#     api_key="ollama"
-# )
-router = APIRouter(tags=["Summary-Assistant"])
 
 @router.get("/summary-assistant/{aggregate_level}")
 def summary_internet_kpi(
@@ -30,38 +52,16 @@ def summary_internet_kpi(
     isp: str = Query(..., description="ISP"),
     kpi_code: str = Query(..., description="KPI code"),
     date_hour: str = Query(..., description="Date and hour"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    llm: LLMRegistry = Depends(get_llm)
 ):
     try:
-        # Get KPI data
-        result_general = get_internet_kpi_data(
-            aggregate_level=aggregate_level,
-            kpi_code=kpi_code,
-            location_level="network",
-            duration=8,
-            db=db,
-            time_limit=date_hour,
-        )
-
-        # Get KPI change data
-        result_change = get_internet_kpi_change_data(
-            aggregate_level=aggregate_level,
-            isp=isp,
-            kpi_code=kpi_code,
-            date_hour=date_hour,
-            db=db
-        )
-        # Create the prompt (theo tuần hoặc theo ngày tùy aggregate_level)
-        promt_general = "Bối cảnh chung về 3 nhà mạng:\n" + promt_internet_kpi_general(
-            result_general[0:24], aggregate_level
-        )
-        promt_change = promt_kpi_change(result_change, kpi_code, isp, aggregate_level)
-        promt_result = promt_general + promt_change
+        promt_result = build_summary_prompt(aggregate_level, isp, kpi_code, date_hour, db)
         # Call OpenRouter's model
-        response = client.chat.completions.create(
-            model="arcee-ai/trinity-large-preview:free",
+        response = llm.client.chat.completions.create(
+            model=llm.summary_model,
             messages=[
-                {"role": "system", "content": "Bạn là chuyên gia phân tích dữ liệu trong lĩnh vực hệ thống mạng."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": promt_result},
             ],
         )
@@ -71,3 +71,44 @@ def summary_internet_kpi(
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/summary-assistant/{aggregate_level}/stream")
+def summary_internet_kpi_stream(
+    aggregate_level: AggregateLevel,
+    isp: str = Query(..., description="ISP"),
+    kpi_code: str = Query(..., description="KPI code"),
+    date_hour: str = Query(..., description="Date and hour"),
+    db: Session = Depends(get_db),
+    llm: LLMRegistry = Depends(get_llm)
+):
+    """
+    SSE: `prompt` -> nhiều `token` (text model sinh ra) -> `done` (toàn bộ câu trả lời) hoặc `error`.
+    Dữ liệu KPI được query xong trước khi stream (dùng session của request).
+    """
+    try:
+        promt_result = build_summary_prompt(aggregate_level, isp, kpi_code, date_hour, db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    def events():
+        yield {"event": "prompt", "data": {"promt_result": promt_result}}
+        try:
+            stream = llm.client.chat.completions.create(
+                model=llm.summary_model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": promt_result},
+                ],
+                stream=True,
+            )
+            parts = []
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield {"event": "token", "data": {"text": chunk.choices[0].delta.content}}
+            yield {"event": "done", "data": {"data": "".join(parts)}}
+        except Exception as e:
+            yield {"event": "error", "data": {"detail": str(e)}}
+
+    return sse_response(events())
@@ -14,6 +14,54 @@ class Settings(BaseSettings):
     DB_PASSWORD: str | None = None
 
     OPENROUTER_API_KEY: str | None = None
+    OPENROUTER_BASE_URL: str = "https://openrouter.ai/api/v1"
+    OPENROUTER_CHAT_MODEL: str = "arcee-ai/trinity-large-preview:free"
+    OPENROUTER_SUMMARY_MODEL: str = "arcee-ai/trinity-large-preview:free"
+    # HTTP client dùng chung cho LLM (keep-alive pool, xem app/core/llm/client.py)
+    LLM_TIMEOUT_SECONDS: float = 120
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 10
+    LLM_MAX_CONNECTIONS: int = 50
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_MAX_RETRIES: int = 2
+
+    # Số process dùng cho anomaly detection (1 = chạy serial)
+    DETECTION_WORKERS: int = 1
+    # "pandas" hoặc "sql" (z-score tính bằng window function trên Postgres)
+    DETECTION_BACKEND: str = "pandas"
+
+    # Cache Parquet các ngày đã đóng của ping_results_aggregate (đường dẫn tương đối tính từ project root)
+    PING_CACHE_ENABLED: bool = True
+    PING_CACHE_DIR: str = ".cache/ping_results"
+    # Ngày chỉ được coi là đã đóng sau khi kết thúc ít nhất từng này giờ (chờ job aggregate)
+    PING_CACHE_SETTLE_HOURS: int = 2
+    # Dòng đến muộn: chỉ `PING_CACHE_REVALIDATE_DAYS` ngày đã đóng gần nhất được so số dòng với Postgres
+    # (1 query GROUP BY ngày trên đúng các ngày đó) và ghi lại nếu lệch. Ngày cũ hơn coi như bất biến; sửa
+    # dữ liệu cũ hơn (hoặc sửa giá trị tại chỗ, số dòng không đổi) thì phải gọi clear_ping_cache(). 0 = tắt.
+    PING_CACHE_REVALIDATE_DAYS: int = 2
+    # Detector incremental đọc lại `PING_INCREMENTAL_LAG_HOURS` giờ trước watermark để bắt dòng đến muộn
+    PING_INCREMENTAL_LAG_HOURS: int = 6
+
+    # Read-through cache cho các endpoint internet-kpi (xem app/core/result_cache.py)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAXSIZE: int = 512
+    RESULT_CACHE_TTL_SECONDS: int = 3600
+    RESULT_CACHE_WATERMARK_TTL_SECONDS: float = 5
+    # vd: redis://localhost:6379/0 -> dùng chung cache giữa các worker (cần package `redis`)
+    RESULT_CACHE_REDIS_URL: str | None = None
+
+    # Lịch sử chat: "sqlite" (WAL, đọc / ghi theo session) hoặc "file" (chat_sessions.json cũ)
+    # Khi khởi động với "sqlite" mà DB còn rỗng, chat_sessions.json (nếu có) được import tự động
+    CHAT_MEMORY_BACKEND: str = "sqlite"
+    CHAT_MEMORY_PATH: str = "chat_memory.db"
+    # Ngân sách token của prompt gửi LLM (xem app/core/llm/context.py)
+    CHAT_HISTORY_MAX_MESSAGES: int = 40
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 3000
+    CHAT_SUMMARY_MAX_TOKENS: int = 400
+    CHAT_TOOL_OUTPUT_MAX_TOKENS: int = 1200
+    # Tool call trong 1 turn chạy song song: số thread dùng chung cả app và timeout mỗi tool
+    # (tính từ lúc tool bắt đầu chạy; tool có tác dụng phụ chạy tuần tự, không timeout)
+    CHAT_TOOL_WORKERS: int = 8
+    CHAT_TOOL_TIMEOUT_SECONDS: float = 90
 
     @property
     def DATABASE_URL(self) -> str | None:
@@ -1,3 +1,5 @@
+from fastapi import HTTPException, Request
+
 from app.db.session import SessionLocal, SessionSQLite
 
 def get_db():
@@ -12,3 +14,15 @@ def get_db_sqlite():
         yield db
     finally:
         db.close()
+
+
+def get_llm(request: Request):
+    """LLM client dùng chung, tạo trong lifespan của app; chưa cấu hình API key -> 503."""
+    llm = request.app.state.llm
+    if not llm.available:
+        raise HTTPException(status_code=503, detail="LLM is not configured (missing OPENROUTER_API_KEY)")
+    return llm
+
+
+def get_tool_registry(request: Request):
+    return request.app.state.tools
@@ -1,46 +1,74 @@
 import json
-import os
 import logging
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable, ContextManager, Dict, Generator, Iterator, List, Optional, Tuple
 
-from openai import OpenAI
 from sqlalchemy.orm import Session
 
-from app.core.llm.memory import FileChatMemory, BaseChatMemory
-from app.core.llm.tools.device_tasks import DeviceCommandTool, GetActiveDevicesTool
-from app.core.llm.tools.network_kpi import NetworkSummaryTool
+from app.core.config import settings
+from app.core.llm.client import LLMRegistry
+from app.core.llm.context import ContextWindow, trim_to_key_numbers
+from app.core.llm.memory import BaseChatMemory, create_chat_memory
+from app.core.llm.tools.registry import ToolRegistry
 
 # Setup basic logger
 logger = logging.getLogger(__name__)
 
+
+def _drain(events: Generator[Any, None, Any]) -> Any:
+    """Chạy hết generator (bỏ qua event) và trả về giá trị return của nó."""
+    while True:
+        try:
+            next(events)
+        except StopIteration as stop:
+            return stop.value
+
+
+@dataclass
+class _ToolTask:
+    """Tool call đã submit vào thread pool; `started` được set khi thread bắt đầu chạy tool."""
+
+    submitted_at: float
+    future: Future = field(init=False)
+    started: threading.Event = field(default_factory=threading.Event)
+    started_at: float = 0.0
+
+    def mark_started(self) -> None:
+        self.started_at = time.monotonic()
+        self.started.set()
+
+
 class ChatAgent:
-    def __init__(self, session_id: str, db: Session):
+    """
+    View nhẹ theo từng request: LLM client (connection pool) và tool registry được tạo 1 lần
+    trong lifespan của app và dùng chung, agent chỉ giữ session_id, DB session và memory.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        db: Session,
+        llm: LLMRegistry,
+        tools: ToolRegistry,
+        session_factory: Optional[Callable[[], ContextManager[Session]]] = None,
+    ):
         self.session_id = session_id
         self.db = db
-        
+        # Mỗi tool call chạy trên 1 session riêng (các tool chạy song song trong thread pool)
+        self.session_factory = session_factory or (lambda: Session(bind=db.get_bind()))
+
         # 1. Init Memory
-        self.memory: BaseChatMemory = FileChatMemory(session_id)
-
-        # 2. Init OpenAI Client
-        api_key = os.getenv("OPENROUTER_API_KEY")
-        if not api_key:
-            raise RuntimeError("Missing OPENROUTER_API_KEY")
-        
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-        )
-        # Default model if not set in env
-        self.model = os.getenv("OPENROUTER_CHAT_MODEL", "arcee-ai/trinity-large-preview:free")
-
-        # 3. Init Tools
-        # Add more tools here in the future
-        self.tools = [
-            NetworkSummaryTool(db=db),
-            GetActiveDevicesTool(db=db),
-            DeviceCommandTool(db=db),
-        ]
-        self.tool_map = {t.name: t for t in self.tools}
+        self.memory: BaseChatMemory = create_chat_memory(session_id)
+        self.context = ContextWindow()
+
+        # 2. Shared OpenAI client + tools
+        self.client = llm.client
+        self.model = llm.chat_model
+        self.tools = tools
 
     def _get_system_prompt(self) -> str:
         return (
@@ -54,76 +82,126 @@ class ChatAgent:
             "- Không tự bịa username hoặc action.\n"
         )
 
+    def _build_messages(self, user_message: str) -> List[Dict[str, Any]]:
+        # Load context history (last N messages), giữ trong ngân sách token (turn cũ được gộp vào tóm tắt)
+        context_history = self.memory.load_history(limit=settings.CHAT_HISTORY_MAX_MESSAGES)
+        return self.context.build(self._get_system_prompt(), context_history, user_message)
+
+    def _execute_tool(self, fn_name: str, fn_args_str: str) -> Tuple[str, bool, bool]:
+        """Chạy 1 tool trên session riêng. Trả về (output, ok, is_final_answer)."""
+        tool_instance = self.tools.get(fn_name)
+        if tool_instance is None:
+            return f"Error: Tool '{fn_name}' not found.", False, False
+        try:
+            args = json.loads(fn_args_str or "{}")
+            args.pop("db", None)
+            logger.info(f"[Agent] Calling tool: {fn_name} | Args: {args}")
+            with self.session_factory() as db:
+                tool_output = tool_instance.run(db, **args)
+            return str(tool_output), True, bool(getattr(tool_instance, "is_final_answer", False))
+        except json.JSONDecodeError:
+            return "Error: Invalid JSON arguments.", False, False
+        except Exception as e:
+            logger.error(f"[Agent] Tool execution error: {e}")
+            return f"Error executing tool: {str(e)}", False, False
+
+    def _submit_tool(self, fn_name: str, fn_args_str: str) -> _ToolTask:
+        task = _ToolTask(submitted_at=time.monotonic())
+
+        def run() -> Tuple[str, bool, bool]:
+            task.mark_started()
+            return self._execute_tool(fn_name, fn_args_str)
+
+        task.future = self.tools.executor.submit(run)
+        return task
+
+    def _wait_tool(self, task: _ToolTask, fn_name: str) -> Tuple[str, bool, bool]:
+        """
+        Chờ kết quả 1 tool: timeout tính từ lúc tool bắt đầu chạy, không tính thời gian xếp hàng
+        trong pool dùng chung. Tool còn xếp hàng quá timeout thì bị cancel (chưa chạy gì).
+        """
+        timeout = settings.CHAT_TOOL_TIMEOUT_SECONDS
+        if not task.started.wait(max(0.0, task.submitted_at + timeout - time.monotonic())):
+            if task.future.cancel():
+                logger.error(f"[Agent] Tool {fn_name} still queued after {timeout}s, cancelled")
+                return f"Error: Tool '{fn_name}' was not started (tool pool busy).", False, False
+            task.started.wait()
+        try:
+            return task.future.result(timeout=max(0.0, task.started_at + timeout - time.monotonic()))
+        except FutureTimeoutError:
+            # Thread không dừng được từ bên ngoài: tool (chỉ đọc) chạy nốt trên session riêng của nó
+            logger.error(f"[Agent] Tool {fn_name} timed out after {timeout}s")
+            return f"Error: Tool '{fn_name}' timed out after {timeout:g}s.", False, False
+
+    def _run_tool_calls(
+        self, messages: List[Dict[str, Any]], tool_calls: List[Tuple[str, str, str]]
+    ) -> Generator[Dict[str, Any], None, Optional[str]]:
+        """
+        Chạy các tool call `(id, name, arguments)` song song trong thread pool của tool registry
+        (mỗi tool 1 session DB, timeout CHAT_TOOL_TIMEOUT_SECONDS tính từ lúc tool bắt đầu chạy), thêm
+        output vào `messages` theo đúng thứ tự tool_calls và yield event tiến trình.
+        Tool `has_side_effects` (vd send_device_command) chạy tuần tự trên thread hiện tại, không timeout:
+        model không bao giờ được báo "timed out" cho 1 lệnh vẫn có thể được ghi sau đó.
+        Trả về câu trả lời cuối nếu có tool được đánh dấu is_final_answer (nhiều tool -> nối lại).
+        """
+        tasks: List[Optional[_ToolTask]] = []
+        for call_id, fn_name, fn_args_str in tool_calls:
+            yield {"event": "tool_call", "data": {"name": fn_name, "arguments": fn_args_str}}
+            tool = self.tools.get(fn_name)
+            serial = tool is not None and tool.has_side_effects
+            tasks.append(None if serial else self._submit_tool(fn_name, fn_args_str))
+
+        # Optionally, some tools trả về luôn câu trả lời cuối cùng
+        final_answers: List[str] = []
+        for (call_id, fn_name, fn_args_str), task in zip(tool_calls, tasks):
+            if task is None:
+                tool_result, ok, is_final = self._execute_tool(fn_name, fn_args_str)
+            else:
+                tool_result, ok, is_final = self._wait_tool(task, fn_name)
+            yield {"event": "tool_result", "data": {"name": fn_name, "ok": ok}}
+            if is_final:
+                final_answers.append(tool_result)
+
+            # Append Tool Output
+            messages.append({
+                "role": "tool",
+                "tool_call_id": call_id,
+                "content": trim_to_key_numbers(tool_result, self.context.message_max_tokens),
+            })
+        return "\n\n".join(final_answers) if final_answers else None
+
     def chat(self, user_message: str) -> str:
         try:
-            # 1. Load context history (Last 20 messages)
-            full_history = self.memory.load_history()
-            context_history = full_history[-20:]
-
-            # 2. Construct messages
-            messages: List[Dict[str, Any]] = [
-                {"role": "system", "content": self._get_system_prompt()},
-                *context_history,
-                {"role": "user", "content": user_message},
-            ]
-
-            # 3. First Call to LLM
+            messages = self._build_messages(user_message)
+
+            # First Call to LLM
             # Cast messages to Any to avoid strict typing issues with OpenAI lib
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages, # type: ignore
-                tools=[t.to_openai_schema() for t in self.tools], # type: ignore
+                tools=self.tools.schemas, # type: ignore
                 tool_choice="auto",
             )
             
             msg = response.choices[0].message
             final_answer = ""
 
-            # 4. Handle Tool Calls
+            # Handle Tool Calls
             if msg.tool_calls:
                 # Add Assistant's "intent to call tool" message to history
                 # Convert ChatCompletionMessage to dict to match history format
                 messages.append(msg.model_dump())
-                # Optionally, some tools trả về luôn câu trả lời cuối cùng
-                final_answer_from_tool: Optional[str] = None
-
-                for tool_call in msg.tool_calls:
-                    # Verify type
-                    if tool_call.type != "function":
-                        continue
-                    fn_name = tool_call.function.name
-                    fn_args_str = tool_call.function.arguments or "{}"
-
-                    # Execute Tool
-                    tool_result = f"Error: Tool '{fn_name}' not found."
-                    if fn_name in self.tool_map:
-                        try:
-                            args = json.loads(fn_args_str)
-                            tool_instance = self.tool_map[fn_name]
-                            logger.info(f"[Agent] Calling tool: {fn_name} | Args: {args}")
-                            tool_output = tool_instance.run(**args)
-                            tool_result = tool_output
-
-                            # Nếu tool được đánh dấu là trả về final answer thì dùng luôn
-                            if getattr(tool_instance, "is_final_answer", False):
-                                final_answer_from_tool = str(tool_output)
-                        except json.JSONDecodeError:
-                            tool_result = "Error: Invalid JSON arguments."
-                        except Exception as e:
-                            tool_result = f"Error executing tool: {str(e)}"
-                            logger.error(f"[Agent] Tool execution error: {e}")
-                    # Append Tool Output
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": str(tool_result),
-                    })
+                calls = [
+                    (c.id, c.function.name, c.function.arguments or "{}")
+                    for c in msg.tool_calls if c.type == "function"
+                ]
+                final_answer_from_tool = _drain(self._run_tool_calls(messages, calls))
 
                 if final_answer_from_tool is not None:
                     # Một (hoặc nhiều) tool đã trả về luôn câu trả lời cuối cùng
                     final_answer = final_answer_from_tool
                 else:
-                    # 5. Second Call to LLM (Generate final answer based on tool output)
+                    # Second Call to LLM (Generate final answer based on tool output)
                     final_res = self.client.chat.completions.create(
                         model=self.model,
                         messages=messages, # type: ignore
@@ -133,7 +211,7 @@ class ChatAgent:
                 # No tool called, just direct answer
                 final_answer = msg.content or ""
 
-            # 6. Save new turn to memory
+            # Save new turn to memory
             if final_answer:
                 self.memory.add_turn(user_message, final_answer)
 
@@ -142,3 +220,81 @@ class ChatAgent:
         except Exception as e:
             logger.error(f"[Agent] Chat error: {e}")
             return f"Đã xảy ra lỗi trong quá trình xử lý: {str(e)}"
+
+    def chat_stream(self, user_message: str) -> Iterator[Dict[str, Any]]:
+        """
+        Giống `chat` nhưng gọi LLM với stream=True và yield event ngay khi có:
+        `token` (từng đoạn text), `tool_call` / `tool_result` (tiến trình tool), cuối cùng là `done`
+        (hoặc `error`). Turn chỉ được lưu vào memory khi stream chạy xong.
+        """
+        try:
+            messages = self._build_messages(user_message)
+            answer_parts: List[str] = []
+            # index -> [id, name, arguments]: tool call đến thành nhiều delta
+            pending_calls: Dict[int, List[str]] = {}
+
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages, # type: ignore
+                tools=self.tools.schemas, # type: ignore
+                tool_choice="auto",
+                stream=True,
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    answer_parts.append(delta.content)
+                    yield {"event": "token", "data": {"text": delta.content}}
+                for tc in delta.tool_calls or []:
+                    call = pending_calls.setdefault(tc.index, ["", "", ""])
+                    if tc.id:
+                        call[0] = tc.id
+                    if tc.function and tc.function.name:
+                        call[1] += tc.function.name
+                    if tc.function and tc.function.arguments:
+                        call[2] += tc.function.arguments
+
+            if pending_calls:
+                ordered = [pending_calls[i] for i in sorted(pending_calls)]
+                calls = [(cid, name, args) for cid, name, args in ordered]
+                messages.append({
+                    "role": "assistant",
+                    "content": "".join(answer_parts) or None,
+                    "tool_calls": [
+                        {"id": cid, "type": "function", "function": {"name": name, "arguments": args}}
+                        for cid, name, args in calls
+                    ],
+                })
+                answer_parts = []
+                final_answer_from_tool = yield from self._run_tool_calls(messages, calls)
+
+                if final_answer_from_tool is not None:
+                    answer_parts.append(final_answer_from_tool)
+                    yield {"event": "token", "data": {"text": final_answer_from_tool}}
+                else:
+                    stream = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages, # type: ignore
+                        stream=True,
+                    )
+                    for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            answer_parts.append(chunk.choices[0].delta.content)
+                            yield {"event": "token", "data": {"text": chunk.choices[0].delta.content}}
+
+            final_answer = "".join(answer_parts)
+            if final_answer:
+                self.memory.add_turn(user_message, final_answer)
+            yield {
+                "event": "done",
+                "data": {
+                    "answer": final_answer or "Xin lỗi, tôi không thể trả lời lúc này (Empty response).",
+                    "session_id": self.session_id,
+                },
+            }
+
+        except Exception as e:
+            logger.error(f"[Agent] Chat stream error: {e}")
+            yield {"event": "error", "data": {"detail": f"Đã xảy ra lỗi trong quá trình xử lý: {str(e)}"}}
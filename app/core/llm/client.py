@@ -0,0 +1,75 @@
+"""
+LLM client dùng chung cho cả app.
+
+`LLMRegistry` được tạo 1 lần trong lifespan của FastAPI (xem app/main.py) và lưu ở `app.state.llm`.
+`OpenAI` client (connection pool keep-alive của httpx) chỉ được tạo ở lần dùng đầu tiên (chat / tool),
+rồi mọi request dùng chung thay vì mỗi request tạo 1 client mới (pool mới + TLS handshake mới).
+Thiếu OPENROUTER_API_KEY không chặn app khởi động: các route KPI / health vẫn chạy, chỉ các route
+LLM trả 503 (xem app/core/deps.get_llm).
+"""
+import threading
+from typing import Callable
+
+import httpx
+from openai import OpenAI
+
+from app.core.config import settings
+
+
+class LLMRegistry:
+    def __init__(
+        self,
+        client: OpenAI | None,
+        chat_model: str,
+        summary_model: str,
+        factory: Callable[[], OpenAI] | None = None,
+    ):
+        self._client = client
+        self._factory = factory
+        self._lock = threading.Lock()
+        self.chat_model = chat_model
+        self.summary_model = summary_model
+
+    @property
+    def available(self) -> bool:
+        return self._client is not None or self._factory is not None
+
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if self._factory is None:
+                        raise RuntimeError("Missing OPENROUTER_API_KEY")
+                    self._client = self._factory()
+        return self._client
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+
+
+def _create_openai_client() -> OpenAI:
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS),
+    )
+    return OpenAI(
+        base_url=settings.OPENROUTER_BASE_URL,
+        api_key=settings.OPENROUTER_API_KEY,
+        http_client=http_client,
+        max_retries=settings.LLM_MAX_RETRIES,
+    )
+
+
+def create_llm_registry() -> LLMRegistry:
+    """Registry với client tạo lười; không có OPENROUTER_API_KEY -> registry `available=False`."""
+    return LLMRegistry(
+        None,
+        chat_model=settings.OPENROUTER_CHAT_MODEL,
+        summary_model=settings.OPENROUTER_SUMMARY_MODEL,
+        factory=_create_openai_client if settings.OPENROUTER_API_KEY else None,
+    )
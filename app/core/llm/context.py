@@ -0,0 +1,165 @@
+"""
+Giữ prompt gửi LLM trong 1 ngân sách token cố định.
+
+- Đếm token bằng tokenizer local: `tiktoken` nếu đã cài, nếu không thì ước lượng theo số ký tự.
+- Message cũ không còn vừa ngân sách được gộp vào 1 bản tóm tắt (trích câu hỏi + ý chính / con số
+  của câu trả lời, không gọi thêm LLM). Bản tóm tắt được cache theo nội dung phần bị gộp.
+- Output dài của tool (vd: phân tích KPI) được rút gọn còn các dòng chứa số liệu.
+"""
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.result_cache import LRUTTLCache
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken chưa cài hoặc không tải được encoding
+    _encoding = None
+
+# Tiếng Việt có dấu: trung bình ~3 ký tự / token với các tokenizer BPE
+_CHARS_PER_TOKEN = 3
+# Chi phí cố định của mỗi message (role, phân tách) trong chat format
+_MESSAGE_OVERHEAD = 4
+
+_NUMBER_RE = re.compile(r"\d")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?:])\s")
+
+_summary_cache = LRUTTLCache(maxsize=256, ttl=6 * 3600)
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    return estimate_tokens(content) + _MESSAGE_OVERHEAD
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Cắt theo tỉ lệ rồi thu nhỏ dần (tiktoken không cắt ngược được theo ký tự)
+    end = max(1, len(text) * max_tokens // max(estimate_tokens(text), 1))
+    while end > 1 and estimate_tokens(text[:end]) > max_tokens:
+        end = int(end * 0.9)
+    return text[:end].rstrip() + "…"
+
+
+def trim_to_key_numbers(text: str, max_tokens: int) -> str:
+    """
+    Rút gọn output dài: giữ dòng đầu (tiêu đề / kết luận) và các dòng có số liệu,
+    theo thứ tự ban đầu, cho tới khi hết `max_tokens`.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return _truncate(text, max_tokens)
+
+    kept = [_truncate(lines[0], max_tokens)]
+    used = estimate_tokens(kept[0])
+    for line in lines[1:]:
+        if not _NUMBER_RE.search(line):
+            continue
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept) + "\n…(đã rút gọn)"
+
+
+def _first_sentence(text: str) -> str:
+    first_line = text.strip().splitlines()[0] if text.strip() else ""
+    return _SENTENCE_END_RE.split(first_line, maxsplit=1)[0]
+
+
+def summarize_messages(messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Tóm tắt trích xuất: mỗi turn giữ câu hỏi + câu đầu và số liệu chính của câu trả lời."""
+    key = hashlib.sha1(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+    cached = _summary_cache.get(f"{key}:{max_tokens}")
+    if cached is not None:
+        return cached
+
+    items = []
+    for m in messages:
+        content = m.get("content") or ""
+        if not isinstance(content, str) or not content.strip():
+            continue
+        if m.get("role") == "user":
+            items.append(f"- Người dùng hỏi: {_truncate(content.strip(), 60)}")
+        elif m.get("role") == "assistant":
+            numbers = [line.strip() for line in content.splitlines()[1:] if _NUMBER_RE.search(line)][:3]
+            answer = "; ".join([_first_sentence(content), *numbers])
+            items.append(f"  Trả lời: {_truncate(answer, 120)}")
+
+    # Quá ngân sách -> bỏ các ý cũ nhất trước
+    header = "Tóm tắt các lượt hội thoại trước:"
+    used = estimate_tokens(header)
+    kept: List[str] = []
+    for item in reversed(items):
+        cost = estimate_tokens(item) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(item)
+        used += cost
+    summary = "\n".join([header, *reversed(kept)]) if kept else ""
+    _summary_cache.set(f"{key}:{max_tokens}", summary)
+    return summary
+
+
+class ContextWindow:
+    def __init__(
+        self,
+        budget_tokens: Optional[int] = None,
+        summary_max_tokens: Optional[int] = None,
+        message_max_tokens: Optional[int] = None,
+    ):
+        self.budget_tokens = budget_tokens or settings.CHAT_CONTEXT_TOKEN_BUDGET
+        self.summary_max_tokens = summary_max_tokens or settings.CHAT_SUMMARY_MAX_TOKENS
+        self.message_max_tokens = message_max_tokens or settings.CHAT_TOOL_OUTPUT_MAX_TOKENS
+
+    def build(self, system_prompt: str, history: List[Dict[str, Any]], user_message: str) -> List[Dict[str, Any]]:
+        """
+        [system, (tóm tắt), các message gần nhất vừa ngân sách, user]. Message gần nhất được ưu tiên;
+        phần cũ hơn được gộp vào tóm tắt.
+        """
+        system = {"role": "system", "content": system_prompt}
+        user = {"role": "user", "content": user_message}
+        history = [
+            {**m, "content": trim_to_key_numbers(m["content"], self.message_max_tokens)}
+            if isinstance(m.get("content"), str) else m
+            for m in history
+        ]
+
+        available = self.budget_tokens - message_tokens(system) - message_tokens(user)
+        if sum(message_tokens(m) for m in history) <= available:
+            return [system, *history, user]
+
+        available -= self.summary_max_tokens + _MESSAGE_OVERHEAD
+        start = len(history)
+        used = 0
+        while start > 0 and used + message_tokens(history[start - 1]) <= available:
+            start -= 1
+            used += message_tokens(history[start])
+        # Không cắt giữa 1 turn: bắt đầu từ message của user
+        while start < len(history) and history[start].get("role") != "user":
+            start += 1
+
+        summary = summarize_messages(history[:start], self.summary_max_tokens)
+        messages = [system]
+        if summary:
+            messages.append({"role": "system", "content": summary})
+        return [*messages, *history[start:], user]
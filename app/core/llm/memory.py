@@ -1,14 +1,23 @@
+import argparse
 import json
-
-
 import os
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Engine, create_engine, event, text
+
+from app.core.config import settings
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent  # app/core/llm/memory.py -> project-root
 
 # 1. Interface chuẩn (để sau này RedisMemory cũng kế thừa cái này)
 class BaseChatMemory(ABC):
     @abstractmethod
-    def load_history(self) -> List[Dict[str, Any]]:
+    def load_history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """`limit` message gần nhất của session (None = toàn bộ), theo thứ tự thời gian."""
         pass
 
     @abstractmethod
@@ -37,9 +46,10 @@ class FileChatMemory(BaseChatMemory):
         except Exception as e:
             print(f"Error saving chat history: {e}")
 
-    def load_history(self) -> List[Dict[str, Any]]:
+    def load_history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         all_sessions = self._load_all()
-        return all_sessions.get(self.session_id, [])
+        history = all_sessions.get(self.session_id, [])
+        return history[-limit:] if limit else history
 
     def add_turn(self, user_msg: str, assistant_msg: str):
         all_sessions = self._load_all()
@@ -54,8 +64,147 @@ class FileChatMemory(BaseChatMemory):
         all_sessions[self.session_id] = history + new_turns
         self._save_all(all_sessions)
 
-# 3. (Sau này) Redis Implementation - Chỉ cần viết thêm class này
+# 3. SQLite (WAL): mỗi message 1 dòng, index (session_id, id)
+#    -> đọc N message cuối của 1 session và ghi 1 turn không phụ thuộc tổng lịch sử,
+#    nhiều worker ghi đồng thời không mất turn của nhau.
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def _chat_engine(db_path: str) -> Engine:
+    with _engines_lock:
+        engine = _engines.get(db_path)
+        if engine is None:
+            engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+
+            @event.listens_for(engine, "connect")
+            def _set_sqlite_pragma(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA busy_timeout=5000")
+                cursor.close()
+
+            with engine.begin() as conn:
+                conn.execute(text("""
+                    CREATE TABLE IF NOT EXISTS chat_messages (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        session_id TEXT NOT NULL,
+                        role TEXT NOT NULL,
+                        content TEXT NOT NULL,
+                        created_at TEXT NOT NULL
+                    )
+                """))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_chat_messages_session_id ON chat_messages (session_id, id)"
+                ))
+            _engines[db_path] = engine
+        return engine
+
+
+def chat_memory_path() -> str:
+    path = Path(settings.CHAT_MEMORY_PATH)
+    return str(path if path.is_absolute() else BASE_DIR / path)
+
+
+class SQLiteChatMemory(BaseChatMemory):
+    def __init__(self, session_id: str, db_path: Optional[str] = None):
+        self.session_id = session_id
+        self.engine = _chat_engine(db_path or chat_memory_path())
+
+    def load_history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        sql = "SELECT role, content FROM chat_messages WHERE session_id = :session_id ORDER BY id DESC"
+        params: Dict[str, Any] = {"session_id": self.session_id}
+        if limit:
+            sql += " LIMIT :limit"
+            params["limit"] = limit
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(sql), params).mappings().all()
+        return [dict(r) for r in reversed(rows)]
+
+    def add_turn(self, user_msg: str, assistant_msg: str):
+        now = datetime.now().isoformat(timespec="seconds")
+        # 1 transaction: user + assistant luôn được ghi cùng nhau
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO chat_messages (session_id, role, content, created_at)
+                    VALUES (:session_id, :role, :content, :created_at)
+                """),
+                [
+                    {"session_id": self.session_id, "role": "user", "content": user_msg, "created_at": now},
+                    {"session_id": self.session_id, "role": "assistant", "content": assistant_msg, "created_at": now},
+                ],
+            )
+
+
+# 4. (Sau này) Redis Implementation - Chỉ cần viết thêm class này
 # class RedisChatMemory(BaseChatMemory):
 #     def __init__(self, session_id, redis_client): ...
 #     def load_history(self): return redis_client.lrange(...)
 #     def add_turn(self, ...): redis_client.rpush(...)
+
+
+def create_chat_memory(session_id: str) -> BaseChatMemory:
+    if settings.CHAT_MEMORY_BACKEND == "file":
+        return FileChatMemory(session_id)
+    return SQLiteChatMemory(session_id)
+
+
+def import_json_sessions(json_path: str = "chat_sessions.json", db_path: Optional[str] = None) -> int:
+    """
+    Chuyển lịch sử từ file JSON của FileChatMemory sang SQLite (chạy 1 lần).
+    Session đã có trong SQLite thì bỏ qua nên chạy lại không bị nhân đôi. Trả về số message đã import.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    with open(json_path, "r", encoding="utf-8") as f:
+        all_sessions: Dict[str, List[Dict[str, Any]]] = json.load(f)
+
+    engine = _chat_engine(db_path or chat_memory_path())
+    now = datetime.now().isoformat(timespec="seconds")
+    imported = 0
+    with engine.begin() as conn:
+        existing = set(conn.execute(text("SELECT DISTINCT session_id FROM chat_messages")).scalars())
+        for session_id, history in all_sessions.items():
+            if session_id in existing or not history:
+                continue
+            conn.execute(
+                text("""
+                    INSERT INTO chat_messages (session_id, role, content, created_at)
+                    VALUES (:session_id, :role, :content, :created_at)
+                """),
+                [
+                    {"session_id": session_id, "role": m["role"], "content": m["content"], "created_at": now}
+                    for m in history
+                ],
+            )
+            imported += len(history)
+    return imported
+
+
+def import_legacy_sessions(json_path: str = "chat_sessions.json", db_path: Optional[str] = None) -> int:
+    """
+    Gọi khi app khởi động với backend "sqlite": nếu SQLite chưa có message nào mà file JSON cũ
+    của FileChatMemory tồn tại thì import tự động, để hội thoại cũ không bị "mất" khi đổi backend.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    engine = _chat_engine(db_path or chat_memory_path())
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT 1 FROM chat_messages LIMIT 1")).first() is not None:
+            return 0
+    return import_json_sessions(json_path, db_path)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Import chat_sessions.json into the SQLite chat memory")
+    parser.add_argument("json_path", nargs="?", default="chat_sessions.json")
+    parser.add_argument("--db-path", default=None, help="Defaults to CHAT_MEMORY_PATH")
+    args = parser.parse_args(argv)
+    count = import_json_sessions(args.json_path, args.db_path)
+    print(f"Imported {count} messages into {args.db_path or chat_memory_path()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 from abc import ABC, abstractmethod
 from typing import Any, Dict
 
+from sqlalchemy.orm import Session
+
 class BaseTool(ABC):
+    # Tool có tác dụng phụ (ghi DB, gửi lệnh): agent chạy tuần tự, không bỏ ngang theo timeout
+    has_side_effects: bool = False
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -21,8 +26,8 @@ class BaseTool(ABC):
         pass
 
     @abstractmethod
-    def run(self, **kwargs) -> str:
-        """Logic thực thi tool"""
+    def run(self, db: Session, **kwargs) -> str:
+        """Logic thực thi tool (tool dùng chung cho mọi request -> session DB truyền vào mỗi lần gọi)"""
         pass
 
     def to_openai_schema(self) -> Dict[str, Any]:
@@ -7,9 +7,6 @@ from app.core.llm.tools.base import BaseTool
 
 
 class GetActiveDevicesTool(BaseTool):
-    def __init__(self, db: Session):
-        self.db = db
-
     @property
     def is_final_answer(self) -> bool:
         return True
@@ -33,7 +30,7 @@ class GetActiveDevicesTool(BaseTool):
             "required": [],
         }
 
-    def run(self, **kwargs) -> str:
+    def run(self, db: Session, **kwargs) -> str:
         try:
             sql = text(
                 """
@@ -43,7 +40,7 @@ class GetActiveDevicesTool(BaseTool):
                 ORDER BY username ASC
                 """
             )
-            rows = self.db.execute(sql).mappings().all()
+            rows = db.execute(sql).mappings().all()
             usernames = [str(r["username"]) for r in rows if r.get("username")]
 
             if not usernames:
@@ -54,8 +51,7 @@ class GetActiveDevicesTool(BaseTool):
 
 
 class DeviceCommandTool(BaseTool):
-    def __init__(self, db: Session):
-        self.db = db
+    has_side_effects = True
 
     @property
     def is_final_answer(self) -> bool:
@@ -96,7 +92,7 @@ class DeviceCommandTool(BaseTool):
             "required": ["username", "action"],
         }
 
-    def run(self, username: str, action: str, **kwargs) -> str:
+    def run(self, db: Session, username: str, action: str, **kwargs) -> str:
         try:
             username_clean = (username or "").strip()
             action_clean = (action or "").strip()
@@ -124,10 +120,10 @@ class DeviceCommandTool(BaseTool):
                 )
                 """
             )
-            self.db.execute(insert_sql, {"username": username_clean, "command": action_clean})
-            self.db.commit()
+            db.execute(insert_sql, {"username": username_clean, "command": action_clean})
+            db.commit()
 
             return f"Đã ghi lệnh '{action_clean}' cho thiết bị '{username_clean}'."
         except Exception as e:
-            self.db.rollback()
+            db.rollback()
             return f"Error executing tool: {str(e)}"
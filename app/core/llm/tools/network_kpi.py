@@ -5,11 +5,12 @@ from app.services.get_kpi_data import AggregateLevel
 
 # Reuse existing summary logic
 from app.api.v1.endpoints.summary_assistant import summary_internet_kpi
+from app.core.llm.client import LLMRegistry
 from app.core.llm.tools.base import BaseTool
 
 class NetworkSummaryTool(BaseTool):
-    def __init__(self, db: Session):
-        self.db = db
+    def __init__(self, llm: LLMRegistry):
+        self.llm = llm
     @property
     def is_final_answer(self) -> bool:
         return True
@@ -67,7 +68,7 @@ class NetworkSummaryTool(BaseTool):
             return "FPT"
         return s
 
-    def run(self, isp: str, date: str = "", aggregate_level: str = "daily", kpi_code: str = "internet_latency", **kwargs) -> str:
+    def run(self, db: Session, isp: str, date: str = "", aggregate_level: str = "daily", kpi_code: str = "internet_latency", **kwargs) -> str:
         isp_norm = self._normalize_isp(isp)
         if not isp_norm:
             return "MISSING_INFO: Thiếu thông tin nhà mạng (isp). Hãy hỏi người dùng cung cấp tên nhà mạng (Ví dụ: Viettel, VNPT, FPT)."
@@ -86,7 +87,8 @@ class NetworkSummaryTool(BaseTool):
                 isp=isp_norm,
                 kpi_code=kpi_code,
                 date_hour=date_key,
-                db=self.db,
+                db=db,
+                llm=self.llm,
             )
             if isinstance(result, dict) and "data" in result:
                 return str(result["data"])
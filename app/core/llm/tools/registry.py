@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from app.core.config import settings
+from app.core.llm.client import LLMRegistry
+from app.core.llm.tools.base import BaseTool
+
+
+class ToolRegistry:
+    """
+    Các tool dựng sẵn 1 lần cho cả app; schema OpenAI được tính 1 lần khi đăng ký.
+    `executor` là thread pool có giới hạn dùng chung để chạy song song các tool call của 1 turn.
+    """
+
+    def __init__(self, tools: List[BaseTool], max_workers: int | None = None):
+        self._tools = {t.name: t for t in tools}
+        self.schemas: List[Dict[str, Any]] = [t.to_openai_schema() for t in tools]
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.CHAT_TOOL_WORKERS, thread_name_prefix="chat-tool"
+        )
+
+    def get(self, name: str) -> BaseTool | None:
+        return self._tools.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __iter__(self):
+        return iter(self._tools.values())
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_tool_registry(llm: LLMRegistry) -> ToolRegistry:
+    # Import trong hàm: network_kpi dùng lại endpoint summary-assistant
+    from app.core.llm.tools.device_tasks import DeviceCommandTool, GetActiveDevicesTool
+    from app.core.llm.tools.network_kpi import NetworkSummaryTool
+
+    # Add more tools here in the future
+    return ToolRegistry([
+        NetworkSummaryTool(llm=llm),
+        GetActiveDevicesTool(),
+        DeviceCommandTool(),
+    ])
@@ -0,0 +1,91 @@
+"""
+Keyset pagination và NDJSON streaming cho các endpoint trả về nhiều dòng log / anomaly.
+
+- Keyset: trang sau bắt đầu ngay sau dòng cuối của trang trước theo khoá `cols` (mặc định
+  (testing_time, account_login_vqt); các bảng có nhiều server / agent / giờ truyền thêm cột server,
+  xem KpiSpec.keyset_columns), dùng index (..., testing_time) thay vì OFFSET. Khoá phải duy nhất,
+  nếu không các dòng trùng khoá ở ranh giới trang bị bỏ sót. Cursor là token base64 của khoá dòng cuối.
+- NDJSON (`Accept: application/x-ndjson`): query chạy bằng server-side cursor trên 1 session riêng
+  (session của request đã đóng khi response bắt đầu stream), mỗi dòng JSON được gửi ngay khi đọc
+  xong từng chunk -> bộ nhớ không phụ thuộc độ dài khoảng thời gian.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterator, Sequence
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import TextClause
+from sqlalchemy.orm import Session
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+KEYSET_COLS = ("testing_time", "account_login_vqt")
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_cursor(row: Any, cols: tuple[str, ...] = KEYSET_COLS) -> str:
+    key = [row[c] for c in cols]
+    raw = json.dumps(key, default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token: str, cols: tuple[str, ...] = KEYSET_COLS) -> dict[str, Any]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if not isinstance(key, list) or len(key) != len(cols):
+            raise ValueError(key)
+    except (ValueError, binascii.Error) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+    return {f"cursor_{c}": v for c, v in zip(cols, key)}
+
+
+def keyset_clause(descending: bool = False, cols: tuple[str, ...] = KEYSET_COLS) -> str:
+    """Điều kiện `AND (testing_time, account_login_vqt, ...) > (...)` (hoặc `<` khi sắp xếp giảm dần)."""
+    op = "<" if descending else ">"
+    params = ", ".join(f":cursor_{c}" for c in cols)
+    return f"AND ({', '.join(cols)}) {op} ({params})"
+
+
+def keyset_order(descending: bool = False, cols: tuple[str, ...] = KEYSET_COLS) -> str:
+    direction = " DESC" if descending else ""
+    return "ORDER BY " + ", ".join(f"{c}{direction}" for c in cols)
+
+
+def paginate(
+    rows: Sequence, limit: int | None, cols: tuple[str, ...] = KEYSET_COLS
+) -> tuple[Sequence, str | None]:
+    """`rows` được query với LIMIT limit + 1: dòng thừa cho biết còn trang sau."""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1], cols)
+
+
+def iter_ndjson(db: Session, sql: TextClause, params: dict[str, Any], chunk_size: int = 2000) -> Iterator[bytes]:
+    # Session riêng trên cùng engine với session của request
+    with Session(bind=db.get_bind()) as session:
+        result = session.execute(
+            sql, params, execution_options={"stream_results": True, "max_row_buffer": chunk_size}
+        ).mappings()
+        for rows in result.partitions(chunk_size):
+            yield b"".join(
+                json.dumps(dict(row), default=_json_default).encode() + b"\n" for row in rows
+            )
+
+
+def ndjson_response(db: Session, sql: TextClause, params: dict[str, Any]) -> StreamingResponse:
+    return StreamingResponse(iter_ndjson(db, sql, params), media_type=NDJSON_MEDIA_TYPE)
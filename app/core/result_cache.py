@@ -0,0 +1,172 @@
+"""
+Read-through cache cho kết quả query của các endpoint dashboard.
+
+- Key = namespace + bảng + watermark dữ liệu + params. Watermark là `MAX(date_hour)` của đúng
+  các dòng query đọc (cùng filter), index-only trên (..., date_hour), cache riêng trong vài giây.
+  Chỉ đúng khi `date_hour` so sánh được theo thời gian: với bảng lưu key tuần 'Www-YYYY'
+  (time_key.uses_week_key) caller phải cố định `date_hour` trong filter. Khi job aggregate ghi `date_hour`
+  mới thì watermark đổi -> key đổi -> lần đọc sau đi thẳng xuống DB; entry cũ tự bị LRU / TTL đẩy ra.
+- Backend mặc định là LRU + TTL trong process; đặt `RESULT_CACHE_REDIS_URL` để các worker
+  uvicorn dùng chung cache (cần cài thêm package `redis`).
+"""
+import json
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """Dict có giới hạn kích thước (LRU) và thời gian sống của entry, an toàn giữa các thread."""
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= self._clock():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCache:
+    """Backend dùng chung giữa các process; value được pickle (chỉ dùng với Redis nội bộ)."""
+
+    def __init__(self, url: str, ttl: float, prefix: str = "result_cache:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RESULT_CACHE_REDIS_URL is set but the `redis` package is not installed") from e
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str, default=None):
+        raw = self._client.get(self.prefix + key)
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key: str, value: Any) -> None:
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=int(self.ttl))
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(key)
+
+
+class ResultCache:
+    def __init__(
+        self,
+        backend: LRUTTLCache | RedisCache,
+        watermark_ttl: float = 5,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backend = backend
+        self.enabled = enabled
+        # Watermark luôn cache trong process: rẻ, và chỉ cần tươi trong vài giây
+        self._watermarks = LRUTTLCache(maxsize=4096, ttl=watermark_ttl, clock=clock)
+        self.hits = 0
+        self.misses = 0
+
+    def watermark(self, db: Session, table: str, filters: dict[str, Any]) -> str | None:
+        """
+        `MAX(date_hour)` của các dòng khớp `filters`, dùng index (..., date_hour).
+        Giá trị là list / tuple -> `cột = ANY(...)`: 1 query cho cả batch nhiều nhóm.
+        """
+        filters = {c: sorted(v) if isinstance(v, (list, tuple)) else v for c, v in filters.items()}
+        key = f"{table}:{json.dumps(filters, sort_keys=True, default=str)}"
+        value = self._watermarks.get(key, _MISSING)
+        if value is _MISSING:
+            where = " AND ".join(
+                f"{c} = ANY(:{c})" if isinstance(v, list) else f"{c} = :{c}" for c, v in filters.items()
+            ) or "TRUE"
+            value = db.execute(text(f"SELECT MAX(date_hour) FROM {table} WHERE {where}"), filters).scalar()
+            self._watermarks.set(key, value)
+        return value
+
+    def get_or_load(
+        self,
+        namespace: str,
+        table: str,
+        params: dict[str, Any],
+        db: Session,
+        loader: Callable[[], Sequence],
+        watermark_filters: dict[str, Any] | None = None,
+    ) -> Sequence:
+        """Trả về kết quả đã cache nếu dữ liệu chưa đổi, ngược lại gọi `loader()` và lưu lại."""
+        if not self.enabled:
+            return loader()
+
+        watermark = self.watermark(db, table, watermark_filters or {})
+        key = f"{namespace}:{table}:{watermark}:{json.dumps(params, sort_keys=True, default=str)}"
+        value: Any = _MISSING
+        try:
+            value = self.backend.get(key, _MISSING)
+        except Exception:
+            logger.exception("Result cache read failed, falling back to DB")
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        # RowMapping không pickle được -> lưu dạng dict
+        value = [dict(row) for row in loader()]
+        try:
+            self.backend.set(key, value)
+        except Exception:
+            logger.exception("Result cache write failed")
+        return value
+
+    def clear(self) -> None:
+        self.backend.clear()
+        self._watermarks.clear()
+
+
+def _create_result_cache() -> ResultCache:
+    if settings.RESULT_CACHE_REDIS_URL:
+        backend = RedisCache(settings.RESULT_CACHE_REDIS_URL, ttl=settings.RESULT_CACHE_TTL_SECONDS)
+    else:
+        backend = LRUTTLCache(settings.RESULT_CACHE_MAXSIZE, ttl=settings.RESULT_CACHE_TTL_SECONDS)
+    return ResultCache(
+        backend,
+        watermark_ttl=settings.RESULT_CACHE_WATERMARK_TTL_SECONDS,
+        enabled=settings.RESULT_CACHE_ENABLED,
+    )
+
+
+result_cache = _create_result_cache()
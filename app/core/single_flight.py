@@ -0,0 +1,66 @@
+"""
+Gộp các query giống hệt nhau đang chạy đồng thời (single-flight).
+
+Endpoint sync của FastAPI chạy trong threadpool: khi nhiều request cùng key đến cùng lúc,
+request đầu tiên chạy query, các request sau chờ và dùng chung kết quả (hoặc exception)
+thay vì mỗi request mở 1 session và chạy lại cùng 1 query.
+"""
+import json
+import threading
+from typing import Any, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+def query_key(namespace: str, params: dict[str, Any]) -> str:
+    return f"{namespace}:{json.dumps(params, sort_keys=True, default=str)}"
+
+
+query_flight = SingleFlight()
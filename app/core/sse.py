@@ -0,0 +1,26 @@
+"""Server-sent events: mỗi event là `event: <tên>\ndata: <json>\n\n`, flush ngay khi yield."""
+import json
+from typing import Any, Dict, Iterable, Iterator
+
+from fastapi.responses import StreamingResponse
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _encode(events: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for item in events:
+        yield sse_event(item["event"], item["data"])
+
+
+def sse_response(events: Iterable[Dict[str, Any]]) -> StreamingResponse:
+    """`events` là iterable các dict {"event": ..., "data": ...}."""
+    return StreamingResponse(
+        _encode(events),
+        media_type=SSE_MEDIA_TYPE,
+        # Tắt buffer của proxy (nginx) để token tới client ngay
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
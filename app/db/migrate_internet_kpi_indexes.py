@@ -0,0 +1,56 @@
+"""
+Tạo index composite cho các bảng internet_kpi để query theo (kpi_code, location_level, date_hour)
+là index range scan (xem app/services/time_key.py).
+
+    python -m app.db.migrate_internet_kpi_indexes [--dry-run]
+
+Dùng CREATE INDEX CONCURRENTLY nên không khoá ghi bảng, chạy lại nhiều lần không sao (IF NOT EXISTS).
+"""
+import argparse
+
+from sqlalchemy import text
+
+from app.services.get_kpi_data import INTERNET_KPI_CHANGE_TABLES, INTERNET_KPI_TABLES
+
+KPI_INDEX_COLUMNS = ["kpi_code", "location_level", "date_hour"]
+CHANGE_INDEX_COLUMNS = ["kpi_code", "isp", "location_level", "date_hour"]
+
+
+def index_statement(table: str, columns: list[str], concurrently: bool = True) -> str:
+    # Tên index tối đa 63 ký tự -> chỉ lấy 3 ký tự đầu của mỗi cột (vd: ix_internet_kpi_daily_kpi_loc_dat)
+    index_name = f"ix_{table.split('.')[-1]}_{'_'.join(c[:3] for c in columns)}"
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {index_name} "
+        f"ON {table} ({', '.join(columns)})"
+    )
+
+
+def index_statements(concurrently: bool = True) -> list[str]:
+    statements = [index_statement(t, KPI_INDEX_COLUMNS, concurrently) for t in INTERNET_KPI_TABLES.values()]
+    statements += [index_statement(t, CHANGE_INDEX_COLUMNS, concurrently) for t in INTERNET_KPI_CHANGE_TABLES.values()]
+    return statements
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Create composite indexes on internet_kpi tables")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the statements")
+    args = parser.parse_args(argv)
+
+    statements = index_statements()
+    if args.dry_run:
+        print(";\n".join(statements) + ";")
+        return
+
+    from app.db.session import engine
+
+    # CONCURRENTLY không chạy được trong transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in statements:
+            print(statement)
+            conn.execute(text(statement))
+        for table in list(INTERNET_KPI_TABLES.values()) + list(INTERNET_KPI_CHANGE_TABLES.values()):
+            conn.execute(text(f"ANALYZE {table}"))
+
+
+if __name__ == "__main__":
+    main()
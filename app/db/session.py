@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 from pathlib import Path
@@ -31,6 +31,16 @@ engine_sqlite = create_engine(
     pool_pre_ping=True,
 )
 
+
+@event.listens_for(engine_sqlite, "connect")
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    # WAL: API đọc anomaly không bị block trong lúc detector ghi
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 SessionSQLite = sessionmaker(
     autocommit=False,
     autoflush=False,
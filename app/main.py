@@ -1,15 +1,41 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.core.llm.client import create_llm_registry
+from app.core.llm.memory import import_legacy_sessions
+from app.core.llm.tools.registry import build_tool_registry
 from app.api.router import router as api_router
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # LLM client (connection pool) + tool registry dùng chung cho mọi request
+    app.state.llm = create_llm_registry()
+    if not app.state.llm.available:
+        logger.warning("OPENROUTER_API_KEY is not set: chat and summary-assistant routes will return 503")
+    app.state.tools = build_tool_registry(app.state.llm)
+    if settings.CHAT_MEMORY_BACKEND == "sqlite":
+        imported = import_legacy_sessions()
+        if imported:
+            logger.info(f"Imported {imported} messages from chat_sessions.json into the SQLite chat memory")
+    try:
+        yield
+    finally:
+        app.state.tools.shutdown()
+        app.state.llm.close()
+
 
 def create_app() -> FastAPI:
     setup_logging()
 
-    app = FastAPI(title=settings.APP_NAME)
+    app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 
     # ===== CORS =====
     app.add_middleware(
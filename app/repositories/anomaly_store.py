@@ -0,0 +1,129 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from app.db.session import engine_sqlite
+
+logger = logging.getLogger(__name__)
+
+KEY_COLS = ["scorer", "isp", "account_login_vqt", "server_name", "testing_time"]
+
+BASE_COLS = {
+    "scorer": "TEXT NOT NULL",
+    "isp": "TEXT NOT NULL",
+    "account_login_vqt": "TEXT NOT NULL",
+    "server_name": "TEXT NOT NULL",
+    "aggregate_level": "TEXT",
+    "testing_time": "TEXT NOT NULL",
+    "sample_count": "INTEGER",
+}
+
+# Cùng format với dữ liệu pandas.to_sql ghi trước đây để các query so sánh chuỗi vẫn đúng
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+_ensured_tables: set[str] = set()
+
+
+def anomaly_columns(metrics: list[str], suffixes: list[str]) -> dict[str, str]:
+    """Schema cố định của bảng anomaly: cột khoá + giá trị metric + các cột điểm của scorer."""
+    columns = dict(BASE_COLS)
+    for m in metrics:
+        columns[m] = "REAL"
+        for suffix in suffixes:
+            columns[f"{m}{suffix}"] = "REAL"
+    return columns
+
+
+def ensure_anomaly_table(table_name: str, columns: dict[str, str]) -> None:
+    """
+    Tạo bảng + index nếu chưa có. Bảng cũ do `to_sql(if_exists="replace")` tạo ra
+    (không có cột `scorer`, không có index) được đổi tên thành `<table>_legacy`.
+    """
+    if table_name in _ensured_tables:
+        return
+
+    with engine_sqlite.begin() as conn:
+        existing = [r[1] for r in conn.execute(text(f'PRAGMA table_info("{table_name}")')).all()]
+        if existing and "scorer" not in existing:
+            logger.warning("Moving unindexed table %s to %s_legacy", table_name, table_name)
+            conn.execute(text(f'DROP TABLE IF EXISTS "{table_name}_legacy"'))
+            conn.execute(text(f'ALTER TABLE "{table_name}" RENAME TO "{table_name}_legacy"'))
+            existing = []
+
+        if not existing:
+            col_defs = ",\n".join(f'"{c}" {t}' for c, t in columns.items())
+            conn.execute(text(f'CREATE TABLE "{table_name}" (\n{col_defs}\n)'))
+        else:
+            # Scorer/metric mới -> thêm cột, không rewrite bảng
+            for c, t in columns.items():
+                if c not in existing:
+                    conn.execute(text(f'ALTER TABLE "{table_name}" ADD COLUMN "{c}" {t.replace(" NOT NULL", "")}'))
+
+        conn.execute(text(
+            f'CREATE UNIQUE INDEX IF NOT EXISTS "ux_{table_name}_key" '
+            f'ON "{table_name}" ({", ".join(KEY_COLS)})'
+        ))
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_server_level_time" '
+            f'ON "{table_name}" (server_name, aggregate_level, testing_time)'
+        ))
+
+    _ensured_tables.add(table_name)
+
+
+def _to_records(df: pd.DataFrame, scorer_name: str, columns: dict[str, str]) -> list[dict]:
+    data = {}
+    for c, sql_type in columns.items():
+        if c == "scorer":
+            data[c] = np.full(len(df), scorer_name, dtype=object)
+        elif c not in df.columns:
+            data[c] = np.full(len(df), None, dtype=object)
+        elif c == "testing_time":
+            data[c] = pd.to_datetime(df[c]).dt.strftime(TIME_FORMAT).to_numpy(dtype=object)
+        elif sql_type == "REAL":
+            data[c] = pd.to_numeric(df[c], errors="coerce").astype(float).to_numpy(dtype=object)
+        elif sql_type == "INTEGER":
+            data[c] = pd.to_numeric(df[c], errors="coerce").round().astype("Int64").to_numpy(dtype=object)
+        else:
+            data[c] = df[c].to_numpy(dtype=object)
+
+    frame = pd.DataFrame(data, columns=list(columns))
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict("records")
+
+
+def upsert_anomalies(
+    table_name: str,
+    scorer_name: str,
+    df: pd.DataFrame,
+    metrics: list[str],
+    suffixes: list[str],
+    batch_size: int = 1000,
+) -> int:
+    """
+    Upsert anomaly theo khoá (scorer, isp, account_login_vqt, server_name, testing_time).
+    Chi phí ghi tỉ lệ với số anomaly mới, không rewrite toàn bộ bảng.
+    """
+    columns = anomaly_columns(metrics, suffixes)
+    ensure_anomaly_table(table_name, columns)
+    if df.empty:
+        return 0
+
+    records = _to_records(df, scorer_name, columns)
+    col_list = ", ".join(f'"{c}"' for c in columns)
+    placeholders = ", ".join(f":{c}" for c in columns)
+    updates = ", ".join(f'"{c}" = excluded."{c}"' for c in columns if c not in KEY_COLS)
+    sql = text(f"""
+        INSERT INTO "{table_name}" ({col_list})
+        VALUES ({placeholders})
+        ON CONFLICT ({", ".join(KEY_COLS)}) DO UPDATE SET {updates}
+    """)
+
+    with engine_sqlite.begin() as conn:
+        for start in range(0, len(records), batch_size):
+            # list params -> executemany
+            conn.execute(sql, records[start:start + batch_size])
+
+    return len(records)
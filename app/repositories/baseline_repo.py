@@ -0,0 +1,71 @@
+import pandas as pd
+from sqlalchemy import text
+
+from app.db.session import engine_sqlite
+
+PROFILE_KEY_COLS = ["isp", "account_login_vqt", "server_name", "weekday", "hour", "metric"]
+
+
+def _ensure_table(conn) -> None:
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS ping_baseline_profile (
+            profile TEXT NOT NULL,
+            isp TEXT NOT NULL,
+            account_login_vqt TEXT NOT NULL,
+            server_name TEXT NOT NULL,
+            weekday INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            median REAL,
+            mad REAL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (profile, isp, account_login_vqt, server_name, weekday, hour, metric)
+        )
+    """))
+
+
+def load_baseline(profile: str) -> pd.DataFrame:
+    """
+    Đọc toàn bộ baseline của `profile` dạng long:
+    isp, account_login_vqt, server_name, weekday, hour, metric, median, mad, n
+    """
+    with engine_sqlite.begin() as conn:
+        _ensure_table(conn)
+        rows = conn.execute(
+            text(f"""
+                SELECT {", ".join(PROFILE_KEY_COLS)}, median, mad, n
+                FROM ping_baseline_profile
+                WHERE profile = :profile
+            """),
+            {"profile": profile},
+        ).all()
+    return pd.DataFrame(rows, columns=PROFILE_KEY_COLS + ["median", "mad", "n"])
+
+
+def save_baseline(profile: str, baseline: pd.DataFrame, replace: bool = False) -> int:
+    """
+    Upsert các ô (series, weekday, hour, metric) trong `baseline`.
+    `replace=True` xoá toàn bộ baseline cũ của profile (dùng khi build lại từ đầu).
+    """
+    frame = baseline[PROFILE_KEY_COLS + ["median", "mad", "n"]].astype(object)
+    frame = frame.where(frame.notna(), None)
+    params = [{"profile": profile, **r} for r in frame.to_dict("records")]
+
+    with engine_sqlite.begin() as conn:
+        _ensure_table(conn)
+        if replace:
+            conn.execute(
+                text("DELETE FROM ping_baseline_profile WHERE profile = :profile"),
+                {"profile": profile},
+            )
+        if params:
+            conn.execute(
+                text(f"""
+                    INSERT INTO ping_baseline_profile (profile, {", ".join(PROFILE_KEY_COLS)}, median, mad, n)
+                    VALUES (:profile, {", ".join(f":{c}" for c in PROFILE_KEY_COLS)}, :median, :mad, :n)
+                    ON CONFLICT (profile, {", ".join(PROFILE_KEY_COLS)})
+                    DO UPDATE SET median = excluded.median, mad = excluded.mad, n = excluded.n
+                """),
+                params,
+            )
+    return len(params)
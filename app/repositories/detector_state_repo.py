@@ -0,0 +1,149 @@
+import json
+from collections.abc import Iterator, Mapping
+from typing import Any
+
+import pandas as pd
+from sqlalchemy import text
+
+from app.db.session import engine_sqlite
+
+SeriesKey = tuple[str, str, str]  # (isp, account_login_vqt, server_name)
+
+
+class SeriesStates(Mapping[SeriesKey, dict[str, Any]]):
+    """
+    State đã lưu của các series, giữ nguyên chuỗi JSON và chỉ decode khi series được truy cập:
+    mỗi lần chạy incremental chỉ chạm vào các series có dòng mới chứ không phải toàn bộ.
+    """
+
+    def __init__(self, raw: dict[SeriesKey, str]):
+        self._raw = raw
+        self._decoded: dict[SeriesKey, dict[str, Any]] = {}
+
+    def __getitem__(self, key: SeriesKey) -> dict[str, Any]:
+        if key not in self._decoded:
+            self._decoded[key] = json.loads(self._raw[key])
+        return self._decoded[key]
+
+    def __iter__(self) -> Iterator[SeriesKey]:
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+
+def _ensure_tables(conn) -> None:
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS detector_series_state (
+            detector TEXT NOT NULL,
+            isp TEXT NOT NULL,
+            account_login_vqt TEXT NOT NULL,
+            server_name TEXT NOT NULL,
+            state TEXT NOT NULL,
+            PRIMARY KEY (detector, isp, account_login_vqt, server_name)
+        )
+    """))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS detector_watermark (
+            detector TEXT PRIMARY KEY,
+            watermark TEXT NOT NULL
+        )
+    """))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS backfill_progress (
+            job_id TEXT PRIMARY KEY,
+            last_completed TEXT NOT NULL
+        )
+    """))
+
+
+def load_detector_state(detector: str) -> tuple[pd.Timestamp | None, SeriesStates]:
+    """Đọc watermark và state của từng series đã lưu cho `detector` (state decode lazily, xem SeriesStates)."""
+    with engine_sqlite.begin() as conn:
+        _ensure_tables(conn)
+        watermark = conn.execute(
+            text("SELECT watermark FROM detector_watermark WHERE detector = :detector"),
+            {"detector": detector},
+        ).scalar()
+        rows = conn.execute(
+            text("""
+                SELECT isp, account_login_vqt, server_name, state
+                FROM detector_series_state
+                WHERE detector = :detector
+            """),
+            {"detector": detector},
+        ).all()
+
+    states = SeriesStates({(r[0], r[1], r[2]): r[3] for r in rows})
+    return (pd.Timestamp(watermark) if watermark else None), states
+
+
+def save_detector_state(
+    detector: str,
+    watermark: pd.Timestamp,
+    states: dict[SeriesKey, dict[str, Any]],
+    replace: bool = False,
+) -> None:
+    """
+    Ghi state các series đã thay đổi và watermark mới trong cùng 1 transaction.
+    `replace=True` xoá toàn bộ state cũ của detector (dùng khi full recompute).
+    """
+    params = [
+        {
+            "detector": detector,
+            "isp": key[0],
+            "account_login_vqt": key[1],
+            "server_name": key[2],
+            "state": json.dumps(state),
+        }
+        for key, state in states.items()
+    ]
+    with engine_sqlite.begin() as conn:
+        _ensure_tables(conn)
+        if replace:
+            conn.execute(
+                text("DELETE FROM detector_series_state WHERE detector = :detector"),
+                {"detector": detector},
+            )
+        if params:
+            conn.execute(
+                text("""
+                    INSERT INTO detector_series_state (detector, isp, account_login_vqt, server_name, state)
+                    VALUES (:detector, :isp, :account_login_vqt, :server_name, :state)
+                    ON CONFLICT (detector, isp, account_login_vqt, server_name)
+                    DO UPDATE SET state = excluded.state
+                """),
+                params,
+            )
+        conn.execute(
+            text("""
+                INSERT INTO detector_watermark (detector, watermark)
+                VALUES (:detector, :watermark)
+                ON CONFLICT (detector) DO UPDATE SET watermark = excluded.watermark
+            """),
+            {"detector": detector, "watermark": watermark.isoformat()},
+        )
+
+
+def load_backfill_progress(job_id: str) -> pd.Timestamp | None:
+    """Thời điểm kết thúc của chunk cuối cùng đã backfill xong (None nếu job chưa chạy)."""
+    with engine_sqlite.begin() as conn:
+        _ensure_tables(conn)
+        value = conn.execute(
+            text("SELECT last_completed FROM backfill_progress WHERE job_id = :job_id"),
+            {"job_id": job_id},
+        ).scalar()
+    return pd.Timestamp(value) if value else None
+
+
+def save_backfill_progress(job_id: str, last_completed: pd.Timestamp) -> None:
+    with engine_sqlite.begin() as conn:
+        _ensure_tables(conn)
+        conn.execute(
+            text("""
+                INSERT INTO backfill_progress (job_id, last_completed)
+                VALUES (:job_id, :last_completed)
+                ON CONFLICT (job_id) DO UPDATE SET last_completed = excluded.last_completed
+            """),
+            {"job_id": job_id, "last_completed": last_completed.isoformat()},
+        )
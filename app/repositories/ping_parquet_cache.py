@@ -0,0 +1,132 @@
+"""
+Cache Parquet theo partition ngày của ping_results_aggregate.
+
+Các ngày đã đóng (kết thúc trước `now - PING_CACHE_SETTLE_HOURS`) được ghi ra
+`<PING_CACHE_DIR>/<aggregate_level>/<YYYY-MM-DD>.parquet` và các lần đọc sau đọc thẳng từ file
+(memory-mapped). Chỉ partition đang mở được query từ Postgres.
+
+Dòng đến muộn (sau settle window): số dòng của `PING_CACHE_REVALIDATE_DAYS` partition đã đóng gần nhất
+(lấy từ metadata Parquet) được so với 1 query đếm GROUP BY ngày trên đúng các ngày đó; partition lệch
+được ghi lại. Các ngày cũ hơn không chạm tới Postgres.
+
+Partition luôn chứa DETECTION_COLUMNS; yêu cầu cột ngoài tập này đọc thẳng từ DB (bỏ qua cache).
+"""
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.repositories.ping_results_repo import (
+    DETECTION_COLUMNS,
+    GROUP_COLS,
+    count_ping_rows_by_day,
+    fetch_ping_columns,
+)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def cache_dir() -> Path:
+    path = Path(settings.PING_CACHE_DIR)
+    return path if path.is_absolute() else BASE_DIR / path
+
+
+def partition_path(aggregate_level: str, day: pd.Timestamp) -> Path:
+    return cache_dir() / aggregate_level / f"{day:%Y-%m-%d}.parquet"
+
+
+def _read_partition(path: Path, columns: list[str], start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    table = pq.read_table(path, columns=columns, memory_map=True)
+    df = table.to_pandas()
+    times = df["testing_time"]
+    return df[(times >= start) & (times < end)]
+
+
+def _write_partition(path: Path, df: pd.DataFrame) -> None:
+    """Ghi ra file tạm rồi rename để process khác không đọc phải file ghi dở."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp)
+    os.replace(tmp, path)
+
+
+def fetch_ping_cached(
+    db: Session,
+    aggregate_level: str,
+    from_time,
+    to_time=None,
+    columns: list[str] | None = None,
+    now: datetime | None = None,
+) -> pd.DataFrame:
+    """
+    Giống `fetch_ping_columns(db, aggregate_level, from_time, to_time, columns)` nhưng đọc
+    các ngày đã đóng từ cache Parquet (tự điền cache ở lần đọc đầu tiên).
+    """
+    columns = list(columns or DETECTION_COLUMNS)
+    if not settings.PING_CACHE_ENABLED or not set(columns) <= set(DETECTION_COLUMNS):
+        return fetch_ping_columns(db, aggregate_level, from_time=from_time, to_time=to_time, columns=columns)
+
+    now = pd.Timestamp(now or datetime.now())
+    start = pd.Timestamp(from_time)
+    end = pd.Timestamp(to_time) if to_time is not None else now + pd.Timedelta(hours=1)
+    closed_before = now - pd.Timedelta(hours=settings.PING_CACHE_SETTLE_HOURS)
+
+    closed_days = []
+    open_from = None
+    day = start.floor("D")
+    while day < end:
+        day_end = day + pd.Timedelta(days=1)
+        if day_end > closed_before:
+            # Partition đang mở (và mọi ngày sau nó) -> đọc thẳng từ DB 1 lần
+            open_from = max(day, start)
+            break
+        closed_days.append(day)
+        day = day_end
+
+    stale = set()
+    # Chỉ các ngày vừa đóng còn có thể nhận dòng đến muộn
+    mutable_from = closed_before.floor("D") - pd.Timedelta(days=settings.PING_CACHE_REVALIDATE_DAYS)
+    cached = [d for d in closed_days if d >= mutable_from and partition_path(aggregate_level, d).exists()]
+    if cached:
+        counts = count_ping_rows_by_day(db, aggregate_level, cached[0], cached[-1] + pd.Timedelta(days=1))
+        stale = {
+            d for d in cached
+            if pq.read_metadata(partition_path(aggregate_level, d)).num_rows != counts.get(d, 0)
+        }
+
+    frames = []
+    for day in closed_days:
+        day_end = day + pd.Timedelta(days=1)
+        path = partition_path(aggregate_level, day)
+        if day in stale or not path.exists():
+            full_day = fetch_ping_columns(db, aggregate_level, from_time=day, to_time=day_end)
+            if full_day.empty:
+                full_day = pd.DataFrame(columns=DETECTION_COLUMNS)
+            _write_partition(path, full_day)
+        frames.append(_read_partition(path, columns, max(day, start), min(day_end, end)))
+
+    if open_from is not None:
+        frames.append(fetch_ping_columns(db, aggregate_level, from_time=open_from, to_time=to_time, columns=columns))
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.concat(frames, ignore_index=True)
+    # Mỗi partition có bộ category riêng -> concat ra object, đưa group key về categorical
+    for c in GROUP_COLS + ["aggregate_level"]:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    return df
+
+
+def clear_ping_cache(aggregate_level: str | None = None) -> None:
+    """Xoá cache (vd: sau khi dữ liệu lịch sử được tính lại trên Postgres)."""
+    target = cache_dir() / aggregate_level if aggregate_level else cache_dir()
+    shutil.rmtree(target, ignore_errors=True)
@@ -1,27 +1,45 @@
+import numpy as np
 import pandas as pd
 import traceback
+from typing import Literal
+from pandas.api.types import union_categoricals
 from sqlalchemy import text
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
+from app.db.session import engine_sqlite
+
+# Khoá của 1 series và các metric dùng cho anomaly detection
+GROUP_COLS = ["isp", "account_login_vqt", "server_name"]
+METRICS = ["mean_jitter", "mean_average_latency", "mean_packet_loss_rate"]
+
+PING_TABLE = "log_data_aggregate.ping_results_aggregate"
+
+# Các cột cần cho detection (khoá series + cột anomaly store dùng + metric)
+DETECTION_COLUMNS = GROUP_COLS + ["aggregate_level", "testing_time", "sample_count"] + METRICS
+# Cột số: cast ::float8 ngay trên server thay vì nhận Decimal rồi convert trong Python
+FLOAT_COLUMNS = set(METRICS) | {"sample_count"}
 
 
 def fetch_ping_data(
     db: Session,
     aggregate_level: str,
     from_time,
+    to_time=None,
 ) -> pd.DataFrame:
     try:
-        sql = text("""
+        # to_time (không bao gồm) dùng khi chạy theo từng chunk (backfill)
+        to_filter = "AND testing_time < :to_time" if to_time is not None else ""
+        sql = text(f"""
             SELECT * 
-            FROM log_data_aggregate.ping_results_aggregate
+            FROM {PING_TABLE}
             WHERE testing_time >= :from_time
               AND aggregate_level = :aggregate_level
+              {to_filter}
         """)
 
         result = (
             db.execute(
                 sql,
-                {"from_time": from_time, "aggregate_level": aggregate_level}
+                {"from_time": from_time, "to_time": to_time, "aggregate_level": aggregate_level}
             )
             .mappings()
             .all()
@@ -35,14 +53,177 @@ def fetch_ping_data(
         raise
 
 
-def save_to_sqlite(df: pd.DataFrame, table_name: str = "ping_anomaly"):
-    engine = create_engine("sqlite:///ping_results.db")
+def _column_chunk(name: str, values: tuple):
+    if name in FLOAT_COLUMNS:
+        return np.array(values, dtype=np.float64)  # None -> NaN
+    if name == "testing_time":
+        return pd.to_datetime(pd.Series(values, dtype=object)).to_numpy()
+    # Text (group key, aggregate_level): categorical theo từng chunk, không giữ list str của từng dòng
+    return pd.Categorical(values)
+
+
+def count_ping_rows_by_day(db: Session, aggregate_level: str, from_time, to_time) -> dict[pd.Timestamp, int]:
+    """Số dòng theo từng ngày trong [from_time, to_time) (1 query, dùng để kiểm tra cache Parquet)."""
+    sql = text(f"""
+        SELECT date_trunc('day', testing_time) AS day, COUNT(*) AS n
+        FROM {PING_TABLE}
+        WHERE aggregate_level = :aggregate_level
+          AND testing_time >= :from_time
+          AND testing_time < :to_time
+        GROUP BY 1
+    """)
+    rows = db.execute(sql, {"aggregate_level": aggregate_level, "from_time": from_time, "to_time": to_time}).all()
+    return {pd.Timestamp(day): int(n) for day, n in rows}
+
+
+def fetch_ping_columns(
+    db: Session,
+    aggregate_level: str,
+    from_time=None,
+    to_time=None,
+    after_time=None,
+    columns: list[str] | None = None,
+    chunk_size: int = 50_000,
+) -> pd.DataFrame:
+    """
+    Bản columnar của `fetch_ping_data`:
+    - chỉ SELECT các cột trong `columns` (mặc định DETECTION_COLUMNS), metric cast ::float8 trên server;
+    - đọc bằng server-side cursor theo từng chunk `chunk_size` dòng, mỗi chunk đổi ngay thành
+      mảng numpy float64 / datetime64 / categorical thay vì giữ list RowMapping.
+    Khoảng thời gian: [from_time, to_time) và/hoặc testing_time > after_time.
+    """
+    columns = list(columns or DETECTION_COLUMNS)
+    select = ", ".join(f"{c}::float8 AS {c}" if c in FLOAT_COLUMNS else c for c in columns)
+    filters = ["aggregate_level = :aggregate_level"]
+    if from_time is not None:
+        filters.append("testing_time >= :from_time")
+    if to_time is not None:
+        filters.append("testing_time < :to_time")
+    if after_time is not None:
+        filters.append("testing_time > :after_time")
+    sql = text(f"""
+        SELECT {select}
+        FROM {PING_TABLE}
+        WHERE {" AND ".join(filters)}
+    """)
+    params = {
+        "aggregate_level": aggregate_level,
+        "from_time": from_time,
+        "to_time": to_time,
+        "after_time": after_time,
+    }
+
+    try:
+        chunks: dict[str, list] = {c: [] for c in columns}
+        # Option theo từng statement: không đổi connection của Session (các query sau vẫn là cursor thường)
+        result = db.execute(
+            sql, params, execution_options={"stream_results": True, "max_row_buffer": chunk_size}
+        )
+        for rows in result.partitions(chunk_size):
+            for name, values in zip(columns, zip(*rows)):
+                chunks[name].append(_column_chunk(name, values))
+    except Exception as e:
+        traceback.print_exc()
+        raise
+
+    if not chunks[columns[0]]:
+        return pd.DataFrame(columns=columns)
+
+    data = {}
+    for name, parts in chunks.items():
+        if isinstance(parts[0], pd.Categorical):
+            data[name] = union_categoricals(parts, sort_categories=True)
+        else:
+            data[name] = np.concatenate(parts)
+    return pd.DataFrame(data, columns=columns)
+
+
+def fetch_zscore_anomalies(
+    db: Session,
+    aggregate_level: str,
+    from_time,
+    window: int,
+    threshold: float,
+    metrics: list[str] = METRICS,
+    to_time=None,
+) -> pd.DataFrame:
+    """
+    Tính rolling z-score ngay trên Postgres bằng window function và chỉ trả về các dòng bất thường.
+    Cùng ngữ nghĩa với ZScoreScorer trên pandas: mean / std (ddof=0) của đúng `window` dòng
+    TRƯỚC mỗi dòng trong cùng series, NULL nếu chưa đủ `window` giá trị.
+    Cột trả về: khoá series, aggregate_level, testing_time, sample_count, metric, `<metric>__z`, `<metric>__mean_hist`.
+    """
+    window = int(window)
+    to_filter = "AND testing_time < :to_time" if to_time is not None else ""
+    stats = ",\n".join(
+        f'{m}::float8 AS "{m}", '
+        f'AVG({m}::float8) OVER w AS "{m}__mean", '
+        f'STDDEV_POP({m}::float8) OVER w AS "{m}__std", '
+        f'COUNT({m}) OVER w AS "{m}__n"'
+        for m in metrics
+    )
+    # Chưa đủ `window` giá trị trước đó -> NULL (giống rolling min_periods=window của pandas)
+    scores = ",\n".join(
+        f'"{m}", CASE WHEN "{m}__n" = {window} THEN ("{m}" - "{m}__mean") '
+        f'/ (CASE WHEN "{m}__std" = 0 THEN 1e-9 ELSE "{m}__std" END) END AS "{m}__z", '
+        f'CASE WHEN "{m}__n" = {window} THEN "{m}__mean" END AS "{m}__mean_hist"'
+        for m in metrics
+    )
+    output = ", ".join(f'"{m}", "{m}__z", "{m}__mean_hist"' for m in metrics)
+    is_anomaly = " OR ".join(f'ABS("{m}__z") > :threshold' for m in metrics)
+
+    sql = text(f"""
+        WITH stats AS (
+            SELECT isp, account_login_vqt, server_name, aggregate_level, testing_time, sample_count,
+            {stats}
+            FROM {PING_TABLE}
+            WHERE testing_time >= :from_time
+              AND aggregate_level = :aggregate_level
+              {to_filter}
+            WINDOW w AS (
+                PARTITION BY isp, account_login_vqt, server_name
+                ORDER BY testing_time
+                ROWS BETWEEN {window} PRECEDING AND 1 PRECEDING
+            )
+        ), scored AS (
+            SELECT isp, account_login_vqt, server_name, aggregate_level, testing_time, sample_count,
+            {scores}
+            FROM stats
+        )
+        SELECT isp, account_login_vqt, server_name, aggregate_level, testing_time, sample_count, {output}
+        FROM scored
+        WHERE {is_anomaly}
+        ORDER BY isp, account_login_vqt, server_name, testing_time
+    """)
+
+    try:
+        result = db.execute(
+            sql,
+            {
+                "from_time": from_time,
+                "to_time": to_time,
+                "aggregate_level": aggregate_level,
+                "threshold": threshold,
+            },
+        )
+        return pd.DataFrame(result.all(), columns=list(result.keys()))
+
+    except Exception as e:
+        traceback.print_exc()
+        raise
+
 
+def save_to_sqlite(
+    df: pd.DataFrame,
+    table_name: str = "ping_anomaly",
+    if_exists: Literal["fail", "replace", "append"] = "replace",
+):
+    """Ghi nguyên DataFrame (dùng cho các bảng thử nghiệm; kết quả scorer dùng anomaly_store)."""
     for c in df.select_dtypes(include="object").columns:
         try:
             df[c] = pd.to_numeric(df[c])
         except Exception:
             pass  # giữ nguyên cột text
 
-    df.to_sql(table_name, engine, if_exists="replace", index=False)
+    df.to_sql(table_name, engine_sqlite, if_exists=if_exists, index=False)
 
@@ -0,0 +1,139 @@
+"""
+Backfill anomaly detection cho một khoảng thời gian lịch sử.
+
+Ví dụ:
+    python -m app.services.anomaly_backfill --from 2026-01-01 --to 2026-02-01 \
+        --scorer zscore --scorer robust_zscore --workers 8
+"""
+import argparse
+
+import pandas as pd
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.repositories.detector_state_repo import load_backfill_progress, save_backfill_progress
+from app.repositories.ping_parquet_cache import fetch_ping_cached
+from app.services.anomaly_engine import (
+    SCORERS, create_scorer, level_step, prepare_series, split_by_backend, store_anomalies,
+)
+
+
+def iter_chunks(start: pd.Timestamp, end: pd.Timestamp, chunk_hours: int):
+    """Chia [start, end) thành các chunk [chunk_start, chunk_end) dài `chunk_hours` giờ."""
+    step = pd.Timedelta(hours=chunk_hours)
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + step, end)
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end
+
+
+def run_backfill(
+    from_time,
+    to_time,
+    scorer_names: list[str],
+    workers: int | None = None,
+    window: int | None = None,
+    chunk_hours: int = 24,
+    overlap_hours: int | None = None,
+    threshold: float = 2,
+    aggregate_level: str = "hour",
+    restart: bool = False,
+    backend: str = "pandas",
+) -> int:
+    """
+    Chấm điểm từng chunk rồi upsert kết quả vào bảng của từng scorer trước khi đọc chunk tiếp theo,
+    nên bộ nhớ chỉ phụ thuộc kích thước chunk (+ phần overlap), không phụ thuộc độ dài khoảng backfill.
+
+    - Mỗi chunk lấy thêm `overlap_hours` giờ trước đó làm lịch sử; mặc định = window lớn nhất
+      (số điểm) x bước thời gian của `aggregate_level`.
+    - Tiến độ được lưu sau mỗi chunk; chạy lại cùng tham số sẽ tiếp tục từ chunk chưa xong
+      (`restart=True` để chạy lại từ đầu).
+    - `backend="sql"`: scorer hỗ trợ SQL được tính trên Postgres, chỉ kéo về các dòng bất thường.
+    """
+    start, end = pd.Timestamp(from_time), pd.Timestamp(to_time)
+    scorers = [create_scorer(name, window=window, threshold=threshold) for name in scorer_names]
+    sql_scorers, pandas_scorers = split_by_backend(scorers, backend)
+    if overlap_hours:
+        overlap = pd.Timedelta(hours=overlap_hours)
+    else:
+        overlap = max(s.window for s in scorers) * level_step(aggregate_level)
+
+    job_id = f"{','.join(scorer_names)}:{aggregate_level}:{start.isoformat()}:{end.isoformat()}"
+    done_until = None if restart else load_backfill_progress(job_id)
+    if done_until is not None:
+        print(f"Resuming backfill {job_id} from {done_until}")
+        start = max(start, done_until)
+
+    total = 0
+    for chunk_start, chunk_end in iter_chunks(start, end, chunk_hours):
+        df = pd.DataFrame()
+        db = SessionLocal()
+        try:
+            for scorer in sql_scorers:
+                anomalies = scorer.detect_sql(db, aggregate_level, chunk_start - overlap, chunk_end)
+                anomalies = anomalies[pd.to_datetime(anomalies["testing_time"]) >= chunk_start]
+                store_anomalies(scorer, anomalies)
+                total += len(anomalies)
+            if pandas_scorers:
+                df = fetch_ping_cached(
+                    db=db,
+                    aggregate_level=aggregate_level,
+                    from_time=chunk_start - overlap,
+                    to_time=chunk_end,
+                )
+        finally:
+            db.close()
+
+        if not df.empty:
+            series = prepare_series(df)
+            in_chunk = series.frame["testing_time"] >= chunk_start
+            for scorer in pandas_scorers:
+                anomalies = scorer.detect(series, workers=workers)
+                # Các dòng overlap chỉ dùng làm lịch sử, đã được lưu ở chunk trước
+                anomalies = anomalies[in_chunk.loc[anomalies.index]]
+                store_anomalies(scorer, anomalies, series.metrics)
+                total += len(anomalies)
+
+        save_backfill_progress(job_id, chunk_end)
+        print(f"[{chunk_start} -> {chunk_end}] {len(df)} rows processed")
+
+    print(f"Backfill finished: {total} anomalies saved.")
+    return total
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Backfill ping anomaly detection")
+    parser.add_argument("--from", dest="from_time", required=True, help="Start time (inclusive), e.g. 2026-01-01")
+    parser.add_argument("--to", dest="to_time", required=True, help="End time (exclusive), e.g. 2026-02-01")
+    parser.add_argument(
+        "--scorer", dest="scorers", action="append", choices=sorted(SCORERS),
+        help="Scorer to run (repeatable). Default: zscore",
+    )
+    parser.add_argument("--workers", type=int, default=settings.DETECTION_WORKERS)
+    parser.add_argument("--window", type=int, default=None, help="History window (default: scorer default)")
+    parser.add_argument("--chunk-hours", type=int, default=24)
+    parser.add_argument("--overlap-hours", type=int, default=None)
+    parser.add_argument("--threshold", type=float, default=2)
+    parser.add_argument("--aggregate-level", default="hour")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress")
+    parser.add_argument("--backend", choices=["pandas", "sql"], default=settings.DETECTION_BACKEND)
+    args = parser.parse_args(argv)
+
+    run_backfill(
+        from_time=args.from_time,
+        to_time=args.to_time,
+        scorer_names=args.scorers or ["zscore"],
+        workers=args.workers,
+        window=args.window,
+        chunk_hours=args.chunk_hours,
+        overlap_hours=args.overlap_hours,
+        threshold=args.threshold,
+        aggregate_level=args.aggregate_level,
+        restart=args.restart,
+        backend=args.backend,
+    )
+
+
+if __name__ == "__main__":
+    main()
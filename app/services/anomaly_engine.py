@@ -0,0 +1,379 @@
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import TypeVar
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from app.db.session import SessionLocal
+from app.repositories.anomaly_store import upsert_anomalies
+from app.repositories.baseline_repo import load_baseline
+from app.repositories.ping_parquet_cache import fetch_ping_cached
+from app.repositories.ping_results_repo import GROUP_COLS, METRICS, fetch_zscore_anomalies
+from app.services.baseline_profile import baseline_lookup, baseline_profile_name
+from app.services.ewma_stats import EwmaState, ewma_scan
+from app.services.parallel_detection import grouped_rolling_stats, series_hashes
+from app.services.ping_tensor import build_ping_tensor
+
+# Khoảng cách giữa 2 điểm liên tiếp của 1 series theo aggregate_level:
+# window của scorer là số điểm, đổi sang khoảng thời gian cần đọc bằng `window * level_step(level)`
+_LEVEL_STEPS = {
+    "minute": pd.Timedelta(minutes=1),
+    "hour": pd.Timedelta(hours=1),
+    "day": pd.Timedelta(days=1),
+    "week": pd.Timedelta(weeks=1),
+}
+
+
+def level_step(aggregate_level: str) -> pd.Timedelta:
+    """Bước thời gian của `aggregate_level` ('hour', 'day', ... hoặc offset pandas như '15min')."""
+    step = _LEVEL_STEPS.get(aggregate_level)
+    if step is not None:
+        return step
+    try:
+        # .nanos chỉ có nghĩa với offset cố định (Tick), offset lịch như 'MS' sẽ raise ValueError
+        return pd.Timedelta(to_offset(aggregate_level).nanos, unit="ns")
+    except ValueError as e:
+        raise ValueError(f"Unsupported aggregate_level: {aggregate_level}") from e
+
+
+@dataclass
+class PreparedSeries:
+    """
+    Dữ liệu ping đã chuẩn bị 1 lần cho mọi scorer:
+    sort theo series + thời gian, metric chuyển sang float, mã series cho từng dòng.
+    """
+    frame: pd.DataFrame
+    group_cols: list[str]
+    metrics: list[str]
+    values: np.ndarray   # [rows, metrics] float64
+    codes: np.ndarray    # mã series của từng dòng, -1 nếu group key bị NaN
+    _hashes: np.ndarray | None = field(default=None, repr=False)
+    _stats_cache: dict = field(default_factory=dict, repr=False)
+
+    @property
+    def hashes(self) -> np.ndarray:
+        if self._hashes is None:
+            self._hashes = series_hashes(self.frame, self.group_cols)
+        return self._hashes
+
+    def rolling_stats(
+        self,
+        kernel: str,
+        window: int,
+        min_periods: int | None = None,
+        workers: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Rolling stats của `window` điểm TRƯỚC mỗi dòng; dùng chung giữa các scorer."""
+        key = (kernel, window, min_periods)
+        if key not in self._stats_cache:
+            self._stats_cache[key] = grouped_rolling_stats(
+                self.values, self.codes, kernel, window,
+                min_periods=min_periods, shift=1, workers=workers,
+                hashes=self.hashes if workers and workers > 1 else None,
+            )
+        return self._stats_cache[key]
+
+
+def prepare_series(
+    df: pd.DataFrame,
+    group_cols: list[str] = GROUP_COLS,
+    metrics: list[str] = METRICS,
+    time_col: str = "testing_time",
+) -> PreparedSeries:
+    # 1. Sắp xếp dữ liệu để đảm bảo tính đúng đắn của rolling window
+    df = df.sort_values(by=group_cols + [time_col])
+
+    # 2. Chuyển đổi sang float (Fix lỗi Decimal từ DB); fetch_ping_columns đã trả về float64
+    for col in metrics:
+        if df[col].dtype != np.float64:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+
+    codes = df.groupby(group_cols, sort=False, observed=True).ngroup().to_numpy()
+    return PreparedSeries(
+        frame=df,
+        group_cols=group_cols,
+        metrics=metrics,
+        values=df[metrics].to_numpy(dtype=float),
+        codes=codes,
+    )
+
+
+class BaseScorer(ABC):
+    """
+    Interface chung cho các thuật toán chấm điểm bất thường.
+    Mỗi scorer ghi kết quả vào bảng riêng `table_name`.
+    """
+    name: str = ""
+    default_window: int = 72
+    # Các hậu tố cột do `score()` sinh ra (dùng để tạo schema cố định cho anomaly store)
+    output_suffixes: tuple[str, ...] = ()
+    # True nếu scorer tính được ngay trên Postgres (chỉ các lớp con của SqlScorer)
+    supports_sql: bool = False
+
+    def __init__(self, window: int | None = None, threshold: float = 3.5):
+        self.window = window or self.default_window
+        self.threshold = threshold
+
+    @property
+    def table_name(self) -> str:
+        return f"ping_anomaly_{self.name}"
+
+    @property
+    @abstractmethod
+    def score_suffix(self) -> str:
+        """Hậu tố của cột điểm dùng để so với threshold (vd: `__z`)"""
+        pass
+
+    @abstractmethod
+    def score(self, series: PreparedSeries, workers: int | None = None) -> dict[str, np.ndarray]:
+        """
+        Trả về {hậu tố cột: mảng [rows, metrics]}; phải chứa `score_suffix`.
+        Thứ tự key là thứ tự cột được gắn vào kết quả.
+        """
+        pass
+
+    def detect(self, series: PreparedSeries, workers: int | None = None) -> pd.DataFrame:
+        """Lọc các dòng có |score| > threshold ở bất kỳ metric nào và gắn thông tin debug."""
+        columns = self.score(series, workers)
+        with np.errstate(invalid="ignore"):
+            is_anomaly = np.asarray((np.abs(columns[self.score_suffix]) > self.threshold).any(axis=1), dtype=bool)
+
+        result = series.frame.loc[is_anomaly].copy()
+        for j, m in enumerate(series.metrics):
+            for suffix, arr in columns.items():
+                result[f"{m}{suffix}"] = arr[is_anomaly, j]
+        return result
+
+
+
+class SqlScorer(BaseScorer):
+    """Scorer có thêm backend Postgres (`detect_sql`) bên cạnh `detect` trên pandas."""
+    supports_sql = True
+
+    @abstractmethod
+    def detect_sql(self, db, aggregate_level: str, from_time, to_time=None, metrics: list[str] = METRICS) -> pd.DataFrame:
+        """Như `detect` nhưng tính trên Postgres, chỉ các dòng bất thường được trả về."""
+        pass
+
+
+def split_by_backend(scorers: list[BaseScorer], backend: str) -> tuple[list[SqlScorer], list[BaseScorer]]:
+    """
+    Chọn backend cho từng scorer: với `backend="sql"` các SqlScorer chạy trên Postgres,
+    mọi scorer còn lại (và toàn bộ khi `backend="pandas"`) chạy trên pandas.
+    """
+    if backend not in ("pandas", "sql"):
+        raise ValueError(f"Unsupported backend: {backend}")
+    sql_scorers = [s for s in scorers if backend == "sql" and isinstance(s, SqlScorer)]
+    return sql_scorers, [s for s in scorers if s not in sql_scorers]
+
+
+SCORERS: dict[str, type[BaseScorer]] = {}
+ScorerT = TypeVar("ScorerT", bound=BaseScorer)
+
+
+def register_scorer(cls: type[ScorerT]) -> type[ScorerT]:
+    SCORERS[cls.name] = cls
+    return cls
+
+
+def create_scorer(name: str, **kwargs) -> BaseScorer:
+    if name not in SCORERS:
+        raise ValueError(f"Unsupported scorer: {name}. Available: {sorted(SCORERS)}")
+    return SCORERS[name](**kwargs)
+
+
+@register_scorer
+class ZScoreScorer(SqlScorer):
+    """Z = (value_t - mean) / std của `window` điểm trước đó."""
+    name = "zscore"
+    default_window = 72
+    output_suffixes = ("__z", "__mean_hist")
+
+    @property
+    def score_suffix(self) -> str:
+        return "__z"
+
+    def score(self, series: PreparedSeries, workers: int | None = None) -> dict[str, np.ndarray]:
+        means, stds = series.rolling_stats("mean_std", self.window, workers=workers)
+        # Tránh chia cho 0
+        z = (series.values - means) / np.where(stds == 0, 1e-9, stds)
+        return {"__z": z, "__mean_hist": means}
+
+    def detect_sql(self, db, aggregate_level: str, from_time, to_time=None, metrics: list[str] = METRICS) -> pd.DataFrame:
+        return fetch_zscore_anomalies(
+            db, aggregate_level, from_time, self.window, self.threshold, metrics=metrics, to_time=to_time
+        )
+
+
+@register_scorer
+class RobustZScoreScorer(BaseScorer):
+    """Z = (value_t - median) / (MAD * 1.4826) của `window` điểm trước đó."""
+    name = "robust_zscore"
+    default_window = 120
+    output_suffixes = ("__z_robust", "__median_hist", "__mad_hist")
+
+    @property
+    def score_suffix(self) -> str:
+        return "__z_robust"
+
+    def score(self, series: PreparedSeries, workers: int | None = None) -> dict[str, np.ndarray]:
+        medians, mads = series.rolling_stats("median_mad", self.window, workers=workers)
+        # Scale MAD: MAD * 1.4826 ~ Sigma; lịch sử phẳng (MAD=0) -> tránh chia cho 0
+        sigma = mads * 1.4826
+        z = (series.values - medians) / np.where(sigma == 0, 1e-9, sigma)
+        return {"__z_robust": z, "__median_hist": medians, "__mad_hist": mads}
+
+
+@register_scorer
+class EwmaScorer(BaseScorer):
+    """
+    Z = (value_t - EWMA mean) / EWMA std, tính theo giờ thực trên tensor [series, hours, metrics]
+    và vectorized trên toàn bộ series. alpha = 2 / (window + 1).
+
+    State cuối cùng của mỗi series (vài float) nằm trong `final_states` sau khi score,
+    truyền lại qua `initial_states` ở lần chạy sau để không phải đọc lại lịch sử.
+    """
+    name = "ewma"
+    default_window = 72
+    seasonal = False
+    output_suffixes = ("__z_ewma", "__ewma_expected", "__ewma_std")
+
+    def __init__(
+        self,
+        window: int | None = None,
+        threshold: float = 3.5,
+        gamma: float = 0.3,
+        min_periods: int = 24,
+        initial_states: Mapping | None = None,
+    ):
+        super().__init__(window, threshold)
+        self.alpha = 2 / (self.window + 1)
+        self.gamma = gamma
+        self.min_periods = min_periods
+        self.initial_states = initial_states
+        self.final_states: dict = {}
+
+    @property
+    def score_suffix(self) -> str:
+        return "__z_ewma"
+
+    def score(self, series: PreparedSeries, workers: int | None = None) -> dict[str, np.ndarray]:
+        tensor = build_ping_tensor(series.frame, metrics=series.metrics, group_cols=series.group_cols)
+        keys = tensor.key_tuples()
+        state = EwmaState.from_series_states(keys, self.initial_states, len(series.metrics), self.seasonal)
+        z, expected, std = ewma_scan(
+            tensor.values, tensor.hours_of_day, state,
+            alpha=self.alpha, gamma=self.gamma, min_periods=self.min_periods,
+        )
+        self.final_states = state.to_series_states(keys)
+        return {
+            "__z_ewma": tensor.gather_rows(z),
+            "__ewma_expected": tensor.gather_rows(expected),
+            "__ewma_std": tensor.gather_rows(std),
+        }
+
+
+@register_scorer
+class HoltWintersScorer(EwmaScorer):
+    """EWMA + thành phần mùa vụ theo giờ trong ngày (Holt-Winters dạng cộng, không trend)."""
+    name = "holt_winters"
+    seasonal = True
+
+
+@register_scorer
+class BaselineScorer(BaseScorer):
+    """
+    Z = (value_t - median) / (MAD * 1.4826) của cùng (thứ trong tuần, giờ) trong baseline tính sẵn
+    (xem `baseline_profile.refresh_baseline`). Chỉ là tra bảng, không cần lịch sử.
+    """
+    name = "baseline"
+    default_window = 0  # baseline đã được tính trước, không cần fetch thêm lịch sử
+    output_suffixes = ("__z_baseline", "__baseline_median", "__baseline_mad")
+
+    def __init__(
+        self,
+        window: int | None = None,
+        threshold: float = 3.5,
+        profile: str | None = None,
+        min_samples: int = 3,
+        baseline: pd.DataFrame | None = None,
+    ):
+        super().__init__(window, threshold)
+        self.profile = profile or baseline_profile_name()
+        self.min_samples = min_samples
+        self.baseline = baseline
+
+    @property
+    def score_suffix(self) -> str:
+        return "__z_baseline"
+
+    def score(self, series: PreparedSeries, workers: int | None = None) -> dict[str, np.ndarray]:
+        if self.baseline is None:
+            self.baseline = load_baseline(self.profile)
+        medians, mads = baseline_lookup(
+            self.baseline, series.frame, series.metrics, series.group_cols, min_samples=self.min_samples
+        )
+        sigma = mads * 1.4826
+        z = (series.values - medians) / np.where(sigma == 0, 1e-9, sigma)
+        return {"__z_baseline": z, "__baseline_median": medians, "__baseline_mad": mads}
+
+
+def store_anomalies(scorer: BaseScorer, anomalies: pd.DataFrame, metrics: list[str] = METRICS) -> int:
+    """Upsert kết quả của scorer vào bảng riêng của nó."""
+    return upsert_anomalies(
+        scorer.table_name, scorer.name, anomalies, metrics, list(scorer.output_suffixes)
+    )
+
+
+def run_scorers(
+    scorer_names: list[str],
+    target_time,
+    aggregate_level: str = "hour",
+    threshold: float = 2,
+    workers: int | None = None,
+    backend: str = "pandas",
+) -> dict[str, pd.DataFrame]:
+    """
+    Fetch + chuẩn bị dữ liệu 1 lần, chạy nhiều scorer trên cùng các mảng numpy
+    và lưu kết quả của mỗi scorer vào bảng riêng.
+
+    `backend="sql"`: các scorer hỗ trợ (`supports_sql`) được tính ngay trên Postgres và chỉ
+    kéo về các dòng bất thường; scorer còn lại vẫn chạy trên pandas.
+    """
+    scorers = [create_scorer(name, threshold=threshold) for name in scorer_names]
+    sql_scorers, pandas_scorers = split_by_backend(scorers, backend)
+
+    results = {}
+    db = SessionLocal()
+    try:
+        for scorer in sql_scorers:
+            fetch_from = pd.to_datetime(target_time) - scorer.window * level_step(aggregate_level)
+            anomalies = scorer.detect_sql(db, aggregate_level, fetch_from)
+            store_anomalies(scorer, anomalies)
+            print(f"Found and saved {len(anomalies)} anomalies ({scorer.name}, sql).")
+            results[scorer.name] = anomalies
+
+        if not pandas_scorers:
+            return results
+        history = max(s.window for s in pandas_scorers)
+        fetch_from = pd.to_datetime(target_time) - history * level_step(aggregate_level)
+        df = fetch_ping_cached(db=db, aggregate_level=aggregate_level, from_time=fetch_from)
+    finally:
+        db.close()
+
+    if df.empty:
+        print("No data found.")
+        return results
+
+    print(f"Processing {len(df)} rows with scorers: {', '.join(s.name for s in pandas_scorers)}")
+    series = prepare_series(df)
+
+    for scorer in pandas_scorers:
+        anomalies = scorer.detect(series, workers=workers)
+        store_anomalies(scorer, anomalies, series.metrics)
+        print(f"Found and saved {len(anomalies)} anomalies ({scorer.name}).")
+        results[scorer.name] = anomalies
+    return results
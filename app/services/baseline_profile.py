@@ -0,0 +1,157 @@
+"""
+Baseline median/MAD theo (thứ trong tuần, giờ trong ngày) cho từng series.
+
+Baseline được build 1 lần rồi refresh incremental: mỗi lần chạy chỉ tính lại các ô
+(weekday, hour) có dữ liệu mới, đọc đúng các giờ đó trong `lookback_weeks` tuần gần nhất.
+Scorer `baseline` chỉ cần tra bảng này, không phải tính rolling window.
+
+    python -m app.services.baseline_profile [--full]
+"""
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.db.session import SessionLocal
+from app.repositories.baseline_repo import PROFILE_KEY_COLS, save_baseline
+from app.repositories.detector_state_repo import load_detector_state, save_detector_state
+from app.repositories.ping_parquet_cache import fetch_ping_cached
+from app.repositories.ping_results_repo import GROUP_COLS, METRICS, fetch_ping_columns
+
+DEFAULT_LOOKBACK_WEEKS = 8
+
+
+def baseline_profile_name(aggregate_level: str = "hour", lookback_weeks: int = DEFAULT_LOOKBACK_WEEKS) -> str:
+    return f"{aggregate_level}:{lookback_weeks}w"
+
+
+def _slot_keys(df: pd.DataFrame, group_cols: list[str], time_col: str) -> pd.DataFrame:
+    times = pd.to_datetime(df[time_col])
+    keys = df[group_cols].astype(str)
+    keys["weekday"] = times.dt.weekday.to_numpy()
+    keys["hour"] = times.dt.hour.to_numpy()
+    return keys
+
+
+def compute_baseline(
+    df: pd.DataFrame,
+    metrics: list[str] = METRICS,
+    group_cols: list[str] = GROUP_COLS,
+    time_col: str = "testing_time",
+) -> pd.DataFrame:
+    """Median / MAD / số mẫu của từng (series, weekday, hour, metric), bỏ qua giá trị NaN."""
+    keys = _slot_keys(df, group_cols, time_col)
+    values = df[metrics].apply(pd.to_numeric, errors="coerce").astype(float)
+    long = pd.concat([keys, values], axis=1).melt(
+        id_vars=list(keys.columns), value_vars=metrics, var_name="metric"
+    ).dropna(subset=["value"])
+
+    by = list(keys.columns) + ["metric"]
+    grouped = long.groupby(by, sort=False)["value"]
+    long["abs_dev"] = (long["value"] - grouped.transform("median")).abs()
+
+    baseline = grouped.agg(median="median", n="size")
+    baseline["mad"] = long.groupby(by, sort=False)["abs_dev"].median()
+    return baseline.reset_index()[PROFILE_KEY_COLS + ["median", "mad", "n"]]
+
+
+def baseline_lookup(
+    baseline: pd.DataFrame,
+    df: pd.DataFrame,
+    metrics: list[str] = METRICS,
+    group_cols: list[str] = GROUP_COLS,
+    time_col: str = "testing_time",
+    min_samples: int = 3,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Tra (median, mad) của ô (series, weekday, hour) tương ứng với từng dòng của `df`.
+    Trả về 2 mảng [rows, metrics]; NaN nếu chưa có baseline hoặc ô có ít hơn `min_samples` mẫu.
+    """
+    index = pd.MultiIndex.from_frame(_slot_keys(df, group_cols, time_col))
+    usable = baseline[baseline["n"] >= min_samples]
+
+    medians = np.full((len(df), len(metrics)), np.nan)
+    mads = np.full((len(df), len(metrics)), np.nan)
+    for j, m in enumerate(metrics):
+        table = usable[usable["metric"] == m].set_index(PROFILE_KEY_COLS[:-1])
+        found = table[["median", "mad"]].reindex(index).to_numpy(dtype=float)
+        medians[:, j], mads[:, j] = found[:, 0], found[:, 1]
+    return medians, mads
+
+
+def _slot_ranges(slots, lookback_weeks: int) -> list[tuple[pd.Timestamp, pd.Timestamp]]:
+    """Các khoảng [start, end) chứa đúng các giờ cùng (weekday, hour) với `slots` trong lookback."""
+    hour = pd.Timedelta(hours=1)
+    starts = sorted({
+        pd.Timestamp(s).floor("h") - pd.Timedelta(weeks=k)
+        for s in slots
+        for k in range(lookback_weeks)
+    })
+    ranges: list[list[pd.Timestamp]] = []
+    for s in starts:
+        if ranges and ranges[-1][1] == s:
+            ranges[-1][1] = s + hour
+        else:
+            ranges.append([s, s + hour])
+    return [(s, e) for s, e in ranges]
+
+
+def refresh_baseline(
+    aggregate_level: str = "hour",
+    lookback_weeks: int = DEFAULT_LOOKBACK_WEEKS,
+    full: bool = False,
+    now: datetime | None = None,
+) -> int:
+    """
+    Build (lần đầu / `full=True`) hoặc refresh incremental baseline, trả về số ô đã ghi.
+    Watermark lưu trong detector_watermark với key `baseline:<profile>`.
+    """
+    profile = baseline_profile_name(aggregate_level, lookback_weeks)
+    state_key = f"baseline:{profile}"
+    watermark, _ = load_detector_state(state_key)
+    rebuild = full or watermark is None
+
+    db = SessionLocal()
+    try:
+        if rebuild:
+            fetch_from = pd.Timestamp(now or datetime.now()) - pd.Timedelta(weeks=lookback_weeks)
+            df = fetch_ping_cached(db=db, aggregate_level=aggregate_level, from_time=fetch_from)
+            new_watermark = df["testing_time"].max()  # df rỗng thì return ở dưới, không lưu watermark
+        else:
+            new = fetch_ping_columns(db=db, aggregate_level=aggregate_level, after_time=watermark)
+            if new.empty:
+                print("No new data found.")
+                return 0
+            new_watermark = new["testing_time"].max()
+            slots = pd.to_datetime(new["testing_time"]).unique()
+            frames = [
+                fetch_ping_cached(db=db, aggregate_level=aggregate_level, from_time=start, to_time=end)
+                for start, end in _slot_ranges(slots, lookback_weeks)
+            ]
+            df = pd.concat([f for f in frames if not f.empty] or [new], ignore_index=True)
+    finally:
+        db.close()
+
+    if df.empty:
+        print("No data found.")
+        return 0
+
+    baseline = compute_baseline(df)
+    written = save_baseline(profile, baseline, replace=rebuild)
+    save_detector_state(state_key, watermark=pd.Timestamp(new_watermark), states={})
+    print(f"Baseline {profile}: {written} cells {'rebuilt' if rebuild else 'refreshed'}.")
+    return written
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Build / refresh ping baseline profiles")
+    parser.add_argument("--aggregate-level", default="hour")
+    parser.add_argument("--lookback-weeks", type=int, default=DEFAULT_LOOKBACK_WEEKS)
+    parser.add_argument("--full", action="store_true", help="Rebuild from scratch")
+    args = parser.parse_args(argv)
+    refresh_baseline(args.aggregate_level, args.lookback_weeks, full=args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Giảm số điểm của chuỗi thời gian trước khi trả về cho chart.
+
+Cả 2 cách đều trả về *index* của các điểm được giữ (tăng dần) nên dòng trả về là dữ liệu thật,
+không phải giá trị nội suy:
+- `lttb`: Largest-Triangle-Three-Buckets, giữ hình dạng đường (kể cả spike) với `n` điểm.
+- `minmax_buckets`: chia `n // 2` bucket, mỗi bucket giữ điểm min và max.
+"""
+from typing import Literal
+
+import numpy as np
+
+DownsampleMethod = Literal["lttb", "minmax"]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Index của `n` điểm chọn theo LTTB; `x` tăng dần, `y` không có NaN."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+
+    # Điểm đầu / cuối luôn giữ, n - 2 bucket ở giữa
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    selected = np.empty(n, dtype=int)
+    selected[0] = 0
+    selected[-1] = size - 1
+
+    prev = 0
+    for i in range(n - 2):
+        start, end = edges[i], edges[i + 1]
+        # Điểm C = trung bình bucket kế tiếp (bucket cuối dùng điểm cuối)
+        next_end = edges[i + 2] if i + 2 < len(edges) else size
+        next_start = end if i + 2 < len(edges) else size - 1
+        cx = x[next_start:next_end].mean()
+        cy = y[next_start:next_end].mean()
+
+        ax, ay = x[prev], y[prev]
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((ax - cx) * (by - ay) - (ax - bx) * (cy - ay))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def minmax_buckets(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Index điểm min và max của mỗi bucket (tối đa `n` điểm), `y` không có NaN."""
+    y = np.asarray(y, dtype=float)
+    size = len(y)
+    buckets = n // 2
+    if n >= size or buckets < 1:
+        return np.arange(size)
+
+    edges = np.linspace(0, size, buckets + 1).astype(int)
+    picked = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        chunk = y[start:end]
+        picked.append(start + int(np.argmin(chunk)))
+        picked.append(start + int(np.argmax(chunk)))
+    return np.unique(picked)
+
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, n: int, method: DownsampleMethod = "lttb") -> np.ndarray:
+    """Index các điểm cần giữ; điểm có `y` NaN bị bỏ trước khi chọn."""
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(y))
+    if method == "minmax":
+        picked = minmax_buckets(np.asarray(x)[valid], y[valid], n)
+    else:
+        picked = lttb(np.asarray(x)[valid], y[valid], n)
+    return valid[picked]
@@ -0,0 +1,112 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+
+@dataclass
+class EwmaState:
+    """
+    State EWMA (+ mùa vụ theo giờ trong ngày nếu bật) cho S series x M metric.
+    Mỗi series chỉ cần vài float: level, var, count (+ 24 hệ số mùa vụ / metric).
+    """
+    level: np.ndarray                 # [S, M]
+    var: np.ndarray                   # [S, M]
+    count: np.ndarray                 # [S, M] số điểm đã quan sát
+    seasonal: np.ndarray | None = None  # [S, 24, M]
+
+    @classmethod
+    def empty(cls, n_series: int, n_metrics: int, seasonal: bool = False) -> "EwmaState":
+        return cls(
+            level=np.zeros((n_series, n_metrics)),
+            var=np.zeros((n_series, n_metrics)),
+            count=np.zeros((n_series, n_metrics), dtype=np.int64),
+            seasonal=np.zeros((n_series, 24, n_metrics)) if seasonal else None,
+        )
+
+    @classmethod
+    def from_series_states(
+        cls,
+        keys: list[tuple[str, ...]],
+        states: Mapping[tuple[str, ...], dict[str, Any]] | None,
+        n_metrics: int,
+        seasonal: bool = False,
+    ) -> "EwmaState":
+        """Ghép state đã lưu của từng series theo thứ tự `keys`; series mới bắt đầu từ 0."""
+        state = cls.empty(len(keys), n_metrics, seasonal)
+        for i, key in enumerate(keys):
+            saved = (states or {}).get(key)
+            if not saved:
+                continue
+            state.level[i] = saved["level"]
+            state.var[i] = saved["var"]
+            state.count[i] = saved["count"]
+            if state.seasonal is not None and saved.get("seasonal") is not None:
+                state.seasonal[i] = saved["seasonal"]
+        return state
+
+    def to_series_states(self, keys: list[tuple[str, ...]]) -> dict[tuple[str, ...], dict[str, Any]]:
+        return {
+            key: {
+                "level": self.level[i].tolist(),
+                "var": self.var[i].tolist(),
+                "count": self.count[i].tolist(),
+                "seasonal": self.seasonal[i].tolist() if self.seasonal is not None else None,
+            }
+            for i, key in enumerate(keys)
+        }
+
+
+def ewma_scan(
+    values: np.ndarray,
+    hours_of_day: np.ndarray,
+    state: EwmaState,
+    alpha: float,
+    gamma: float = 0.3,
+    min_periods: int = 24,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Quét tensor [S, T, M] theo thời gian, vectorized trên toàn bộ series/metric ở mỗi bước.
+
+    - expected = level (+ seasonal[hour_of_day] nếu bật mùa vụ)
+    - z = (x - expected) / std, chỉ tính khi series đã có >= `min_periods` điểm
+    - Cập nhật (bỏ qua ô NaN):
+        level    <- level + alpha * (x - seasonal - level)
+        var      <- (1 - alpha) * (var + alpha * (x - expected)^2)
+        seasonal <- seasonal + gamma * (x - level_mới - seasonal)
+
+    `state` được cập nhật tại chỗ. Trả về (z, expected, std) cùng shape [S, T, M].
+    """
+    n_series, n_steps, n_metrics = values.shape
+    z = np.full(values.shape, np.nan)
+    expected_out = np.full(values.shape, np.nan)
+    std_out = np.full(values.shape, np.nan)
+
+    for t in range(n_steps):
+        x = values[:, t].astype(float)
+        valid = ~np.isnan(x)
+        h = int(hours_of_day[t])
+        season = state.seasonal[:, h] if state.seasonal is not None else 0.0
+
+        expected = state.level + season
+        std = np.sqrt(state.var)
+        ready = valid & (state.count >= min_periods)
+        with np.errstate(invalid="ignore"):
+            z[:, t] = np.where(ready, (x - expected) / np.where(std == 0, 1e-9, std), np.nan)
+        expected_out[:, t] = np.where(state.count > 0, expected, np.nan)
+        std_out[:, t] = np.where(state.count > 0, std, np.nan)
+
+        first = valid & (state.count == 0)
+        update = valid & ~first
+        resid = np.where(valid, x - expected, 0.0)
+        deseason = np.where(valid, x - season, 0.0)
+
+        state.level = np.where(first, deseason, np.where(update, state.level + alpha * (deseason - state.level), state.level))
+        state.var = np.where(update, (1 - alpha) * (state.var + alpha * resid ** 2), np.where(first, 0.0, state.var))
+        if state.seasonal is not None:
+            new_season = season + gamma * (np.where(valid, x, 0.0) - state.level - season)
+            state.seasonal[:, h] = np.where(update, new_season, season)
+        state.count = state.count + valid
+
+    return z, expected_out, std_out
@@ -2,17 +2,12 @@
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from app.core.deps import get_db
-from enum import Enum
+from app.core.single_flight import query_flight, query_key
+from app.services.kpi_catalog import KPICode, get_kpi
 import traceback
 
-
-class KPICode(str, Enum):
-    latency = "internet_latency"
-    jitter = "internet_jitter"
-    packet_loss_rate = "internet_packetloss"
-    dns_time = "internet_dns_time"
-    data_downloading = "internet_data_downloading"
-    web_browsing = "internet_web_browsing"
+import numpy as np
+import pandas as pd
 
 
 def get_aggregate_data(
@@ -24,35 +19,10 @@ def get_aggregate_data(
     account_login_vqt: str,
     db: Session
 ):
-    table_map = {
-        KPICode.latency: "log_data_aggregate.ping_results_aggregate",
-        KPICode.jitter: "log_data_aggregate.ping_results_aggregate",
-        KPICode.packet_loss_rate: "log_data_aggregate.ping_results_aggregate",
-        KPICode.dns_time: "log_data_aggregate.dns_results_aggregate",
-        KPICode.data_downloading: "log_data_aggregate.dlul_results_aggregate",
-        KPICode.web_browsing: "log_data_aggregate.web_results_size_load_aggregate",
-    }
-    table = table_map[kpi_code]
-    
-    kpi_map = {
-        KPICode.latency: "average_latency",
-        KPICode.jitter: "jitter",
-        KPICode.packet_loss_rate: "packet_loss_rate",
-        KPICode.dns_time: "resolve_duration_ms",
-        KPICode.data_downloading: "download_speed_mbps",
-        KPICode.web_browsing: "load_time_0_5mb_ms",
-    }
-    kpi_column = f"mean_{kpi_map[kpi_code]}"
-
-    server_col_map = {
-        KPICode.latency: "server_name",
-        KPICode.jitter: "server_name",
-        KPICode.packet_loss_rate: "server_name",
-        KPICode.dns_time: "dns_server_isp",
-        KPICode.data_downloading: "server_info",
-        KPICode.web_browsing: "request_url",
-    }
-    server_col = server_col_map[kpi_code]
+    spec = get_kpi(kpi_code)
+    table = spec.table
+    kpi_column = spec.value_column
+    server_col = spec.server_column
 
     try:
         sql = text(f"""
@@ -84,18 +54,92 @@ def get_aggregate_data(
                     AND t.previous_value IS NOT NULL;
                     """)
 
-        result = db.execute(
-            sql,
-            {
-                "current_date": current_date, 
-                "prev_date": prev_date, 
-                "isp": isp, "account_login_vqt": f"{account_login_vqt}_Agent%", 
-                "aggregate_level": aggregate_level,
-            }
-        ).mappings().all()
+        params = {
+            "current_date": current_date,
+            "prev_date": prev_date,
+            "isp": isp, "account_login_vqt": f"{account_login_vqt}_Agent%",
+            "aggregate_level": aggregate_level,
+        }
+        return query_flight.do(
+            query_key(f"aggregate_data:{table}:{kpi_column}", params),
+            lambda: db.execute(sql, params).mappings().all(),
+        )
+
+    except Exception as e:
+        traceback.print_exc()
+        raise Exception(str(e))
 
-        return result
 
+def get_aggregate_trend_data(
+    kpi_code: KPICode,
+    aggregate_level: str,
+    dates: list[str],
+    isp: str,
+    account_login_vqt: str,
+    db: Session
+):
+    """
+    So sánh N mốc thời gian (vd: tuần này với các tuần trước) cho từng server trong 1 lần quét:
+    lấy tất cả các mốc bằng `testing_time = ANY(...)` rồi pivot server x mốc bằng pandas,
+    thay vì gọi get_aggregate_data N-1 lần cho từng cặp ngày.
+
+    Trả về `periods` (các mốc đã sắp xếp tăng dần) và mỗi server có `values` (cùng thứ tự
+    với `periods`, None nếu thiếu dữ liệu) và `different_values` (values[i] - values[i-1]).
+    """
+    spec = get_kpi(kpi_code)
+    table = spec.table
+    kpi_column = spec.value_column
+    server_col = spec.server_column
+    periods = sorted({pd.Timestamp(d).normalize() for d in dates})
+    key_cols = [server_col, "aggregate_level", "account_login_vqt"]
+
+    try:
+        sql = text(f"""
+                SELECT
+                    {server_col},
+                    aggregate_level,
+                    account_login_vqt,
+                    testing_time,
+                    {kpi_column} AS value
+                FROM {table}
+                WHERE testing_time = ANY(CAST(:dates AS date[]))
+                    AND aggregate_level = :aggregate_level
+                    AND isp = :isp
+                    AND account_login_vqt LIKE :account_login_vqt
+                    """)
+
+        params = {
+            "dates": [f"{p:%Y-%m-%d}" for p in periods],
+            "isp": isp, "account_login_vqt": f"{account_login_vqt}_Agent%",
+            "aggregate_level": aggregate_level,
+        }
+        rows = query_flight.do(
+            query_key(f"aggregate_trend:{table}:{kpi_column}", params),
+            lambda: db.execute(sql, params).mappings().all(),
+        )
     except Exception as e:
         traceback.print_exc()
         raise Exception(str(e))
+
+    period_keys = [p.strftime("%Y-%m-%d") for p in periods]
+    if not rows:
+        return period_keys, []
+
+    df = pd.DataFrame(rows, columns=key_cols + ["testing_time", "value"])
+    df["testing_time"] = pd.to_datetime(df["testing_time"])
+    df["value"] = pd.to_numeric(df["value"], errors="coerce").astype(float)
+    # Server x mốc; mốc không có dữ liệu -> NaN
+    wide = df.pivot_table(index=key_cols, columns="testing_time", values="value", aggfunc="max")
+    values = wide.reindex(columns=periods).to_numpy()
+    diffs = np.diff(values, axis=1)
+
+    def _clean(arr):
+        return [None if np.isnan(v) else float(v) for v in arr]
+
+    result = []
+    for i, key in enumerate(wide.index):
+        item = dict(zip(key_cols, key))
+        item["values"] = _clean(values[i])
+        item["different_values"] = _clean(diffs[i])
+        result.append(item)
+    return period_keys, result
@@ -2,9 +2,12 @@ import traceback
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from enum import Enum
-from datetime import datetime
 from typing import Optional
 
+from app.core.result_cache import result_cache
+from app.core.single_flight import query_flight, query_key
+from app.services.time_key import date_hour_filter, normalize_key
+
 
 class AggregateLevel(str, Enum):
     daily = "daily"
@@ -12,6 +15,47 @@ class AggregateLevel(str, Enum):
     monthly = "monthly"
 
 
+INTERNET_KPI_TABLES = {
+    AggregateLevel.daily: "internet_kpi.internet_kpi_daily",
+    AggregateLevel.weekly: "internet_kpi.internet_kpi_weekly",
+    AggregateLevel.monthly: "internet_kpi.internet_kpi_monthly",
+}
+
+INTERNET_KPI_CHANGE_TABLES = {
+    AggregateLevel.daily: "internet_kpi.internet_kpi_daily_change",
+    AggregateLevel.weekly: "internet_kpi.internet_kpi_weekly_change",
+    AggregateLevel.monthly: "internet_kpi.internet_kpi_monthly_change",
+}
+
+
+def internet_kpi_query(
+    aggregate_level: AggregateLevel,
+    kpi_code: str,
+    location_level: str,
+    duration: int,
+    time_limit: str | None,
+):
+    """
+    SQL + params cho get_internet_kpi_data. Cận thời gian được tính sẵn thành chuỗi `date_hour`
+    (xem time_key) nên điều kiện là range scan trên index (kpi_code, location_level, date_hour).
+    """
+    time_filter, time_params = date_hour_filter(aggregate_level, time_limit, duration)
+    table = INTERNET_KPI_TABLES[aggregate_level]
+    sql = text(f"""
+            SELECT *
+            FROM {table}
+            WHERE kpi_code = :kpi_code AND location_level = :location_level
+            AND {time_filter}
+            ORDER BY date_hour DESC
+        """)
+    params = {
+        "kpi_code": kpi_code,
+        "location_level": location_level,
+        **time_params,
+    }
+    return sql, params
+
+
 def get_internet_kpi_data(
     aggregate_level: AggregateLevel,
     kpi_code: str,
@@ -20,42 +64,86 @@ def get_internet_kpi_data(
     db: Session,
     time_limit: str | None,
 ):
-    if time_limit is None:
-        time_limit = datetime.now().strftime("%Y-%m-%d-00")
-    table_map = {
-        AggregateLevel.daily: "internet_kpi.internet_kpi_daily",
-        AggregateLevel.weekly: "internet_kpi.internet_kpi_weekly",
-        AggregateLevel.monthly: "internet_kpi.internet_kpi_monthly",
-    }
-    table = table_map[aggregate_level]
+    try:
+        sql, params = internet_kpi_query(aggregate_level, kpi_code, location_level, duration, time_limit)
+        table = INTERNET_KPI_TABLES[aggregate_level]
+        return query_flight.do(
+            query_key(table, params),
+            lambda: result_cache.get_or_load(
+                "internet_kpi",
+                table,
+                params,
+                db,
+                loader=lambda: db.execute(sql, params).mappings().all(),
+                watermark_filters={"kpi_code": kpi_code, "location_level": location_level},
+            ),
+        )
+
+    except Exception as e:
+        traceback.print_exc()   # in full stack trace ra console
+        raise
 
-    interval_map = {
-        AggregateLevel.daily: "days",
-        AggregateLevel.weekly: "weeks",
-        AggregateLevel.monthly: "months",
+
+def internet_kpi_batch_query(
+    aggregate_level: AggregateLevel,
+    kpi_codes: list[str],
+    location_levels: list[str],
+    duration: int,
+    time_limit: str | None,
+):
+    """Như internet_kpi_query nhưng cho nhiều kpi_code / location_level trong 1 query (= ANY)."""
+    time_filter, time_params = date_hour_filter(aggregate_level, time_limit, duration)
+    table = INTERNET_KPI_TABLES[aggregate_level]
+    sql = text(f"""
+            SELECT *
+            FROM {table}
+            WHERE kpi_code = ANY(:kpi_codes) AND location_level = ANY(:location_levels)
+            AND {time_filter}
+            ORDER BY kpi_code, location_level, date_hour DESC
+        """)
+    params = {
+        "kpi_codes": sorted(set(kpi_codes)),
+        "location_levels": sorted(set(location_levels)),
+        **time_params,
     }
+    return sql, params
 
-    interval_unit = interval_map[aggregate_level]
 
-    try:
-        sql = text(f"""
-                SELECT *
-                FROM {table}
-                WHERE to_timestamp(date_hour, 'YYYY-MM-DD-HH24')
-                    >= to_timestamp(:time_limit, 'YYYY-MM-DD-HH24') - (:duration || ' {interval_unit}')::interval
-                AND to_timestamp(date_hour, 'YYYY-MM-DD-HH24') <= to_timestamp(:time_limit, 'YYYY-MM-DD-HH24')
-                AND kpi_code = :kpi_code AND location_level = :location_level
-                ORDER BY to_timestamp(date_hour, 'YYYY-MM-DD-HH24') DESC
-            """)
-        result = db.execute(
-            sql,
-            {"kpi_code": kpi_code, "duration": duration, "location_level": location_level, "time_limit": time_limit}
-        ).mappings().all()
+def group_kpi_rows(rows, kpi_codes: list[str], location_levels: list[str]) -> dict[str, dict[str, list]]:
+    """{kpi_code: {location_level: [rows]}}, giữ thứ tự date_hour DESC, cặp không có dữ liệu -> []."""
+    grouped = {k: {level: [] for level in location_levels} for k in kpi_codes}
+    for row in rows:
+        grouped[row["kpi_code"]][row["location_level"]].append(row)
+    return grouped
+
 
-        return result
+def get_internet_kpi_batch_data(
+    aggregate_level: AggregateLevel,
+    kpi_codes: list[str],
+    location_levels: list[str],
+    duration: int,
+    db: Session,
+    time_limit: str | None,
+) -> dict[str, dict[str, list]]:
+    try:
+        sql, params = internet_kpi_batch_query(aggregate_level, kpi_codes, location_levels, duration, time_limit)
+        table = INTERNET_KPI_TABLES[aggregate_level]
+        rows = query_flight.do(
+            query_key(table, params),
+            lambda: result_cache.get_or_load(
+                "internet_kpi_batch",
+                table,
+                params,
+                db,
+                loader=lambda: db.execute(sql, params).mappings().all(),
+                # 1 query watermark cho cả batch (= ANY), không phải 1 query / cặp
+                watermark_filters={"kpi_code": params["kpi_codes"], "location_level": params["location_levels"]},
+            ),
+        )
+        return group_kpi_rows(rows, params["kpi_codes"], params["location_levels"])
 
     except Exception as e:
-        traceback.print_exc()   # in full stack trace ra console
+        traceback.print_exc()
         raise
 
 
@@ -66,13 +154,7 @@ def get_internet_kpi_change_data(
     date_hour: str,
     db: Session
 ):
-    table_map = {
-        AggregateLevel.daily: "internet_kpi.internet_kpi_daily_change",
-        AggregateLevel.weekly: "internet_kpi.internet_kpi_weekly_change",
-        AggregateLevel.monthly: "internet_kpi.internet_kpi_monthly_change",
-    }
-
-    table = table_map[aggregate_level]
+    table = INTERNET_KPI_CHANGE_TABLES[aggregate_level]
 
     try:
         sql = text(f"""
@@ -83,12 +165,20 @@ def get_internet_kpi_change_data(
                 AND date_hour  = :date_hour                 
                 ORDER BY ABS(change_value) DESC;
             """)
-        result = db.execute(
-            sql,
-            {"kpi_code": kpi_code, "date_hour": date_hour, "isp": isp}
-        ).mappings().all()
-
-        return result
+        # Bảng change theo tuần lưu 'Www-YYYY' (xem time_key)
+        params = {"kpi_code": kpi_code, "date_hour": normalize_key(aggregate_level, date_hour, change=True), "isp": isp}
+        return query_flight.do(
+            query_key(table, params),
+            lambda: result_cache.get_or_load(
+                "internet_kpi_change",
+                table,
+                params,
+                db,
+                loader=lambda: db.execute(sql, params).mappings().all(),
+                # Cố định date_hour: key tuần 'Www-YYYY' không MAX được theo thời gian (xem time_key)
+                watermark_filters={**params, "location_level": "province"},
+            ),
+        )
 
     except Exception:
         raise Exception("Internal server error")
@@ -0,0 +1,91 @@
+"""
+Danh mục KPI: mỗi KPI nằm ở bảng aggregate nào, cột giá trị, cột server và tên hiển thị.
+
+Các query log / detail dựng SQL từ đây và chỉ SELECT các cột cần dùng thay vì `SELECT *`.
+Thêm KPI mới (hoặc detector cho DNS / DLUL / web) chỉ cần thêm 1 dòng vào `KPI_CATALOG`.
+"""
+from dataclasses import dataclass
+from enum import Enum
+
+
+class KPICode(str, Enum):
+    latency = "internet_latency"
+    jitter = "internet_jitter"
+    packet_loss_rate = "internet_packetloss"
+    dns_time = "internet_dns_time"
+    data_downloading = "internet_data_downloading"
+    web_browsing = "internet_web_browsing"
+
+
+@dataclass(frozen=True)
+class KpiSpec:
+    code: KPICode
+    # kpi_code của /log-aggregate-data (tên metric không có tiền tố mean_)
+    log_key: str
+    # kpi_code trong các bảng internet_kpi.*
+    internet_kpi_code: str
+    label: str
+    table: str
+    server_column: str
+
+    @property
+    def value_column(self) -> str:
+        return f"mean_{self.log_key}"
+
+    @property
+    def keyset_columns(self) -> tuple[str, ...]:
+        """Khoá duy nhất cho keyset pagination: dns / dlul / web có nhiều server cho 1 agent / giờ."""
+        return tuple(dict.fromkeys(["testing_time", "account_login_vqt", self.server_column]))
+
+    def columns(self, *extra: str) -> str:
+        """Danh sách cột cho SELECT: khoá thời gian / agent / server + cột giá trị (+ `extra`)."""
+        cols = ["testing_time", "aggregate_level", "account_login_vqt", self.server_column, self.value_column]
+        return ", ".join(dict.fromkeys([*cols, *extra]))
+
+
+KPI_CATALOG: dict[KPICode, KpiSpec] = {
+    KPICode.latency: KpiSpec(
+        KPICode.latency, "average_latency", "internet_latency", "Độ trễ mạng",
+        "log_data_aggregate.ping_results_aggregate", "server_name",
+    ),
+    KPICode.jitter: KpiSpec(
+        KPICode.jitter, "jitter", "internet_jitter", "Độ biến thiên mạng",
+        "log_data_aggregate.ping_results_aggregate", "server_name",
+    ),
+    KPICode.packet_loss_rate: KpiSpec(
+        KPICode.packet_loss_rate, "packet_loss_rate", "internet_packet_loss_rate", "Tỷ lệ mất gói tin",
+        "log_data_aggregate.ping_results_aggregate", "server_name",
+    ),
+    KPICode.dns_time: KpiSpec(
+        KPICode.dns_time, "resolve_duration_ms", "internet_dns_time", "Thời gian phân giải DNS",
+        "log_data_aggregate.dns_results_aggregate", "dns_server_isp",
+    ),
+    KPICode.data_downloading: KpiSpec(
+        KPICode.data_downloading, "download_speed_mbps", "internet_data_downloading", "Tốc độ tải xuống",
+        "log_data_aggregate.dlul_results_aggregate", "server_info",
+    ),
+    KPICode.web_browsing: KpiSpec(
+        KPICode.web_browsing, "load_time_0_5mb_ms", "internet_web_browsing", "Thời gian duyệt web",
+        "log_data_aggregate.web_results_size_load_aggregate", "request_url",
+    ),
+}
+
+# /log-aggregate-data nhận tên ngắn ("average_latency", "dns_time", ...), khác với log_key ở vài KPI
+LOG_KPI_ALIASES: dict[str, KPICode] = {
+    "average_latency": KPICode.latency,
+    "jitter": KPICode.jitter,
+    "packet_loss_rate": KPICode.packet_loss_rate,
+    "dns_time": KPICode.dns_time,
+    "data_downloading": KPICode.data_downloading,
+    "web_browsing": KPICode.web_browsing,
+}
+
+
+def get_kpi(code: KPICode | str) -> KpiSpec:
+    """Tra KPI theo KPICode / giá trị của nó, hoặc tên ngắn của /log-aggregate-data."""
+    if code in LOG_KPI_ALIASES:
+        return KPI_CATALOG[LOG_KPI_ALIASES[code]]
+    try:
+        return KPI_CATALOG[KPICode(code)]
+    except ValueError:
+        raise KeyError(f"Unsupported kpi_code: {code}") from None
@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.util import hash_pandas_object
+
+from app.services.rolling_stats import rolling_median_mad
+
+
+def _mean_std_kernel(x: np.ndarray, window: int, min_periods: int) -> tuple[np.ndarray, np.ndarray]:
+    # Giữ nguyên phép tính pandas như path serial để kết quả giống hệt từng bit
+    r = pd.Series(x).rolling(window=window, min_periods=min_periods)
+    return r.mean().to_numpy(), r.std(ddof=0).to_numpy()
+
+
+def _median_mad_kernel(x: np.ndarray, window: int, min_periods: int) -> tuple[np.ndarray, np.ndarray]:
+    return rolling_median_mad(x, window, min_periods)
+
+
+KERNELS = {
+    "mean_std": _mean_std_kernel,
+    "median_mad": _median_mad_kernel,
+}
+
+
+def _score_shard(
+    kernel: str,
+    values: np.ndarray,
+    offsets: np.ndarray,
+    window: int,
+    min_periods: int,
+    shift: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Chạy trong process con. `values` là mảng [rows, metrics] của shard, các series nằm liền nhau,
+    `offsets` là biên của từng series (len = số series + 1).
+    """
+    fn = KERNELS[kernel]
+    center = np.full(values.shape, np.nan)
+    scale = np.full(values.shape, np.nan)
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        for j in range(values.shape[1]):
+            x = values[start:end, j]
+            if shift:
+                x = np.concatenate([np.full(shift, np.nan), x[:-shift]])
+            center[start:end, j], scale[start:end, j] = fn(x, window, min_periods)
+    return center, scale
+
+
+def series_hashes(df: pd.DataFrame, group_cols: list[str]) -> np.ndarray:
+    """Hash của group key cho từng dòng (ổn định giữa các lần chạy và giữa các process)."""
+    return hash_pandas_object(df[group_cols], index=False).to_numpy()
+
+
+def shard_ids(df: pd.DataFrame, group_cols: list[str], n_shards: int) -> np.ndarray:
+    """Shard theo hash của group key."""
+    return (series_hashes(df, group_cols) % np.uint64(n_shards)).astype(np.int64)
+
+
+def _offsets(codes: np.ndarray) -> np.ndarray:
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    return np.concatenate([[0], bounds, [codes.size]]).astype(np.int64)
+
+
+def grouped_rolling_stats(
+    values: np.ndarray,
+    codes: np.ndarray,
+    kernel: str,
+    window: int,
+    min_periods: int | None = None,
+    shift: int = 1,
+    workers: int | None = None,
+    hashes: np.ndarray | None = None,
+    n_shards: int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Tính rolling stats (mean/std hoặc median/MAD) theo từng series.
+
+    - `values`: mảng [rows, metrics] đã sort theo series + testing_time.
+    - `codes`: mã series của từng dòng (các dòng cùng series nằm liền nhau, -1 = bỏ qua,
+      giống groupby().transform mặc định dropna=True).
+    - `workers` > 1: chia shard theo `hashes` (hash group key) và chạy trên ProcessPoolExecutor.
+      Mỗi shard chỉ gửi 2 numpy buffer (values float64 + offsets int64), không pickle DataFrame;
+      kết quả được ghép lại theo vị trí dòng nên giống hệt path serial.
+    """
+    if kernel not in KERNELS:
+        raise ValueError(f"Unsupported kernel: {kernel}")
+    min_periods = window if min_periods is None else min_periods
+
+    center = np.full(values.shape, np.nan)
+    scale = np.full(values.shape, np.nan)
+    valid = codes >= 0
+
+    if not workers or workers <= 1:
+        positions = np.flatnonzero(valid)
+        if positions.size:
+            center[positions], scale[positions] = _score_shard(
+                kernel, values[positions], _offsets(codes[positions]), window, min_periods, shift
+            )
+        return center, scale
+
+    if hashes is None:
+        raise ValueError("hashes is required when workers > 1")
+    n_shards = n_shards or workers * 4
+    shards = (hashes % np.uint64(n_shards)).astype(np.int64)
+
+    tasks = []
+    for shard in range(n_shards):
+        positions = np.flatnonzero((shards == shard) & valid)
+        if positions.size == 0:
+            continue
+        tasks.append((positions, np.ascontiguousarray(values[positions]), _offsets(codes[positions])))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            (positions, executor.submit(_score_shard, kernel, shard_values, offsets, window, min_periods, shift))
+            for positions, shard_values, offsets in tasks
+        ]
+        for positions, future in futures:
+            center[positions], scale[positions] = future.result()
+
+    return center, scale
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pandas as pd
+
+from app.db.session import SessionLocal
+from app.repositories.detector_state_repo import load_detector_state, save_detector_state
+from app.repositories.ping_parquet_cache import fetch_ping_cached
+from app.repositories.ping_results_repo import fetch_ping_columns
+from app.services.anomaly_engine import EwmaScorer, create_scorer, prepare_series, store_anomalies
+
+
+def run_ewma_detection(
+    scorer_name: str = "ewma",
+    threshold: float = 3.5,
+    aggregate_level: str = "hour",
+    warmup_hours: int | None = None,
+    now: datetime | None = None,
+):
+    """
+    Chạy EWMA / Holt-Winters theo kiểu streaming.
+
+    - Lần đầu: đọc `warmup_hours` giờ (mặc định 7 ngày cho holt_winters, 3 x window cho ewma)
+      để khởi tạo state.
+    - Các lần sau: chỉ đọc các dòng mới hơn watermark, state mỗi series chỉ là vài float
+      nên có thể chạy vài phút 1 lần thay vì mỗi giờ.
+    """
+    scorer = create_scorer(scorer_name, threshold=threshold)
+    if not isinstance(scorer, EwmaScorer):
+        raise ValueError(f"{scorer_name} is not an EWMA scorer")
+    state_key = f"{scorer_name}:{aggregate_level}:{scorer.window}"
+
+    watermark, states = load_detector_state(state_key)
+    db = SessionLocal()
+    try:
+        if watermark is None:
+            warmup = warmup_hours or (7 * 24 if scorer.seasonal else 3 * scorer.window)
+            fetch_from = pd.Timestamp(now or datetime.now()) - pd.Timedelta(hours=warmup)
+            df = fetch_ping_cached(db=db, aggregate_level=aggregate_level, from_time=fetch_from)
+        else:
+            df = fetch_ping_columns(db=db, aggregate_level=aggregate_level, after_time=watermark)
+    finally:
+        db.close()
+
+    if df.empty:
+        print("No new data found.")
+        return None
+
+    scorer.initial_states = states
+    series = prepare_series(df)
+    anomalies = scorer.detect(series)
+    store_anomalies(scorer, anomalies, series.metrics)
+    save_detector_state(
+        state_key,
+        watermark=pd.Timestamp(df["testing_time"].max()),
+        states=scorer.final_states,
+        replace=watermark is None,
+    )
+    print(f"Processed {len(df)} new rows, found {len(anomalies)} anomalies ({scorer_name}).")
+    return anomalies
+
+
+if __name__ == "__main__":
+    run_ewma_detection()
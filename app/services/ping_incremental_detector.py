@@ -0,0 +1,210 @@
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, cast
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.repositories.detector_state_repo import SeriesKey, load_detector_state, save_detector_state
+from app.repositories.ping_parquet_cache import fetch_ping_cached
+from app.repositories.ping_results_repo import fetch_ping_columns
+from app.services.anomaly_engine import GROUP_COLS, METRICS, create_scorer, store_anomalies
+from app.services.rolling_stats import RollingMeanStdWindow, RollingMedianWindow
+
+# Các scorer của anomaly_engine có phiên bản streaming
+STREAMING_SCORERS = ("zscore", "robust_zscore")
+
+
+class IncrementalDetector:
+    """
+    Detector dạng streaming: mỗi series (isp, account_login_vqt, server_name) giữ
+    1 window cho mỗi metric (running sum cho z-score, sorted window cho robust z-score).
+    Mỗi lần chạy chỉ cần đẩy các dòng mới vào window -> O(số dòng mới).
+
+    Kết quả giống hệt full recompute (`detect_anomalies` / `detect_anomalies_robust`)
+    với điều kiện state đã được warm-up bằng toàn bộ lịch sử trước đó.
+
+    Mỗi series nhớ testing_time cuối cùng đã đẩy vào window (`last_time`): các dòng
+    <= mốc đó bị bỏ qua, nên có thể đọc lại 1 khoảng lag trước watermark để bắt dòng
+    đến muộn mà không đẩy trùng. State cũ chưa có `last_time` dùng `watermark` thay thế.
+    State chỉ được restore (decode) khi series có dòng mới.
+    """
+
+    def __init__(
+        self,
+        detector: str,
+        metrics: list[str],
+        window: int,
+        states: Mapping[SeriesKey, dict[str, Any]] | None = None,
+        watermark: pd.Timestamp | None = None,
+    ):
+        if detector not in STREAMING_SCORERS:
+            raise ValueError(f"Unsupported detector: {detector}")
+        self.detector = detector
+        self.scorer = create_scorer(detector, window=window)
+        self.metrics = metrics
+        self.window = window
+        self.watermark = watermark
+        self._states: Mapping[SeriesKey, dict[str, Any]] = states or {}
+        self._windows: dict[SeriesKey, list] = {}
+        self._last_time: dict[SeriesKey, pd.Timestamp | None] = {}
+        self._changed: set[SeriesKey] = set()
+
+    def _series(self, key: SeriesKey) -> list:
+        """Window của series `key`: restore từ state đã lưu ở lần truy cập đầu, series mới bắt đầu rỗng."""
+        windows = self._windows.get(key)
+        if windows is None:
+            state = self._states.get(key)
+            if state is None:
+                windows, last_time = [self._new_window() for _ in self.metrics], None
+            else:
+                windows = self._restore(state)
+                last_time = pd.Timestamp(state["last_time"]) if state.get("last_time") else self.watermark
+            self._windows[key] = windows
+            self._last_time[key] = last_time
+        return windows
+
+    def _new_window(self):
+        if self.detector == "zscore":
+            return RollingMeanStdWindow(self.window)
+        return RollingMedianWindow(self.window)
+
+    def _restore(self, state: dict[str, Any]) -> list:
+        windows = []
+        for m in self.metrics:
+            w = self._new_window()
+            for v in state.get("values", {}).get(m, [])[-self.window:]:
+                w.push(np.nan if v is None else float(v))
+            windows.append(w)
+        return windows
+
+    def export_state(self, changed_only: bool = True) -> dict[SeriesKey, dict[str, Any]]:
+        """State để lưu lại; `changed_only=False` restore cả các series chưa được chạm tới."""
+        keys = self._changed if changed_only else list(self._states.keys() | self._windows.keys())
+        states = {}
+        for key in keys:
+            windows = self._series(key)
+            last_time = self._last_time[key]
+            states[key] = {
+                "values": {m: w.values() for m, w in zip(self.metrics, windows)},
+                "last_time": last_time.isoformat() if last_time is not None else None,
+            }
+        return states
+
+    def score(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Đẩy các dòng mới vào state và trả về các dòng đó kèm cột thống kê lịch sử
+        (được tính TRƯỚC khi đẩy điểm hiện tại vào window, tương đương shift(1)).
+        Dòng có testing_time <= `last_time` của series (đã xử lý ở lần chạy trước) bị loại.
+        """
+        df = df.sort_values(by=GROUP_COLS + ["testing_time"])
+        for col in self.metrics:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+
+        values = df[self.metrics].to_numpy(dtype=float)
+        times = pd.to_datetime(df["testing_time"]).to_numpy()
+        centers = np.full(values.shape, np.nan)
+        scales = np.full(values.shape, np.nan)
+        keep = np.zeros(len(df), dtype=bool)
+        robust = self.detector == "robust_zscore"
+
+        for group, rows in df.groupby(GROUP_COLS, sort=False, observed=True).indices.items():
+            # groupby nhiều cột -> group key là tuple (isp, account, server)
+            isp, account, server = (str(k) for k in cast(tuple, group))
+            key: SeriesKey = (isp, account, server)
+            idx = np.asarray(rows)
+            windows = self._series(key)
+            last_time = self._last_time[key]
+            if last_time is not None:
+                idx = idx[times[idx] > last_time.to_datetime64()]
+            if len(idx) == 0:
+                continue
+            keep[idx] = True
+            self._last_time[key] = pd.Timestamp(times[int(idx[-1])])
+            self._changed.add(key)
+
+            for i in idx:
+                for j, w in enumerate(windows):
+                    if robust:
+                        centers[i, j] = w.median()
+                        scales[i, j] = w.mad()
+                    else:
+                        centers[i, j] = w.mean()
+                        scales[i, j] = w.std()
+                    w.push(values[i, j])
+
+        result = df[keep].copy()
+        values, centers, scales = values[keep], centers[keep], scales[keep]
+        for j, m in enumerate(self.metrics):
+            if robust:
+                sigma = scales[:, j] * 1.4826
+                result[f"{m}__z_robust"] = (values[:, j] - centers[:, j]) / np.where(sigma == 0, 1e-9, sigma)
+                result[f"{m}__median_hist"] = centers[:, j]
+                result[f"{m}__mad_hist"] = scales[:, j]
+            else:
+                std = scales[:, j]
+                result[f"{m}__z"] = (values[:, j] - centers[:, j]) / np.where(std == 0, 1e-9, std)
+                result[f"{m}__mean_hist"] = centers[:, j]
+        return result
+
+    def select_anomalies(self, scored: pd.DataFrame, threshold: float) -> pd.DataFrame:
+        z_cols = [f"{m}{self.scorer.score_suffix}" for m in self.metrics]
+        return scored[scored[z_cols].abs().gt(threshold).any(axis=1)]
+
+
+def run_incremental_detection(
+    detector: str = "zscore",
+    window: int | None = None,
+    threshold: float = 2,
+    aggregate_level: str = "hour",
+    full: bool = False,
+    now: datetime | None = None,
+):
+    """
+    Chạy detection theo chế độ incremental.
+
+    - Lần đầu (chưa có watermark) hoặc `full=True`: lấy `window` giờ gần nhất, tính lại
+      toàn bộ và ghi đè state (dùng để đối chiếu / validate với full recompute).
+    - Các lần sau: lấy các dòng có testing_time > watermark - PING_INCREMENTAL_LAG_HOURS
+      (watermark là testing_time lớn nhất đã thấy trên mọi series), bỏ các dòng series đã
+      xử lý (theo `last_time` của từng series), cập nhật state và upsert anomaly mới.
+      Dòng đến muộn hơn khoảng lag vẫn bị bỏ lỡ.
+    """
+    scorer = create_scorer(detector, window=window, threshold=threshold)
+    window = scorer.window
+    state_key = f"{detector}:{aggregate_level}:{window}"
+
+    db = SessionLocal()
+    try:
+        watermark, states = (None, {}) if full else load_detector_state(state_key)
+        rebuild = watermark is None
+
+        if rebuild:
+            fetch_from = pd.Timestamp(now or datetime.now()) - pd.Timedelta(hours=window)
+            df = fetch_ping_cached(db=db, aggregate_level=aggregate_level, from_time=fetch_from)
+        else:
+            after_time = watermark - pd.Timedelta(hours=settings.PING_INCREMENTAL_LAG_HOURS)
+            df = fetch_ping_columns(db=db, aggregate_level=aggregate_level, after_time=after_time)
+
+        engine = IncrementalDetector(detector, METRICS, window, states=states, watermark=watermark)
+        scored = engine.score(df) if not df.empty else df
+        if scored.empty:
+            print("No new data found.")
+            return None
+
+        anomalies = engine.select_anomalies(scored, threshold)
+        store_anomalies(scorer, anomalies, METRICS)
+        new_watermark = pd.Timestamp(scored["testing_time"].max())
+        save_detector_state(
+            state_key,
+            watermark=max(new_watermark, watermark) if watermark is not None else new_watermark,
+            states=engine.export_state(),
+            replace=rebuild,
+        )
+        print(f"Processed {len(scored)} new rows, found {len(anomalies)} anomalies ({detector}).")
+        return anomalies
+
+    finally:
+        db.close()
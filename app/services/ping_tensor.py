@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from sqlalchemy.orm import Session
+
+from app.repositories.ping_parquet_cache import fetch_ping_cached
+from app.repositories.ping_results_repo import GROUP_COLS, METRICS
+
+
+@dataclass
+class PingTensor:
+    """
+    Dữ liệu ping_results_aggregate dạng mảng dày [series, hours, metrics] (float32).
+
+    - `values[s, h, m]`: giá trị metric m của series s tại giờ `start + h`, NaN nếu thiếu.
+    - `mask[s, h]`: True nếu có dòng dữ liệu cho series s tại giờ h.
+    - `series_keys`: bảng (isp, account_login_vqt, server_name) dạng categorical, dòng thứ s = series s.
+
+    - `row_series` / `row_hour`: vị trí (series, giờ) của từng dòng DataFrame đầu vào
+      (-1 nếu dòng bị bỏ qua), dùng để gắn kết quả tính trên tensor ngược lại từng dòng.
+
+    ~12 bytes / series-giờ cho 3 metric (+1 byte mask) thay vì vài trăm bytes / dòng object.
+    """
+    values: np.ndarray
+    mask: np.ndarray
+    series_keys: pd.DataFrame
+    start: pd.Timestamp
+    metrics: list[str]
+    freq: str = "h"
+    row_series: np.ndarray | None = None
+    row_hour: np.ndarray | None = None
+
+    @property
+    def n_series(self) -> int:
+        return self.values.shape[0]
+
+    @property
+    def n_hours(self) -> int:
+        return self.values.shape[1]
+
+    @property
+    def times(self) -> pd.DatetimeIndex:
+        return pd.date_range(self.start, periods=self.n_hours, freq=self.freq)
+
+    def metric(self, name: str) -> np.ndarray:
+        """Mảng [series, hours] của 1 metric."""
+        return self.values[:, :, self.metrics.index(name)]
+
+    @property
+    def hours_of_day(self) -> np.ndarray:
+        return self.times.hour.to_numpy()
+
+    def key_tuples(self) -> list[tuple[str, ...]]:
+        return [tuple(str(v) for v in row) for row in self.series_keys.itertuples(index=False)]
+
+    def gather_rows(self, arr: np.ndarray) -> np.ndarray:
+        """Lấy giá trị arr[series, hour, ...] cho từng dòng đầu vào (NaN cho dòng bị bỏ qua)."""
+        row_series, row_hour = self.row_series, self.row_hour
+        if row_series is None or row_hour is None:
+            raise ValueError("PingTensor has no row mapping: build it with build_ping_tensor() from a DataFrame")
+        out = np.full((row_series.shape[0],) + arr.shape[2:], np.nan)
+        hit = row_series >= 0
+        out[hit] = arr[row_series[hit], row_hour[hit]]
+        return out
+
+    def series_index(self, isp: str, account_login_vqt: str, server_name: str) -> int:
+        keys = self.series_keys
+        hit = np.flatnonzero(
+            (keys["isp"] == isp).to_numpy()
+            & (keys["account_login_vqt"] == account_login_vqt).to_numpy()
+            & (keys["server_name"] == server_name).to_numpy()
+        )
+        if hit.size == 0:
+            raise KeyError((isp, account_login_vqt, server_name))
+        return int(hit[0])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Chuyển ngược về long format (chỉ các ô có dữ liệu), tiện cho chart/debug."""
+        s_idx, h_idx = np.nonzero(self.mask)
+        frame = self.series_keys.iloc[s_idx].reset_index(drop=True)
+        frame["testing_time"] = self.times[h_idx]
+        for j, m in enumerate(self.metrics):
+            frame[m] = self.values[s_idx, h_idx, j].astype(float)
+        return frame
+
+
+def build_ping_tensor(
+    df: pd.DataFrame,
+    metrics: list[str] = METRICS,
+    group_cols: list[str] = GROUP_COLS,
+    start=None,
+    end=None,
+    freq: str = "h",
+) -> PingTensor:
+    """
+    Dựng PingTensor từ DataFrame long format.
+    `start`/`end` (end không bao gồm) mặc định lấy theo min/max testing_time của dữ liệu.
+    Nếu 1 series có nhiều dòng trong cùng 1 giờ thì dòng sau cùng được giữ lại.
+    """
+    step = pd.Timedelta(to_offset(freq).nanos, unit="ns")
+    times = pd.to_datetime(df["testing_time"]).dt.floor(freq)
+    if start is None and df.empty:
+        raise ValueError("start is required for an empty frame")
+    start = pd.Timestamp(start).floor(freq) if start is not None else times.min()
+    end = pd.Timestamp(end) if end is not None else times.max() + step
+    n_hours = max(int(np.ceil((end - start) / step)), 0) if pd.notna(end) else 0
+
+    # Intern group key thành categorical codes -> series id
+    keys = pd.DataFrame({c: df[c].astype("category") for c in group_cols})
+    codes = np.column_stack(
+        [keys[c].cat.codes.to_numpy(dtype=np.int64) for c in group_cols]
+    ).reshape(len(df), len(group_cols))
+    valid = np.asarray((codes >= 0).all(axis=1), dtype=bool)
+    uniq, series_id = np.unique(codes[valid], axis=0, return_inverse=True)
+    series_id = series_id.reshape(-1)
+
+    hour_id = ((times[valid] - start) // step).to_numpy(dtype=np.int64)
+    in_range = (hour_id >= 0) & (hour_id < n_hours)
+    metric_values = df.loc[valid, metrics].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float32)
+
+    values = np.full((len(uniq), n_hours, len(metrics)), np.nan, dtype=np.float32)
+    mask = np.zeros((len(uniq), n_hours), dtype=bool)
+    values[series_id[in_range], hour_id[in_range]] = metric_values[in_range]
+    mask[series_id[in_range], hour_id[in_range]] = True
+
+    row_series = np.full(len(df), -1, dtype=np.int64)
+    row_hour = np.full(len(df), -1, dtype=np.int64)
+    positions = np.flatnonzero(valid)[in_range]
+    row_series[positions] = series_id[in_range]
+    row_hour[positions] = hour_id[in_range]
+
+    series_keys = pd.DataFrame({
+        c: pd.Categorical.from_codes(uniq[:, j], categories=keys[c].cat.categories)
+        for j, c in enumerate(group_cols)
+    })
+    return PingTensor(
+        values=values,
+        mask=mask,
+        series_keys=series_keys,
+        start=start,
+        metrics=list(metrics),
+        freq=freq,
+        row_series=row_series,
+        row_hour=row_hour,
+    )
+
+
+def load_ping_tensor(
+    db: Session,
+    from_time,
+    to_time=None,
+    aggregate_level: str = "hour",
+    metrics: list[str] = METRICS,
+) -> PingTensor:
+    """Đọc ping_results_aggregate trong [from_time, to_time) và dựng PingTensor."""
+    df = fetch_ping_cached(
+        db=db,
+        aggregate_level=aggregate_level,
+        from_time=from_time,
+        to_time=to_time,
+        columns=GROUP_COLS + ["testing_time"] + metrics,
+    )
+    if df.empty:
+        df = pd.DataFrame(columns=GROUP_COLS + ["testing_time"] + metrics)
+    return build_ping_tensor(df, metrics=metrics, start=from_time, end=to_time)
@@ -3,15 +3,9 @@ import re
 from datetime import datetime
 
 from app.services.get_kpi_data import AggregateLevel
+from app.services.kpi_catalog import KPI_CATALOG
 
-kpi_code_map = {
-        "internet_latency": "Độ trễ mạng",
-        "internet_jitter": "Độ biến thiên mạng",
-        "internet_packet_loss_rate": "Tỷ lệ mất gói tin",
-        "internet_dns_time": "Thời gian phân giải DNS",
-        "internet_data_downloading": "Tốc độ tải xuống",
-        "internet_web_browsing": "Thời gian duyệt web",
-    }
+kpi_code_map = {spec.internet_kpi_code: spec.label for spec in KPI_CATALOG.values()}
 
 
 def _period_key(entry: dict, aggregate_level: AggregateLevel) -> str:
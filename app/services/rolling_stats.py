@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from collections import deque
+
+import numpy as np
+
+
+class RollingMedianWindow:
+    """
+    Cửa sổ trượt giữ danh sách giá trị đã sắp xếp để tính Median / MAD
+    mà không phải sort lại toàn bộ window ở mỗi bước.
+
+    - push(): O(log w) tìm vị trí + memmove O(w) (chạy trong C).
+    - median(): O(1) trên danh sách đã sắp xếp.
+    - mad(): O(log w) bằng cách chọn phần tử thứ k trên 2 dãy độ lệch đã sắp xếp.
+
+    NaN được giữ trong window (để đếm đúng số điểm) nhưng không tham gia tính toán,
+    giống semantics của pandas `rolling(...).median()`.
+    """
+
+    def __init__(self, window: int, min_periods: int | None = None):
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self._values: deque[float] = deque()
+        self._sorted: list[float] = []
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def count(self) -> int:
+        """Số điểm hợp lệ (không NaN) đang nằm trong window."""
+        return len(self._sorted)
+
+    def push(self, value: float) -> None:
+        if len(self._values) == self.window:
+            old = self._values.popleft()
+            if old == old:  # bỏ qua NaN
+                del self._sorted[bisect_left(self._sorted, old)]
+        self._values.append(value)
+        if value == value:
+            insort(self._sorted, value)
+
+    def values(self) -> list[float]:
+        """Các giá trị trong window theo thứ tự thời gian (dùng để lưu state)."""
+        return list(self._values)
+
+    def median(self) -> float:
+        n = len(self._sorted)
+        if n == 0 or n < self.min_periods:
+            return np.nan
+        s = self._sorted
+        mid = n // 2
+        if n % 2:
+            return s[mid]
+        return (s[mid - 1] + s[mid]) / 2
+
+    def mad(self) -> float:
+        """MAD = median(|x - median(x)|)."""
+        m = self.median()
+        if m != m:
+            return np.nan
+        n = len(self._sorted)
+        mid = n // 2
+        if n % 2:
+            return self._kth_deviation(m, mid)
+        return (self._kth_deviation(m, mid - 1) + self._kth_deviation(m, mid)) / 2
+
+    def _kth_deviation(self, m: float, k: int) -> float:
+        # Độ lệch phía trái median: A[i] = m - s[p-1-i] (tăng dần theo i)
+        # Độ lệch phía phải median: B[j] = s[p+j] - m   (tăng dần theo j)
+        # => phần tử nhỏ thứ k (0-index) của hợp 2 dãy đã sắp xếp.
+        s = self._sorted
+        p = bisect_left(s, m)
+        len_a = p
+        len_b = len(s) - p
+        need = k + 1
+
+        lo = max(0, need - len_b)
+        hi = min(need, len_a)
+        while lo <= hi:
+            i = (lo + hi) // 2  # số phần tử lấy từ A
+            j = need - i        # số phần tử lấy từ B
+            if i < len_a and j > 0 and s[p + j - 1] - m > m - s[p - 1 - i]:
+                lo = i + 1
+            elif i > 0 and j < len_b and m - s[p - i] > s[p + j] - m:
+                hi = i - 1
+            else:
+                candidates = []
+                if i > 0:
+                    candidates.append(m - s[p - i])
+                if j > 0:
+                    candidates.append(s[p + j - 1] - m)
+                return max(candidates)
+        raise AssertionError("unreachable")
+
+
+def rolling_median_mad(
+    values: np.ndarray,
+    window: int,
+    min_periods: int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Tương đương `pd.Series(values).rolling(window, min_periods).median()` và
+    `.apply(lambda x: median(|x - median(x)|))` nhưng dùng chung state giữa các window.
+    Window tại vị trí i bao gồm cả điểm i.
+    """
+    arr = np.asarray(values, dtype=float)
+    medians = np.full(arr.shape[0], np.nan)
+    mads = np.full(arr.shape[0], np.nan)
+
+    win = RollingMedianWindow(window, min_periods)
+    for i, v in enumerate(arr.tolist()):
+        win.push(v)
+        m = win.median()
+        if m == m:
+            medians[i] = m
+            mads[i] = win.mad()
+    return medians, mads
+
+
+class RollingMeanStdWindow:
+    """
+    Ring buffer giữ running sum / sum of squares để tính Mean / Std (ddof=0)
+    của `window` điểm gần nhất trong O(1) mỗi bước.
+
+    Giống pandas `rolling(window, min_periods).mean()/.std(ddof=0)`: NaN chiếm chỗ
+    trong window nhưng không được tính, cần ít nhất `min_periods` điểm hợp lệ.
+    """
+
+    def __init__(self, window: int, min_periods: int | None = None):
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self._values: deque[float] = deque()
+        self._count = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def push(self, value: float) -> None:
+        if len(self._values) == self.window:
+            old = self._values.popleft()
+            if old == old:
+                self._count -= 1
+                self._sum -= old
+                self._sumsq -= old * old
+        self._values.append(value)
+        if value == value:
+            self._count += 1
+            self._sum += value
+            self._sumsq += value * value
+        if self._count == 0:
+            # Reset để không tích luỹ sai số làm tròn khi window rỗng
+            self._sum = 0.0
+            self._sumsq = 0.0
+
+    def values(self) -> list[float]:
+        return list(self._values)
+
+    def mean(self) -> float:
+        if self._count == 0 or self._count < self.min_periods:
+            return np.nan
+        return self._sum / self._count
+
+    def std(self) -> float:
+        m = self.mean()
+        if m != m:
+            return np.nan
+        var = self._sumsq / self._count - m * m
+        return float(np.sqrt(var)) if var > 0 else 0.0
@@ -1,7 +1,12 @@
 import numpy as np
 import pandas as pd
+from app.core.config import settings
 from app.db.session import SessionLocal
-from app.repositories.ping_results_repo import fetch_ping_data, save_to_sqlite
+from app.repositories.anomaly_store import upsert_anomalies
+from app.repositories.ping_results_repo import fetch_ping_data
+from app.services.anomaly_engine import prepare_series
+
+ANOMALY_SCORES_TABLE = "ping_anomaly_scores"
 
 
 def add_robust_zscore(
@@ -12,48 +17,24 @@ def add_robust_zscore(
     history_points: int = 24,
     eps: float = 1e-9,
     z_threshold: float = 3.5,
+    workers: int | None = None,
 ) -> pd.DataFrame:
 
     df = df.copy()
     df[time_col] = pd.to_datetime(df[time_col], errors="coerce")
-    df = df.sort_values(group_cols + [time_col])
-
-    def rolling_mad(x):
-        return np.nanmedian(np.abs(x - np.nanmedian(x)))
-
-    out = []
-
-    for _, g in df.groupby(group_cols, sort=False):
-        g = g.sort_values(time_col).copy()
-
-        z_cols = []
-
-        for m in metrics:
-            x = pd.to_numeric(g[m], errors="coerce")
-
-            med = x.rolling(history_points).median().shift(1)
-            mad = x.rolling(history_points).apply(rolling_mad, raw=True).shift(1)
+    series = prepare_series(df, group_cols, metrics, time_col=time_col)
 
-            z = 0.6745 * (x - med) / mad.where(mad > eps)
-
-            col_z = f"{m}__robust_z"
-            g[col_z] = z
-            g[f"{m}__median_hist"] = med
-            g[f"{m}__mad_hist"] = mad
-            z_cols.append(col_z)
-
-        g_anomaly = g.loc[
-            g[z_cols].abs().gt(z_threshold).any(axis=1)
-        ]
-
-        if not g_anomaly.empty:
-            out.append(g_anomaly)
-
-    if not out:
-        return df.iloc[0:0].copy()
-
-    return pd.concat(out).sort_values(group_cols + [time_col])
+    med, mad = series.rolling_stats("median_mad", history_points, workers=workers)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = 0.6745 * (series.values - med) / np.where(mad > eps, mad, np.nan)
+        is_anomaly = np.asarray((np.abs(z) > z_threshold).any(axis=1), dtype=bool)
 
+    out = series.frame.loc[is_anomaly].copy()
+    for j, m in enumerate(metrics):
+        out[f"{m}__robust_z"] = z[is_anomaly, j]
+        out[f"{m}__median_hist"] = med[is_anomaly, j]
+        out[f"{m}__mad_hist"] = mad[is_anomaly, j]
+    return out
 
 
 def detect_anomaly_robust_z_score():
@@ -86,10 +67,13 @@ def detect_anomaly_robust_z_score():
             time_col="testing_time",
             metrics=metrics,
             history_points=history_points,
+            workers=settings.DETECTION_WORKERS,
         )
         print(len(scored))
-        # Save the scored data to the database
-        save_to_sqlite(scored, "ping_anomaly_scores")
+        # Upsert theo khoá (scorer, series, testing_time) thay vì ghi đè cả bảng
+        upsert_anomalies(
+            ANOMALY_SCORES_TABLE, "robust_z_mad", scored, metrics, ["__robust_z", "__median_hist", "__mad_hist"]
+        )
 
     finally:
         db.close()
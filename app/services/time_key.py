@@ -0,0 +1,118 @@
+"""
+Chuyển `time_limit` + `duration` thành điều kiện trên cột `date_hour` của các bảng internet_kpi.
+
+Định dạng `date_hour` theo bảng (chỉ quyết định ở đây, xem `uses_week_key`):
+- internet_kpi_{daily,weekly,monthly} và bảng change daily / monthly: 'YYYY-MM-DD-HH' (zero-padded), so sánh
+  chuỗi trùng với so sánh thời gian -> lọc thẳng `date_hour >= :from_key AND date_hour <= :to_key` thay vì bọc
+  cột trong `to_timestamp(...)`, nhờ đó dùng được index (kpi_code, location_level, date_hour).
+- internet_kpi_weekly_change: key tuần ISO 'Www-YYYY'. So sánh chuỗi KHÔNG theo thời gian
+  ('W52-2025' > 'W06-2026') -> lọc bằng danh sách key `date_hour = ANY(:period_keys)`.
+"""
+import re
+from datetime import date, datetime
+
+import pandas as pd
+
+DATE_HOUR_FORMAT = "%Y-%m-%d-%H"
+
+_DATE_HOUR_RE = re.compile(r"^(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})(?:-(?P<h>\d{1,2}))?$")
+_WEEK_KEY_RE = re.compile(r"^W(?P<w>\d{1,2})-(?P<y>\d{4})$")
+_MONTH_KEY_RE = re.compile(r"^(?P<y>\d{4})-(?P<m>\d{1,2})$")
+
+# Cùng đơn vị với `(:duration || ' days/weeks/months')::interval` trước đây
+# (key là giá trị của AggregateLevel)
+_DURATION_OFFSET = {
+    "daily": lambda n: pd.DateOffset(days=n),
+    "weekly": lambda n: pd.DateOffset(weeks=n),
+    "monthly": lambda n: pd.DateOffset(months=n),
+}
+
+
+def parse_time_limit(time_limit: str) -> datetime:
+    """
+    Parse mốc thời gian do client / chat tool gửi lên:
+    'YYYY-MM-DD-HH', 'YYYY-MM-DD', 'Www-YYYY' (ISO week -> thứ 2 đầu tuần), 'YYYY-MM' (ngày 1).
+    """
+    value = time_limit.strip()
+
+    m = _DATE_HOUR_RE.match(value)
+    if m:
+        return datetime(int(m["y"]), int(m["m"]), int(m["d"]), int(m["h"] or 0))
+
+    m = _WEEK_KEY_RE.match(value)
+    if m:
+        monday = date.fromisocalendar(int(m["y"]), int(m["w"]), 1)
+        return datetime(monday.year, monday.month, monday.day)
+
+    m = _MONTH_KEY_RE.match(value)
+    if m:
+        return datetime(int(m["y"]), int(m["m"]), 1)
+
+    raise ValueError(f"Invalid time_limit: {time_limit!r} (expected YYYY-MM-DD-HH, YYYY-MM-DD, Www-YYYY or YYYY-MM)")
+
+
+def format_date_hour(value: datetime) -> str:
+    return value.strftime(DATE_HOUR_FORMAT)
+
+
+def _level(aggregate_level) -> str:
+    return getattr(aggregate_level, "value", aggregate_level)
+
+
+def uses_week_key(aggregate_level, change: bool = False) -> bool:
+    """True nếu bảng (kpi hoặc change) của level này lưu `date_hour` dạng 'Www-YYYY'."""
+    return change and _level(aggregate_level) == "weekly"
+
+
+def format_key(aggregate_level, value: datetime, change: bool = False) -> str:
+    if uses_week_key(aggregate_level, change):
+        iso = value.isocalendar()
+        return f"W{iso.week:02d}-{iso.year}"
+    return format_date_hour(value)
+
+
+def normalize_key(aggregate_level, key: str, change: bool = False) -> str:
+    """Đưa key client gửi lên (vd: 'W6-2026', '2026-02-05') về đúng định dạng lưu trong bảng; không parse được -> giữ nguyên."""
+    try:
+        return format_key(aggregate_level, parse_time_limit(key), change)
+    except ValueError:
+        return key
+
+
+def date_hour_bounds(
+    aggregate_level: str,
+    time_limit: str | None,
+    duration: int,
+    now: datetime | None = None,
+) -> tuple[str, str]:
+    """
+    Cận [from_key, to_key] (bao gồm 2 đầu) của `date_hour` cho `duration` ngày/tuần/tháng
+    tính ngược từ `time_limit` (mặc định 00h hôm nay).
+    """
+    end = parse_time_limit(time_limit) if time_limit else (now or datetime.now()).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    # DateOffset(months=...) kẹp về cuối tháng giống interval của Postgres (31/03 - 1 month = 28/02)
+    start = pd.Timestamp(end) - _DURATION_OFFSET[_level(aggregate_level)](duration)
+    return format_date_hour(start.to_pydatetime()), format_date_hour(end)
+
+
+def date_hour_filter(
+    aggregate_level: str,
+    time_limit: str | None,
+    duration: int,
+    change: bool = False,
+    now: datetime | None = None,
+) -> tuple[str, dict]:
+    """
+    Điều kiện SQL trên `date_hour` (dùng được index (..., date_hour)) + params cho `duration`
+    ngày/tuần/tháng tính ngược từ `time_limit`, theo định dạng key của bảng.
+    """
+    from_key, to_key = date_hour_bounds(aggregate_level, time_limit, duration, now=now)
+    if not uses_week_key(aggregate_level, change):
+        return "date_hour >= :from_key AND date_hour <= :to_key", {"from_key": from_key, "to_key": to_key}
+
+    start, end = parse_time_limit(from_key), parse_time_limit(to_key)
+    monday = pd.Timestamp(start).normalize() - pd.Timedelta(days=start.weekday())
+    keys = [format_key(aggregate_level, d.to_pydatetime(), change) for d in pd.date_range(monday, end, freq="7D")]
+    return "date_hour = ANY(:period_keys)", {"period_keys": keys}
@@ -0,0 +1,97 @@
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.repositories import ping_results_repo
+
+# Postgres dùng cho các test cần DB thật, vd: postgresql+psycopg://postgres@localhost:5432/postgres
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+def pg_db():
+    """Session Postgres thật; test bị skip nếu chưa đặt TEST_DATABASE_URL."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_engine(TEST_DATABASE_URL)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture
+def ping_db(pg_db, monkeypatch):
+    """Session Postgres với bảng ping_results_aggregate tạm (pg_temp), PING_TABLE trỏ sang bảng đó."""
+    pg_db.execute(text("""
+        CREATE TEMP TABLE ping_results_aggregate (
+            isp TEXT, account_login_vqt TEXT, server_name TEXT, aggregate_level TEXT,
+            testing_time TIMESTAMP, sample_count INTEGER,
+            mean_jitter NUMERIC, mean_average_latency NUMERIC, mean_packet_loss_rate NUMERIC
+        )
+    """))
+    monkeypatch.setattr(ping_results_repo, "PING_TABLE", "pg_temp.ping_results_aggregate")
+    return pg_db
+
+
+@pytest.fixture
+def insert_ping_rows(ping_db):
+    """`insert_ping_rows(df)`: ghi DataFrame (đủ cột của bảng) vào bảng tạm của `ping_db`."""
+
+    def insert(df: pd.DataFrame) -> None:
+        ping_db.execute(
+            text("""
+                INSERT INTO pg_temp.ping_results_aggregate
+                VALUES (:isp, :account_login_vqt, :server_name, :aggregate_level, :testing_time, :sample_count,
+                        :mean_jitter, :mean_average_latency, :mean_packet_loss_rate)
+            """),
+            df.astype(object).where(df.notna(), None).to_dict("records"),
+        )
+
+    return insert
+
+
+def _make_ping_df(
+    hours: int = 48,
+    *,
+    isps=("Viettel",),
+    agents=("HNI_Agent_1",),
+    servers=("Japan_Speedtest",),
+    start: str = "2026-02-01",
+    seed: int = 0,
+    decimals: int | None = None,
+) -> pd.DataFrame:
+    times = pd.date_range(start, periods=hours, freq="h")
+    rng = np.random.default_rng(seed)
+    frames = []
+    for isp, agent, server in itertools.product(isps, agents, servers):
+        frames.append(pd.DataFrame({
+            "isp": isp,
+            "account_login_vqt": agent,
+            "server_name": server,
+            "aggregate_level": "hour",
+            "testing_time": times,
+            "sample_count": 45,
+            "mean_jitter": rng.gamma(2, 0.5, hours),
+            "mean_average_latency": rng.normal(100, 8, hours),
+            "mean_packet_loss_rate": rng.exponential(0.2, hours),
+        }))
+    df = pd.concat(frames, ignore_index=True)
+    if decimals is not None:
+        metrics = ["mean_jitter", "mean_average_latency", "mean_packet_loss_rate"]
+        df[metrics] = df[metrics].round(decimals)
+    return df
+
+
+@pytest.fixture
+def make_ping_df():
+    """
+    Factory dữ liệu ping giả (đủ cột của ping_results_aggregate, mức 'hour'):
+    `make_ping_df(hours, isps=..., agents=..., servers=..., start=..., seed=..., decimals=...)`,
+    mỗi tổ hợp isp x agent x server là 1 series.
+    """
+    return _make_ping_df
@@ -0,0 +1,47 @@
+"""Các fake dùng chung giữa nhiều module test."""
+from typing import Any, Dict
+
+from app.core.llm.tools.base import BaseTool
+
+
+class EchoTool(BaseTool):
+    is_final_answer = True
+
+    @property
+    def name(self) -> str:
+        return "echo"
+
+    @property
+    def description(self) -> str:
+        return "Echo"
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        return {"type": "object", "properties": {"text": {"type": "string"}}}
+
+    def run(self, db, text: str = "", **kwargs) -> str:
+        return f"{db}:{text}"
+
+
+class FakeDB:
+    """Trả lời query watermark `SELECT MAX(date_hour) ...` bằng `watermark`, các query khác trả về rỗng."""
+
+    def __init__(self, watermark):
+        self.watermark = watermark
+        self.watermark_queries = 0
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append((str(sql), params))
+        if "MAX(date_hour)" in str(sql):
+            self.watermark_queries += 1
+        return self
+
+    def scalar(self):
+        return self.watermark
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return []
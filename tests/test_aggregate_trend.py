@@ -0,0 +1,92 @@
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import aggregate_detail_data
+from app.core.deps import get_db
+from app.main import app
+from app.services.get_data import KPICode, get_aggregate_data, get_aggregate_trend_data
+from app.services.kpi_catalog import KPI_CATALOG
+
+
+def _make_daily_df() -> pd.DataFrame:
+    rng = np.random.default_rng(3)
+    days = pd.date_range("2026-01-05", periods=28, freq="D")
+    frames = []
+    for agent in ["HNI_Agent_1", "HNI_Agent_2", "HCM_Agent_1"]:
+        for server in ["Japan_Speedtest", "Singapore_Speedtest"]:
+            frames.append(pd.DataFrame({
+                "isp": "Viettel",
+                "account_login_vqt": agent,
+                "server_name": server,
+                "aggregate_level": "day",
+                "testing_time": days,
+                "sample_count": 1000,
+                "mean_jitter": rng.gamma(2, 0.5, len(days)).round(4),
+                "mean_average_latency": rng.normal(100, 8, len(days)).round(4),
+                "mean_packet_loss_rate": rng.exponential(0.2, len(days)).round(4),
+            }))
+    df = pd.concat(frames, ignore_index=True)
+    # 1 server thiếu dữ liệu ở tuần thứ 3
+    missing = (df["account_login_vqt"] == "HNI_Agent_2") & (df["server_name"] == "Japan_Speedtest") \
+        & (df["testing_time"] == pd.Timestamp("2026-01-19"))
+    return df[~missing]
+
+
+def test_trend_matches_pairwise_comparisons(ping_db, insert_ping_rows, monkeypatch):
+    db = ping_db
+    insert_ping_rows(_make_daily_df())
+    spec = KPI_CATALOG[KPICode.latency]
+    monkeypatch.setitem(KPI_CATALOG, KPICode.latency, replace(spec, table="pg_temp.ping_results_aggregate"))
+
+    dates = ["2026-01-26", "2026-01-05", "2026-01-12", "2026-01-19"]
+    periods, trend = get_aggregate_trend_data(KPICode.latency, "day", dates, "Viettel", "HNI", db)
+
+    assert periods == sorted(dates)
+    assert len(trend) == 4  # 2 agent HNI x 2 server
+    by_key = {(r["account_login_vqt"], r["server_name"]): r for r in trend}
+    gap = by_key[("HNI_Agent_2", "Japan_Speedtest")]
+    assert gap["values"][2] is None
+    assert gap["different_values"][1] is None and gap["different_values"][2] is None
+
+    for prev, cur, i in zip(periods, periods[1:], range(len(periods) - 1)):
+        pairwise = get_aggregate_data(KPICode.latency, "day", prev, cur, "Viettel", "HNI", db)
+        seen = set()
+        for row in pairwise:
+            key = (row["account_login_vqt"], row["server_name"])
+            seen.add(key)
+            item = by_key[key]
+            assert item["values"][i] == float(row["previous_value"])
+            assert item["values"][i + 1] == float(row["current_value"])
+            np.testing.assert_allclose(item["different_values"][i], float(row["different_value"]))
+        # Cặp không có trong so sánh 2 ngày là cặp thiếu dữ liệu
+        assert all(by_key[k]["different_values"][i] is None for k in set(by_key) - seen)
+
+
+def test_trend_endpoint_validates_dates(monkeypatch):
+    calls = []
+
+    def fake_trend(**kwargs):
+        calls.append(kwargs["dates"])
+        return kwargs["dates"], []
+
+    monkeypatch.setattr(aggregate_detail_data, "get_aggregate_trend_data", fake_trend)
+    app.dependency_overrides[get_db] = lambda: None
+    try:
+        client = TestClient(app)
+        url = "/api/v1/aggregate-detail-data/internet_latency/trend"
+        base = {"aggregate_level": "day", "isp": "Viettel", "account_login_vqt": "HNI"}
+
+        for dates in (["2026-01-05", "not-a-date"], ["2026-01-05", ""], ["2026-01-05", "2026-01-05 10:00"]):
+            resp = client.get(url, params={**base, "dates": dates})
+            assert resp.status_code == 422, dates
+        assert calls == []
+
+        resp = client.get(url, params={**base, "dates": ["2026-01-12 08:00", "2026-01-05", "2026-01-12"]})
+        assert resp.status_code == 200
+        assert calls == [["2026-01-05", "2026-01-12"]]
+        assert resp.json()["periods"] == ["2026-01-05", "2026-01-12"]
+    finally:
+        app.dependency_overrides.clear()
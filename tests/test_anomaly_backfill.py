@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import anomaly_backfill
+from app.services.anomaly_backfill import iter_chunks, run_backfill
+from app.services.anomaly_engine import ZScoreScorer, create_scorer, level_step, prepare_series
+
+
+def test_iter_chunks_covers_range():
+    chunks = list(iter_chunks(pd.Timestamp("2026-02-01"), pd.Timestamp("2026-02-02 06:00"), 12))
+    assert chunks[0] == (pd.Timestamp("2026-02-01"), pd.Timestamp("2026-02-01 12:00"))
+    assert chunks[-1] == (pd.Timestamp("2026-02-02"), pd.Timestamp("2026-02-02 06:00"))
+    assert len(chunks) == 3
+
+
+def test_chunked_backfill_matches_single_pass_and_resumes(monkeypatch, make_ping_df):
+    data = make_ping_df(96, servers=("Japan_Speedtest", "HCM_Speedtest"))
+    saved: list[pd.DataFrame] = []
+    progress: dict[str, pd.Timestamp] = {}
+
+    def fake_fetch(db, aggregate_level, from_time, to_time=None):
+        mask = (data["testing_time"] >= from_time) & (data["testing_time"] < to_time)
+        return data[mask].copy()
+
+    class FakeSession:
+        def close(self):
+            pass
+
+    monkeypatch.setattr(anomaly_backfill, "SessionLocal", FakeSession)
+    monkeypatch.setattr(anomaly_backfill, "fetch_ping_cached", fake_fetch)
+    monkeypatch.setattr(anomaly_backfill, "store_anomalies", lambda scorer, df, metrics=None: saved.append(df))
+    monkeypatch.setattr(anomaly_backfill, "load_backfill_progress", progress.get)
+    monkeypatch.setattr(anomaly_backfill, "save_backfill_progress", progress.__setitem__)
+
+    start, end = "2026-02-02", "2026-02-05"
+    # Giả lập lần chạy trước bị dừng sau chunk đầu tiên
+    run_backfill(start, "2026-02-02 12:00", ["zscore"], window=24, chunk_hours=12)
+    job_id = next(iter(progress))
+    progress[job_id.replace("2026-02-02T12:00:00", "2026-02-05T00:00:00")] = progress.pop(job_id)
+    run_backfill(start, end, ["zscore"], window=24, chunk_hours=12)
+
+    chunked = pd.concat(saved).sort_values(["server_name", "testing_time"])
+
+    scorer = create_scorer("zscore", window=24, threshold=2)
+    full = scorer.detect(prepare_series(data))
+    full = full[(full["testing_time"] >= start) & (full["testing_time"] < end)]
+
+    assert len(chunked) == len(full) > 0
+    np.testing.assert_allclose(
+        chunked["mean_average_latency__z"].to_numpy(), full["mean_average_latency__z"].to_numpy()
+    )
+
+
+def test_level_step_converts_window_rows_to_time():
+    assert 24 * level_step("hour") == pd.Timedelta(days=1)
+    assert 7 * level_step("day") == pd.Timedelta(weeks=1)
+    assert level_step("15min") == pd.Timedelta(minutes=15)
+    with pytest.raises(ValueError):
+        level_step("bogus")
+
+
+@pytest.mark.parametrize("aggregate_level, overlap", [("hour", pd.Timedelta(hours=24)), ("day", pd.Timedelta(days=24))])
+def test_sql_backend_backfill_uses_level_step_overlap(monkeypatch, make_ping_df, aggregate_level, overlap):
+    data = make_ping_df(96, servers=("Japan_Speedtest", "HCM_Speedtest"))
+    saved: list[pd.DataFrame] = []
+    ranges = []
+
+    def fake_detect_sql(self, db, level, from_time, to_time=None, metrics=None):
+        # Giả lập fetch_zscore_anomalies: tính trên [from_time, to_time), trả về cả các dòng overlap
+        ranges.append((level, from_time, to_time))
+        mask = (data["testing_time"] >= from_time) & (data["testing_time"] < to_time)
+        return self.detect(prepare_series(data[mask].copy()))
+
+    class FakeSession:
+        def close(self):
+            pass
+
+    monkeypatch.setattr(anomaly_backfill, "SessionLocal", FakeSession)
+    monkeypatch.setattr(ZScoreScorer, "detect_sql", fake_detect_sql)
+    monkeypatch.setattr(anomaly_backfill, "fetch_ping_cached", lambda **kwargs: pytest.fail("pandas path used"))
+    # Chữ ký thật: store_anomalies(scorer, anomalies, metrics=METRICS), nhánh SQL gọi với 2 tham số
+    monkeypatch.setattr(anomaly_backfill, "store_anomalies", lambda scorer, df: saved.append(df))
+    monkeypatch.setattr(anomaly_backfill, "load_backfill_progress", lambda job_id: None)
+    monkeypatch.setattr(anomaly_backfill, "save_backfill_progress", lambda job_id, ts: None)
+
+    start, end = "2026-02-03", "2026-02-05"
+    run_backfill(start, end, ["zscore"], window=24, chunk_hours=24, backend="sql", aggregate_level=aggregate_level)
+
+    assert ranges[0] == (aggregate_level, pd.Timestamp(start) - overlap, pd.Timestamp("2026-02-04"))
+    chunked = pd.concat(saved).sort_values(["server_name", "testing_time"])
+    assert chunked["testing_time"].between(pd.Timestamp(start), pd.Timestamp(end), inclusive="left").all()
+    if aggregate_level == "hour":
+        full = create_scorer("zscore", window=24, threshold=2).detect(prepare_series(data))
+        full = full[(full["testing_time"] >= start) & (full["testing_time"] < end)]
+        assert len(chunked) == len(full) > 0
+        np.testing.assert_allclose(
+            chunked["mean_average_latency__z"].to_numpy(), full["mean_average_latency__z"].to_numpy()
+        )
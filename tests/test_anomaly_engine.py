@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.repositories import anomaly_store
+from app.services import test_ping_anomaly_service
+from app.services.anomaly_engine import SCORERS, SqlScorer, create_scorer, prepare_series, split_by_backend
+
+
+def test_registry_contains_builtin_scorers():
+    assert {"zscore", "robust_zscore"} <= set(SCORERS)
+    assert create_scorer("zscore").table_name == "ping_anomaly_zscore"
+    assert create_scorer("robust_zscore").table_name == "ping_anomaly_robust_zscore"
+    with pytest.raises(ValueError):
+        create_scorer("unknown")
+
+
+def test_scorers_share_prepared_series(make_ping_df):
+    df = make_ping_df(40)
+    df.loc[35, "mean_average_latency"] = 400.0
+    series = prepare_series(df)
+
+    for name in ("zscore", "robust_zscore"):
+        scorer = create_scorer(name, window=24, threshold=3)
+        anomalies = scorer.detect(series)
+        assert 35 in anomalies.index
+        assert f"mean_average_latency{scorer.score_suffix}" in anomalies.columns
+
+    # Rolling stats được cache theo (kernel, window) trên cùng PreparedSeries
+    assert set(series._stats_cache) == {("mean_std", 24, None), ("median_mad", 24, None)}
+
+
+def test_backend_is_chosen_from_explicit_sql_support():
+    zscore, robust = create_scorer("zscore"), create_scorer("robust_zscore")
+    assert isinstance(zscore, SqlScorer) and zscore.supports_sql
+    assert not robust.supports_sql and not hasattr(robust, "detect_sql")
+
+    assert split_by_backend([zscore, robust], "sql") == ([zscore], [robust])
+    assert split_by_backend([zscore, robust], "pandas") == ([], [zscore, robust])
+    with pytest.raises(ValueError):
+        split_by_backend([zscore], "spark")
+
+
+def test_legacy_robust_service_upserts_instead_of_replacing(monkeypatch, tmp_path, make_ping_df):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anomaly.db'}")
+    monkeypatch.setattr(anomaly_store, "engine_sqlite", engine)
+    monkeypatch.setattr(anomaly_store, "_ensured_tables", set())
+
+    class FakeSession:
+        def close(self):
+            pass
+
+    runs = iter([make_ping_df(48, seed=1), make_ping_df(48, seed=2, start="2026-02-03")])
+    monkeypatch.setattr(test_ping_anomaly_service, "SessionLocal", FakeSession)
+    monkeypatch.setattr(test_ping_anomaly_service, "fetch_ping_data", lambda **kwargs: next(runs))
+
+    def stored():
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT scorer, testing_time FROM ping_anomaly_scores")).all()
+
+    test_ping_anomaly_service.detect_anomaly_robust_z_score()
+    first = stored()
+    test_ping_anomaly_service.detect_anomaly_robust_z_score()
+    second = stored()
+    # Lần chạy sau không xoá kết quả của lần trước
+    assert first and set(first) < set(second)
+    assert {r[0] for r in second} == {"robust_z_mad"}
@@ -0,0 +1,47 @@
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from app.repositories import anomaly_store
+
+
+def _anomalies(latency: float) -> pd.DataFrame:
+    return pd.DataFrame({
+        "isp": ["Viettel", "Viettel"],
+        "account_login_vqt": ["HNI_Agent_1", "HNI_Agent_1"],
+        "server_name": ["Japan_Speedtest", "Japan_Speedtest"],
+        "aggregate_level": ["hour", "hour"],
+        "testing_time": pd.to_datetime(["2026-02-01 10:00", "2026-02-01 11:00"]),
+        "sample_count": [45, 44],
+        "mean_average_latency": [latency, 101.0],
+        "mean_average_latency__z": [5.0, 2.5],
+        "mean_average_latency__mean_hist": [100.0, 100.0],
+    })
+
+
+def test_upsert_is_idempotent_and_indexed(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anomaly.db'}")
+    monkeypatch.setattr(anomaly_store, "engine_sqlite", engine)
+    monkeypatch.setattr(anomaly_store, "_ensured_tables", set())
+
+    # Bảng cũ do to_sql(if_exists="replace") tạo -> được chuyển sang _legacy
+    _anomalies(150.0).to_sql("ping_anomaly_zscore", engine, index=False)
+
+    args = ("ping_anomaly_zscore", "zscore")
+    metrics, suffixes = ["mean_average_latency"], ["__z", "__mean_hist"]
+    assert anomaly_store.upsert_anomalies(*args, _anomalies(150.0), metrics, suffixes) == 2
+    anomaly_store.upsert_anomalies(*args, _anomalies(180.0), metrics, suffixes)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT scorer, testing_time, sample_count, mean_average_latency "
+            "FROM ping_anomaly_zscore ORDER BY testing_time"
+        )).all()
+        indexes = {r[1] for r in conn.execute(text("PRAGMA index_list('ping_anomaly_zscore')")).all()}
+        legacy = conn.execute(text("SELECT COUNT(*) FROM ping_anomaly_zscore_legacy")).scalar()
+
+    assert rows == [
+        ("zscore", "2026-02-01 10:00:00.000000", 45, 180.0),
+        ("zscore", "2026-02-01 11:00:00.000000", 44, 101.0),
+    ]
+    assert {"ux_ping_anomaly_zscore_key", "ix_ping_anomaly_zscore_server_level_time"} <= indexes
+    assert legacy == 2
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from app.repositories import baseline_repo
+from app.services.anomaly_engine import create_scorer, prepare_series
+from app.services.baseline_profile import _slot_ranges, baseline_lookup, compute_baseline
+
+
+@pytest.fixture
+def weekly_ping_df(make_ping_df):
+    """`weeks` tuần dữ liệu theo giờ của 2 agent, latency có cao điểm buổi tối."""
+
+    def make(weeks: int = 4, seed: int = 0) -> pd.DataFrame:
+        df = make_ping_df(24 * 7 * weeks, agents=("HNI_Agent_1", "HCM_Agent_2"), start="2026-01-05", seed=seed)
+        rng = np.random.default_rng(seed)
+        df["mean_average_latency"] = 50 + 30 * (df["testing_time"].dt.hour >= 19) + rng.normal(0, 1, len(df))
+        df["mean_packet_loss_rate"] = 0.0
+        return df
+
+    return make
+
+
+def test_compute_baseline_matches_groupby(weekly_ping_df):
+    df = weekly_ping_df()
+    baseline = compute_baseline(df)
+
+    row = baseline[
+        (baseline["account_login_vqt"] == "HCM_Agent_2")
+        & (baseline["weekday"] == 2)
+        & (baseline["hour"] == 20)
+        & (baseline["metric"] == "mean_average_latency")
+    ].iloc[0]
+    times = pd.to_datetime(df["testing_time"])
+    cell = df.loc[
+        (df["account_login_vqt"] == "HCM_Agent_2") & (times.dt.weekday == 2) & (times.dt.hour == 20),
+        "mean_average_latency",
+    ]
+    assert row["n"] == 4
+    assert np.isclose(row["median"], cell.median())
+    assert np.isclose(row["mad"], (cell - cell.median()).abs().median())
+
+
+def test_baseline_lookup_missing_cells_are_nan(weekly_ping_df):
+    df = weekly_ping_df(weeks=1)
+    baseline = compute_baseline(df)
+    medians, _ = baseline_lookup(baseline, df, min_samples=1)
+    assert not np.isnan(medians).any()
+
+    medians, _ = baseline_lookup(baseline, df, min_samples=2)
+    assert np.isnan(medians).all()
+
+
+def test_baseline_scorer_ignores_daily_peak_but_flags_spike(weekly_ping_df):
+    history = weekly_ping_df(weeks=8)
+    baseline = compute_baseline(history)
+
+    current = weekly_ping_df(weeks=1, seed=1)
+    current["testing_time"] = current["testing_time"] + pd.Timedelta(weeks=8)
+    spike = (current["account_login_vqt"] == "HNI_Agent_1") & (current["testing_time"] == "2026-03-04 03:00")
+    current.loc[spike, "mean_average_latency"] += 15
+
+    series = prepare_series(current, metrics=["mean_average_latency"])
+    scorer = create_scorer("baseline", threshold=5, baseline=baseline)
+    anomalies = scorer.detect(series)
+    z = scorer.score(series)["__z_baseline"][:, 0]
+
+    assert pd.Timestamp("2026-03-04 03:00") in set(anomalies["testing_time"])
+    assert np.nanargmax(np.abs(z)) == np.flatnonzero(spike.loc[series.frame.index].to_numpy())[0]
+    # Cao điểm 19h đã nằm trong baseline -> không bị flag
+    assert not (pd.to_datetime(anomalies["testing_time"]).dt.hour == 19).any()
+
+
+def test_slot_ranges_cover_same_hour_of_week():
+    slots = pd.to_datetime(["2026-02-04 03:00", "2026-02-04 04:00"])
+    ranges = _slot_ranges(slots, lookback_weeks=3)
+    assert ranges == [
+        (pd.Timestamp("2026-01-21 03:00"), pd.Timestamp("2026-01-21 05:00")),
+        (pd.Timestamp("2026-01-28 03:00"), pd.Timestamp("2026-01-28 05:00")),
+        (pd.Timestamp("2026-02-04 03:00"), pd.Timestamp("2026-02-04 05:00")),
+    ]
+
+
+def test_save_baseline_upserts_cells(monkeypatch, tmp_path, weekly_ping_df):
+    monkeypatch.setattr(baseline_repo, "engine_sqlite", create_engine(f"sqlite:///{tmp_path / 'baseline.db'}"))
+    baseline = compute_baseline(weekly_ping_df(weeks=2))
+
+    baseline_repo.save_baseline("hour:8w", baseline, replace=True)
+    refreshed = baseline.head(3).assign(median=1.0)
+    baseline_repo.save_baseline("hour:8w", refreshed)
+
+    loaded = baseline_repo.load_baseline("hour:8w")
+    assert len(loaded) == len(baseline)
+    merged = loaded.merge(refreshed, on=baseline_repo.PROFILE_KEY_COLS, suffixes=("", "_new"))
+    assert (merged["median"] == 1.0).all()
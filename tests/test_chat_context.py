@@ -0,0 +1,50 @@
+from app.core.llm.context import ContextWindow, estimate_tokens, message_tokens, trim_to_key_numbers
+
+KPI_ANSWER = "\n".join(
+    ["Chất lượng mạng của FPT ngày 10/02/2026 ổn định. Chi tiết như sau:"]
+    + [f"Tỉnh {i}: độ trễ {30 + i}.5 ms, mất gói {i / 10:.1f}%" for i in range(60)]
+    + ["Nhận xét: không có bất thường đáng kể, mạng hoạt động tốt trong ngày."] * 5
+)
+
+
+def _history(turns: int):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"câu hỏi số {i} về chất lượng mạng"})
+        history.append({"role": "assistant", "content": KPI_ANSWER})
+    return history
+
+
+def test_trim_keeps_header_and_number_lines():
+    trimmed = trim_to_key_numbers(KPI_ANSWER, 200)
+    assert estimate_tokens(trimmed) <= 220
+    lines = trimmed.splitlines()
+    assert lines[0].startswith("Chất lượng mạng của FPT")
+    assert lines[1].startswith("Tỉnh 0:")
+    assert "Nhận xét" not in trimmed
+    assert trim_to_key_numbers("ngắn", 200) == "ngắn"
+
+
+def test_prompt_size_stays_within_budget_for_long_sessions():
+    window = ContextWindow(budget_tokens=1500, summary_max_tokens=300, message_max_tokens=400)
+    sizes = []
+    for turns in (1, 5, 20):
+        messages = window.build("system prompt", _history(turns), "câu hỏi mới")
+        sizes.append(sum(message_tokens(m) for m in messages))
+        assert messages[0]["content"] == "system prompt"
+        assert messages[-1] == {"role": "user", "content": "câu hỏi mới"}
+    assert all(size <= 1500 for size in sizes)
+    assert sizes[1] - 100 <= sizes[2] <= sizes[1] + 100
+
+
+def test_old_turns_are_folded_into_summary():
+    window = ContextWindow(budget_tokens=1500, summary_max_tokens=300, message_max_tokens=400)
+    messages = window.build("system prompt", _history(10), "câu hỏi mới")
+    summary = messages[1]
+    assert summary["role"] == "system" and summary["content"].startswith("Tóm tắt")
+    assert "Người dùng hỏi: câu hỏi số" in summary["content"]
+    # Phần còn giữ nguyên bắt đầu bằng 1 lượt hỏi của user và gồm lượt gần nhất
+    assert messages[2]["role"] == "user"
+    assert messages[-3]["content"] == "câu hỏi số 9 về chất lượng mạng"
+    # Cùng phần bị gộp -> dùng lại tóm tắt đã cache
+    assert window.build("system prompt", _history(10), "câu hỏi mới")[1] == summary
@@ -0,0 +1,82 @@
+import json
+import threading
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.llm.memory import FileChatMemory, SQLiteChatMemory, import_json_sessions, import_legacy_sessions
+from app.main import app
+
+
+def test_sqlite_memory_reads_last_messages_of_one_session(tmp_path):
+    db_path = str(tmp_path / "chat.db")
+    memory = SQLiteChatMemory("s1", db_path)
+    other = SQLiteChatMemory("s2", db_path)
+    for i in range(15):
+        memory.add_turn(f"q{i}", f"a{i}")
+    other.add_turn("hello", "hi")
+
+    history = memory.load_history(limit=4)
+    assert history == [
+        {"role": "user", "content": "q13"},
+        {"role": "assistant", "content": "a13"},
+        {"role": "user", "content": "q14"},
+        {"role": "assistant", "content": "a14"},
+    ]
+    assert len(memory.load_history()) == 30
+    assert other.load_history() == [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi"}]
+
+
+def test_concurrent_writers_do_not_lose_turns(tmp_path):
+    db_path = str(tmp_path / "chat.db")
+
+    def worker(n):
+        memory = SQLiteChatMemory("shared", db_path)
+        for i in range(20):
+            memory.add_turn(f"{n}-{i}", "ok")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    history = SQLiteChatMemory("shared", db_path).load_history()
+    assert len(history) == 160
+    # user / assistant của cùng 1 turn luôn nằm liền nhau
+    assert all(history[i]["role"] == "user" and history[i + 1]["role"] == "assistant" for i in range(0, 160, 2))
+
+
+def test_import_json_sessions_is_idempotent(tmp_path):
+    json_path = tmp_path / "chat_sessions.json"
+    json_path.write_text(json.dumps({
+        "a": [{"role": "user", "content": "xin chào"}, {"role": "assistant", "content": "chào bạn"}],
+        "b": [],
+    }, ensure_ascii=False), encoding="utf-8")
+    db_path = str(tmp_path / "chat.db")
+
+    assert import_json_sessions(str(json_path), db_path) == 2
+    assert import_json_sessions(str(json_path), db_path) == 0
+    assert SQLiteChatMemory("a", db_path).load_history() == FileChatMemory("a", str(json_path)).load_history()
+    assert FileChatMemory("a", str(json_path)).load_history(limit=1) == [{"role": "assistant", "content": "chào bạn"}]
+
+
+def test_app_start_imports_legacy_sessions_into_empty_sqlite(tmp_path, monkeypatch):
+    (tmp_path / "chat_sessions.json").write_text(json.dumps({
+        "a": [{"role": "user", "content": "q"}, {"role": "assistant", "content": "a"}],
+    }), encoding="utf-8")
+    db_path = str(tmp_path / "chat.db")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "CHAT_MEMORY_PATH", db_path)
+
+    with TestClient(app):
+        pass
+    assert SQLiteChatMemory("a", db_path).load_history() == [
+        {"role": "user", "content": "q"}, {"role": "assistant", "content": "a"},
+    ]
+
+    # DB đã có dữ liệu -> không import lại (kể cả session mới trong JSON)
+    SQLiteChatMemory("a", db_path).add_turn("q2", "a2")
+    (tmp_path / "chat_sessions.json").write_text(json.dumps({"b": [{"role": "user", "content": "x"}]}))
+    assert import_legacy_sessions(db_path=db_path) == 0
+    assert SQLiteChatMemory("b", db_path).load_history() == []
@@ -0,0 +1,103 @@
+import json
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.deps import get_db, get_llm, get_tool_registry
+from app.core.llm.agent import ChatAgent
+from app.core.llm.client import LLMRegistry
+from app.core.llm.memory import SQLiteChatMemory
+from app.core.llm.tools.registry import ToolRegistry
+from app.main import app
+from tests.helpers import EchoTool
+
+
+def _chunk(content=None, tool_calls=None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=tool_calls))])
+
+
+def _tool_delta(index, id=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+class StreamingCompletions:
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.calls = []
+
+    def create(self, **kwargs):
+        assert kwargs["stream"] is True
+        self.calls.append(kwargs)
+        return iter(self.streams.pop(0))
+
+
+def _agent(tmp_path, monkeypatch, completions, tool=None):
+    monkeypatch.setattr("app.core.config.settings.CHAT_MEMORY_PATH", str(tmp_path / "chat.db"))
+    llm = LLMRegistry(SimpleNamespace(chat=SimpleNamespace(completions=completions)), "chat-model", "summary-model")
+    return ChatAgent(
+        "s1", db=None, llm=llm, tools=ToolRegistry([tool or EchoTool()]), session_factory=lambda: nullcontext("db")
+    )
+
+
+def test_tokens_are_forwarded_and_turn_saved_after_stream(tmp_path, monkeypatch):
+    agent = _agent(tmp_path, monkeypatch, StreamingCompletions([_chunk("Xin "), _chunk("chào"), _chunk(None)]))
+    events = agent.chat_stream("hello")
+
+    assert next(events) == {"event": "token", "data": {"text": "Xin "}}
+    # Chưa xong stream -> chưa lưu memory
+    assert agent.memory.load_history() == []
+    rest = list(events)
+    assert rest[-1] == {"event": "done", "data": {"answer": "Xin chào", "session_id": "s1"}}
+    assert SQLiteChatMemory("s1", str(tmp_path / "chat.db")).load_history()[-1]["content"] == "Xin chào"
+
+
+def test_tool_call_deltas_are_assembled(tmp_path, monkeypatch):
+    class SummaryEcho(EchoTool):
+        is_final_answer = False
+
+    completions = StreamingCompletions(
+        [
+            _chunk(tool_calls=[_tool_delta(0, id="call_1", name="echo", arguments='{"te')]),
+            _chunk(tool_calls=[_tool_delta(0, arguments='xt": "hi"}')]),
+        ],
+        [_chunk("Kết quả: "), _chunk("db:hi")],
+    )
+    agent = _agent(tmp_path, monkeypatch, completions, SummaryEcho())
+    events = list(agent.chat_stream("gọi tool"))
+
+    assert [e["event"] for e in events] == ["tool_call", "tool_result", "token", "token", "done"]
+    assert events[0]["data"] == {"name": "echo", "arguments": '{"text": "hi"}'}
+    assert events[1]["data"] == {"name": "echo", "ok": True}
+    second_messages = completions.calls[1]["messages"]
+    assert second_messages[-1] == {"role": "tool", "tool_call_id": "call_1", "content": "db:hi"}
+    assert events[-1]["data"]["answer"] == "Kết quả: db:hi"
+
+
+def test_chat_stream_endpoint_emits_sse(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.CHAT_MEMORY_PATH", str(tmp_path / "chat.db"))
+    completions = StreamingCompletions([_chunk("Chào "), _chunk("bạn")])
+    llm = LLMRegistry(SimpleNamespace(chat=SimpleNamespace(completions=completions)), "chat-model", "summary-model")
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+
+    def override_db():
+        with Session(engine) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_llm] = lambda: llm
+    app.dependency_overrides[get_tool_registry] = lambda: ToolRegistry([EchoTool()])
+    try:
+        response = TestClient(app).post("/api/v1/chat/stream", json={"message": "hi", "session_id": "abc"})
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    blocks = [b for b in response.text.split("\n\n") if b]
+    events = [(b.split("\n")[0][len("event: "):], json.loads(b.split("\n")[1][len("data: "):])) for b in blocks]
+    assert events[0] == ("session", {"session_id": "abc"})
+    assert [e for e, _ in events[1:]] == ["token", "token", "done"]
+    assert events[-1][1]["answer"] == "Chào bạn"
@@ -0,0 +1,145 @@
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict
+
+from app.core.llm.agent import ChatAgent
+from app.core.llm.client import LLMRegistry
+from app.core.llm.tools.base import BaseTool
+from app.core.llm.tools.registry import ToolRegistry
+
+
+class SlowSummaryTool(BaseTool):
+    """Giả lập NetworkSummaryTool: mỗi ISP tốn `delay` giây."""
+
+    is_final_answer = True
+
+    def __init__(self, delays: Dict[str, float]):
+        self.delays = delays
+        self.sessions = []
+
+    @property
+    def name(self) -> str:
+        return "get_network_summary"
+
+    @property
+    def description(self) -> str:
+        return "Summary"
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        return {"type": "object", "properties": {"isp": {"type": "string"}}}
+
+    def run(self, db, isp: str, **kwargs) -> str:
+        self.sessions.append(db)
+        time.sleep(self.delays[isp])
+        return f"{isp} ok"
+
+
+class ToolCallCompletions:
+    def __init__(self, isps):
+        self.isps = isps
+
+    def create(self, **kwargs):
+        calls = [
+            SimpleNamespace(
+                id=f"call_{i}", type="function",
+                function=SimpleNamespace(name="get_network_summary", arguments=f'{{"isp": "{isp}"}}'),
+            )
+            for i, isp in enumerate(self.isps)
+        ]
+        message = SimpleNamespace(tool_calls=calls, content=None, model_dump=lambda: {"role": "assistant"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _agent(tmp_path, monkeypatch, tool, isps, opened, workers=4):
+    monkeypatch.setattr("app.core.config.settings.CHAT_MEMORY_PATH", str(tmp_path / "chat.db"))
+    llm = LLMRegistry(SimpleNamespace(chat=SimpleNamespace(completions=ToolCallCompletions(isps))), "m", "m")
+
+    @contextmanager
+    def session_factory():
+        session = object()
+        opened.append(threading.get_ident())
+        yield session
+
+    return ChatAgent("s1", db=None, llm=llm, tools=ToolRegistry([tool], max_workers=workers), session_factory=session_factory)
+
+
+def test_three_isp_summaries_run_concurrently_in_order(tmp_path, monkeypatch):
+    tool = SlowSummaryTool({"Viettel": 0.3, "VNPT": 0.1, "FPT": 0.2})
+    opened = []
+    agent = _agent(tmp_path, monkeypatch, tool, ["Viettel", "VNPT", "FPT"], opened)
+
+    started = time.monotonic()
+    answer = agent.chat("So sánh chất lượng mạng 3 nhà mạng")
+    elapsed = time.monotonic() - started
+
+    # ~ tool chậm nhất, không phải tổng 0.6s
+    assert elapsed < 0.5
+    assert answer == "Viettel ok\n\nVNPT ok\n\nFPT ok"
+    assert len(set(map(id, tool.sessions))) == 3 and len(opened) == 3
+
+
+def test_slow_tool_times_out_without_blocking_others(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.CHAT_TOOL_TIMEOUT_SECONDS", 0.2)
+    tool = SlowSummaryTool({"Viettel": 1.0, "VNPT": 0.05})
+    agent = _agent(tmp_path, monkeypatch, tool, ["Viettel", "VNPT"], [])
+
+    messages = []
+    events = list(agent._run_tool_calls(messages, [
+        ("call_0", "get_network_summary", '{"isp": "Viettel"}'),
+        ("call_1", "get_network_summary", '{"isp": "VNPT"}'),
+    ]))
+
+    assert [e["event"] for e in events] == ["tool_call", "tool_call", "tool_result", "tool_result"]
+    assert events[2]["data"] == {"name": "get_network_summary", "ok": False}
+    assert [m["tool_call_id"] for m in messages] == ["call_0", "call_1"]
+    assert "timed out" in messages[0]["content"] and messages[1]["content"] == "VNPT ok"
+
+
+def _calls(*isps):
+    return [(f"call_{i}", "get_network_summary", f'{{"isp": "{isp}"}}') for i, isp in enumerate(isps)]
+
+
+def test_queue_wait_does_not_count_towards_tool_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.CHAT_TOOL_TIMEOUT_SECONDS", 0.3)
+    tool = SlowSummaryTool({"Viettel": 0.2, "VNPT": 0.2})
+    agent = _agent(tmp_path, monkeypatch, tool, [], [], workers=1)
+
+    messages = []
+    list(agent._run_tool_calls(messages, _calls("Viettel", "VNPT")))
+    # VNPT xếp hàng 0.2s + chạy 0.2s > 0.3s nhưng chỉ thời gian chạy bị tính
+    assert [m["content"] for m in messages] == ["Viettel ok", "VNPT ok"]
+
+
+def test_tool_still_queued_after_timeout_is_cancelled(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.CHAT_TOOL_TIMEOUT_SECONDS", 0.1)
+    tool = SlowSummaryTool({"Viettel": 0.4, "VNPT": 0.0})
+    agent = _agent(tmp_path, monkeypatch, tool, [], [], workers=1)
+
+    messages = []
+    list(agent._run_tool_calls(messages, _calls("Viettel", "VNPT")))
+    assert "timed out" in messages[0]["content"] and "not started" in messages[1]["content"]
+    agent.tools.executor.submit(lambda: None).result()
+    assert len(tool.sessions) == 1
+
+
+class SlowCommandTool(SlowSummaryTool):
+    has_side_effects = True
+
+    def run(self, db, isp: str, **kwargs) -> str:
+        self.thread = threading.get_ident()
+        return super().run(db, isp, **kwargs)
+
+
+def test_side_effect_tool_runs_serially_without_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.CHAT_TOOL_TIMEOUT_SECONDS", 0.05)
+    tool = SlowCommandTool({"Viettel": 0.15})
+    agent = _agent(tmp_path, monkeypatch, tool, [], [])
+
+    messages = []
+    events = list(agent._run_tool_calls(messages, _calls("Viettel")))
+    assert events[-1]["data"] == {"name": "get_network_summary", "ok": True}
+    assert messages[0]["content"] == "Viettel ok"
+    assert tool.thread == threading.get_ident()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from app.api.v1.endpoints.log_agggregate_data import downsample_rows
+from app.services.downsample import downsample_indices, lttb, minmax_buckets
+
+
+def _series(size: int = 2160, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    x = np.arange(size, dtype=float)
+    y = 100 + 10 * np.sin(x / 24 * 2 * np.pi) + rng.normal(0, 2, size)
+    y[1500] = 400.0  # spike 1 giờ
+    y[700] = 5.0
+    return x, y
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x, y = _series()
+    idx = lttb(x, y, 200)
+    assert len(idx) == 200
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+    assert 1500 in idx and 700 in idx
+
+
+def test_minmax_keeps_bucket_extremes():
+    x, y = _series()
+    idx = minmax_buckets(x, y, 100)
+    assert len(idx) <= 100
+    assert np.all(np.diff(idx) > 0)
+    assert 1500 in idx and 700 in idx
+
+
+def test_short_series_is_untouched_and_nan_dropped():
+    x = np.arange(5, dtype=float)
+    assert list(lttb(x, x, 10)) == [0, 1, 2, 3, 4]
+    y = np.array([1.0, np.nan, 3.0, 4.0, 5.0])
+    assert list(downsample_indices(x, y, 10, "minmax")) == [0, 2, 3, 4]
+
+
+def test_downsample_rows_per_agent():
+    x, y = _series()
+    times = pd.date_range("2026-01-01", periods=len(x), freq="h")
+    rows = [
+        {"testing_time": t, "account_login_vqt": agent, "server_name": "Japan_Speedtest", "mean_jitter": v}
+        for agent in ["HNI_Agent_1", "HNI_Agent_2"]
+        for t, v in zip(times, y)
+    ]
+    out = downsample_rows(rows, "mean_jitter", 100, "lttb")
+    assert len(out) == 200
+    assert sum(r["account_login_vqt"] == "HNI_Agent_1" for r in out) == 100
+    assert [r["testing_time"] for r in out] == sorted(r["testing_time"] for r in out)
+    assert max(r["mean_jitter"] for r in out) == y.max()
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from app.services.anomaly_engine import create_scorer, prepare_series
+from app.services.ewma_stats import EwmaState, ewma_scan
+
+
+def test_ewma_scan_matches_scalar_recursion():
+    rng = np.random.default_rng(0)
+    x = rng.normal(10, 2, 50)
+    x[[5, 17]] = np.nan
+    alpha = 0.2
+
+    state = EwmaState.empty(1, 1)
+    z, expected, std = ewma_scan(x.reshape(1, -1, 1), np.zeros(50, dtype=int), state, alpha, min_periods=3)
+
+    level, var, count = 0.0, 0.0, 0
+    for t, v in enumerate(x):
+        if count:
+            assert np.isclose(expected[0, t, 0], level)
+        if np.isnan(v):
+            assert np.isnan(z[0, t, 0])
+            continue
+        if count >= 3:
+            assert np.isclose(z[0, t, 0], (v - level) / np.sqrt(var))
+        if count == 0:
+            level = v
+        else:
+            var = (1 - alpha) * (var + alpha * (v - level) ** 2)
+            level = level + alpha * (v - level)
+        count += 1
+
+    assert np.isclose(state.level[0, 0], level)
+    assert np.isclose(state.var[0, 0], var)
+    assert state.count[0, 0] == count
+
+
+def test_state_round_trip_continues_scan():
+    rng = np.random.default_rng(1)
+    values = rng.normal(100, 5, (3, 48, 2))
+    hours = np.arange(48) % 24
+
+    full_state = EwmaState.empty(3, 2, seasonal=True)
+    z_full, _, _ = ewma_scan(values, hours, full_state, alpha=0.1)
+
+    keys = [("a",), ("b",), ("c",)]
+    first = EwmaState.empty(3, 2, seasonal=True)
+    ewma_scan(values[:, :30], hours[:30], first, alpha=0.1)
+    resumed = EwmaState.from_series_states(keys, first.to_series_states(keys), 2, seasonal=True)
+    z_tail, _, _ = ewma_scan(values[:, 30:], hours[30:], resumed, alpha=0.1)
+
+    np.testing.assert_allclose(z_tail, z_full[:, 30:], equal_nan=True)
+
+
+def test_holt_winters_learns_daily_pattern():
+    times = pd.date_range("2026-01-01", periods=24 * 14, freq="h")
+    latency = 50 + 30 * (times.hour >= 19) + np.random.default_rng(2).normal(0, 1, len(times))
+    latency[-21] += 10  # 03:00 ngày cuối, nhỏ hơn biên độ cao điểm buổi tối
+    df = pd.DataFrame({
+        "isp": "Viettel",
+        "account_login_vqt": "HNI_Agent_1",
+        "server_name": "Japan_Speedtest",
+        "testing_time": times,
+        "mean_jitter": 1.0,
+        "mean_average_latency": latency,
+        "mean_packet_loss_rate": 0.0,
+    })
+    series = prepare_series(df, metrics=["mean_average_latency"])
+
+    flat = create_scorer("ewma", window=24, threshold=3).detect(series)
+    seasonal = create_scorer("holt_winters", window=24, threshold=3).detect(series)
+
+    # Cao điểm buổi tối làm EWMA thường có std lớn -> bỏ sót; Holt-Winters đã học mùa vụ nên bắt được
+    assert times[-21] not in set(flat["testing_time"])
+    assert times[-21] in set(seasonal["testing_time"])
@@ -0,0 +1,80 @@
+from sqlalchemy import text
+
+from app.core.result_cache import LRUTTLCache, ResultCache
+from app.services import get_kpi_data
+from app.services.get_kpi_data import (
+    AggregateLevel,
+    get_internet_kpi_batch_data,
+    get_internet_kpi_data,
+    group_kpi_rows,
+)
+from tests.helpers import FakeDB
+
+
+def test_group_kpi_rows_fills_missing_pairs():
+    rows = [
+        {"kpi_code": "internet_latency", "location_level": "network", "date_hour": "2026-02-05-00"},
+        {"kpi_code": "internet_latency", "location_level": "network", "date_hour": "2026-02-04-00"},
+        {"kpi_code": "internet_jitter", "location_level": "area", "date_hour": "2026-02-05-00"},
+    ]
+    grouped = group_kpi_rows(rows, ["internet_jitter", "internet_latency"], ["area", "network"])
+    assert [r["date_hour"] for r in grouped["internet_latency"]["network"]] == ["2026-02-05-00", "2026-02-04-00"]
+    assert grouped["internet_latency"]["area"] == []
+    assert grouped["internet_jitter"]["network"] == []
+    assert len(grouped["internet_jitter"]["area"]) == 1
+
+
+class RecordingDB(FakeDB):
+    def execute(self, sql, params=None):
+        self.last_sql, self.last_params = str(sql), params
+        return super().execute(sql, params)
+
+
+def test_result_cache_array_watermark_is_one_query():
+    cache = ResultCache(LRUTTLCache(maxsize=16, ttl=3600))
+    db = RecordingDB("2026-02-05-00")
+    loads = []
+
+    def load():
+        loads.append(1)
+        return [{"n": len(loads)}]
+
+    filters = {"kpi_code": ["b", "a"], "location_level": ("network", "area")}
+    assert cache.get_or_load("ns", "t", {}, db, load, watermark_filters=filters) == [{"n": 1}]
+    assert cache.get_or_load("ns", "t", {}, db, load, watermark_filters=filters) == [{"n": 1}]
+    assert db.watermark_queries == 1 and len(loads) == 1
+    assert "kpi_code = ANY(:kpi_code)" in db.last_sql and "location_level = ANY(:location_level)" in db.last_sql
+    assert db.last_params == {"kpi_code": ["a", "b"], "location_level": ["area", "network"]}
+
+
+def test_batch_matches_individual_queries(pg_db, monkeypatch):
+    db = pg_db
+    db.execute(text("""
+        CREATE TEMP TABLE internet_kpi_daily AS
+        SELECT 'internet_kpi_' || (g % 5) AS kpi_code,
+               (ARRAY['network', 'area', 'province'])[g % 3 + 1] AS location_level,
+               to_char(timestamp '2024-01-01' + (g / 15) * interval '1 hour', 'YYYY-MM-DD-HH24') AS date_hour,
+               g AS kpi_value
+        FROM generate_series(1, 20000) g
+    """))
+    monkeypatch.setitem(get_kpi_data.INTERNET_KPI_TABLES, AggregateLevel.daily, "pg_temp.internet_kpi_daily")
+    monkeypatch.setattr(get_kpi_data.result_cache, "enabled", False)
+
+    kpi_codes = ["internet_kpi_1", "internet_kpi_3", "internet_kpi_missing"]
+    levels = ["network", "province"]
+    batch = get_internet_kpi_batch_data(AggregateLevel.daily, kpi_codes, levels, 8, db, "2024-01-20-00")
+
+    assert set(batch) == set(kpi_codes)
+    assert batch["internet_kpi_missing"] == {"network": [], "province": []}
+    for kpi_code in kpi_codes:
+        for level in levels:
+            single = get_internet_kpi_data(AggregateLevel.daily, kpi_code, level, 8, db, "2024-01-20-00")
+            assert [dict(r) for r in batch[kpi_code][level]] == [dict(r) for r in single]
+    assert batch["internet_kpi_1"]["network"]
+
+    # Watermark = ANY của batch bằng max watermark của từng cặp
+    cache = ResultCache(LRUTTLCache(maxsize=16, ttl=3600))
+    table = "pg_temp.internet_kpi_daily"
+    pairs = [cache.watermark(db, table, {"kpi_code": k, "location_level": lv}) for k in kpi_codes for lv in levels]
+    batch_mark = cache.watermark(db, table, {"kpi_code": kpi_codes, "location_level": levels})
+    assert batch_mark == max(m for m in pairs if m is not None)
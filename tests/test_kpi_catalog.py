@@ -0,0 +1,105 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.deps import get_db
+from app.core.pagination import encode_cursor
+from app.main import app
+from app.services.kpi_catalog import KPI_CATALOG, KPICode, get_kpi
+from app.services.promt_summay import kpi_code_map
+
+
+def test_every_kpi_code_has_a_spec():
+    assert set(KPI_CATALOG) == set(KPICode)
+    assert all(spec.code is code for code, spec in KPI_CATALOG.items())
+
+
+def test_lookup_by_code_value_and_log_alias():
+    assert get_kpi(KPICode.dns_time) is get_kpi("internet_dns_time") is get_kpi("dns_time")
+    spec = get_kpi("average_latency")
+    assert spec.value_column == "mean_average_latency"
+    assert spec.columns() == "testing_time, aggregate_level, account_login_vqt, server_name, mean_average_latency"
+    assert spec.columns("sample_count", "server_name").endswith("mean_average_latency, sample_count")
+    with pytest.raises(KeyError):
+        get_kpi("internet_unknown")
+
+
+def test_summary_labels_use_internet_kpi_codes():
+    assert kpi_code_map["internet_packet_loss_rate"] == "Tỷ lệ mất gói tin"
+    assert len(kpi_code_map) == len(KPI_CATALOG)
+
+
+class RecordingDB:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql, params=None):
+        self.calls.append((str(sql), params))
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return []
+
+
+def test_log_endpoint_keeps_server_name_filter():
+    db = RecordingDB()
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        client = TestClient(app)
+        params = {"aggregate_level": "hour", "kpi_code": "dns_time", "account_login_vqt": "HNI", "server_name": "8.8.8.8"}
+        assert client.get("/api/v1/log-aggregate-data", params=params).status_code == 200
+        sql, bound = db.calls[-1]
+        assert "server_name = :server_name" in sql and "dns_server_isp = :server" not in sql
+        assert bound["server_name"] == "8.8.8.8"
+        assert "FROM log_data_aggregate.dns_results_aggregate" in sql
+
+        client.get("/api/v1/log-aggregate-data", params={**params, "server": "Viettel"})
+        sql, bound = db.calls[-1]
+        assert "server_name = :server_name" in sql and "dns_server_isp = :server" in sql
+        assert bound["server"] == "Viettel"
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_log_endpoint_keyset_includes_server_column():
+    assert get_kpi("dns_time").keyset_columns == ("testing_time", "account_login_vqt", "dns_server_isp")
+    assert get_kpi("average_latency").keyset_columns == ("testing_time", "account_login_vqt", "server_name")
+
+    db = RecordingDB()
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        client = TestClient(app)
+        params = {"aggregate_level": "hour", "kpi_code": "dns_time", "account_login_vqt": "HNI", "server_name": "8.8.8.8"}
+        cursor = encode_cursor(
+            {"testing_time": "2026-02-01T10:00:00", "account_login_vqt": "HNI_Agent_1", "dns_server_isp": "Viettel"},
+            get_kpi("dns_time").keyset_columns,
+        )
+        assert client.get("/api/v1/log-aggregate-data", params={**params, "limit": 10, "cursor": cursor}).status_code == 200
+        sql, bound = db.calls[-1]
+        assert "(testing_time, account_login_vqt, dns_server_isp) >" in sql
+        assert "ORDER BY testing_time, account_login_vqt, dns_server_isp" in sql
+        assert bound["cursor_dns_server_isp"] == "Viettel"
+        # Cursor 2 cột (định dạng cũ) không khớp khoá của bảng dns
+        old = encode_cursor({"testing_time": "2026-02-01T10:00:00", "account_login_vqt": "HNI_Agent_1"})
+        assert client.get("/api/v1/log-aggregate-data", params={**params, "cursor": old}).status_code == 400
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_log_endpoint_rejects_max_points_with_pagination_or_ndjson():
+    db = RecordingDB()
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        client = TestClient(app)
+        url = "/api/v1/log-aggregate-data"
+        params = {"aggregate_level": "hour", "kpi_code": "dns_time", "account_login_vqt": "HNI", "server_name": "8.8.8.8",
+                  "max_points": 100}
+        assert client.get(url, params={**params, "limit": 10}).status_code == 422
+        assert client.get(url, params={**params, "cursor": "x"}).status_code == 422
+        assert client.get(url, params=params, headers={"Accept": "application/x-ndjson"}).status_code == 422
+        assert db.calls == []
+        assert client.get(url, params=params).status_code == 200
+    finally:
+        app.dependency_overrides.clear()
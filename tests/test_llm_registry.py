@@ -0,0 +1,79 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import openai
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.llm.agent import ChatAgent
+from app.core.llm import client as llm_client
+from app.core.llm.client import LLMRegistry
+from app.core.llm.tools.registry import ToolRegistry
+from app.main import app
+from tests.helpers import EchoTool
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        call = SimpleNamespace(
+            id="call_1", type="function", function=SimpleNamespace(name="echo", arguments='{"text": "hi"}')
+        )
+        message = SimpleNamespace(tool_calls=[call], content=None, model_dump=lambda: {"role": "assistant"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_agents_share_client_and_cached_tool_schemas(monkeypatch, tmp_path):
+    monkeypatch.setattr("app.core.config.settings.CHAT_MEMORY_PATH", str(tmp_path / "chat.db"))
+    completions = FakeCompletions()
+    llm = LLMRegistry(SimpleNamespace(chat=SimpleNamespace(completions=completions)), "chat-model", "summary-model")
+    tools = ToolRegistry([EchoTool()])
+
+    first = ChatAgent("s1", db=None, llm=llm, tools=tools, session_factory=lambda: nullcontext("db1"))
+    second = ChatAgent("s2", db=None, llm=llm, tools=tools, session_factory=lambda: nullcontext("db2"))
+    assert first.client is second.client
+
+    assert first.chat("xin chào") == "db1:hi"
+    assert second.chat("xin chào") == "db2:hi"
+    assert completions.calls[0]["tools"] is completions.calls[1]["tools"] is tools.schemas
+    assert completions.calls[0]["model"] == "chat-model"
+
+
+def test_app_boots_without_api_key_and_llm_routes_return_503(monkeypatch):
+    monkeypatch.setattr(settings, "OPENROUTER_API_KEY", None)
+    with TestClient(app) as client:
+        assert not app.state.llm.available
+        assert client.get("/api/v1/healthz").status_code == 200
+        assert client.post("/api/v1/chat", json={"session_id": "s1", "message": "hi"}).status_code == 503
+
+
+def test_client_is_created_lazily_once(monkeypatch):
+    monkeypatch.setattr(settings, "OPENROUTER_API_KEY", "test-key")
+    created = []
+
+    def factory():
+        created.append(SimpleNamespace(chat=None, close=lambda: None))
+        return created[-1]
+
+    monkeypatch.setattr(llm_client, "_create_openai_client", factory)
+    with TestClient(app) as client:
+        llm = app.state.llm
+        assert "get_network_summary" in app.state.tools
+        client.get("/api/v1/healthz")
+        assert created == []  # chưa có chat / tool nào dùng LLM
+        assert llm.client is llm.client is created[0]
+        assert app.state.llm is llm and len(created) == 1
+
+
+def test_pooled_openai_client_uses_configured_timeouts(monkeypatch):
+    monkeypatch.setattr(settings, "OPENROUTER_API_KEY", "test-key")
+    llm = llm_client.create_llm_registry()
+    try:
+        timeout = llm.client.timeout
+        assert isinstance(timeout, openai.Timeout)
+        assert timeout.connect == settings.LLM_CONNECT_TIMEOUT_SECONDS
+    finally:
+        llm.close()
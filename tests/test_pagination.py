@@ -0,0 +1,106 @@
+import json
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.deps import get_db_sqlite
+from app.core.pagination import decode_cursor, encode_cursor, iter_ndjson
+from app.main import app
+
+URL = "/api/v1/anomaly-detection/ping"
+PARAMS = {
+    "aggregate_level": "hour",
+    "kpi_code": "average_latency",
+    "account_login_vqt": "HNI",
+    "server_name": "Japan_Speedtest",
+    "duration": 7,
+}
+
+
+def _sqlite_session(tmp_path, hours: int = 50):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anomaly.db'}")
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours)
+    rows = [
+        {
+            "account_login_vqt": agent,
+            "testing_time": (start + timedelta(hours=h)).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            "mean_average_latency": 100.0 + h,
+        }
+        for h in range(hours)
+        for agent in ["HNI_Agent_1", "HNI_Agent_2"]
+    ]
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE ping_anomaly_zscore (
+                isp TEXT, account_login_vqt TEXT, server_name TEXT, aggregate_level TEXT,
+                testing_time TEXT, mean_average_latency REAL
+            )
+        """))
+        conn.execute(text("""
+            INSERT INTO ping_anomaly_zscore
+            VALUES ('Viettel', :account_login_vqt, 'Japan_Speedtest', 'hour', :testing_time, :mean_average_latency)
+        """), rows)
+    return engine, sessionmaker(bind=engine)
+
+
+def _client(session_factory) -> TestClient:
+    def override():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db_sqlite] = override
+    return TestClient(app)
+
+
+def test_cursor_roundtrip():
+    token = encode_cursor({"testing_time": datetime(2026, 2, 1, 10), "account_login_vqt": "HNI_Agent_1"})
+    assert decode_cursor(token) == {
+        "cursor_testing_time": "2026-02-01T10:00:00",
+        "cursor_account_login_vqt": "HNI_Agent_1",
+    }
+
+
+def test_keyset_pages_cover_full_result(tmp_path):
+    engine, factory = _sqlite_session(tmp_path)
+    client = _client(factory)
+    try:
+        full = client.get(URL, params=PARAMS).json()
+        assert full["total"] == 100 and full["next_cursor"] is None
+
+        pages, cursor = [], None
+        while True:
+            body = client.get(URL, params={**PARAMS, "limit": 30, **({"cursor": cursor} if cursor else {})}).json()
+            pages.append(body["data"])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        assert [len(p) for p in pages] == [30, 30, 30, 10]
+        assert [r for p in pages for r in p] == full["data"]
+
+        assert client.get(URL, params={**PARAMS, "cursor": "not-a-cursor"}).status_code == 400
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+def test_ndjson_stream_matches_json(tmp_path):
+    engine, factory = _sqlite_session(tmp_path)
+    client = _client(factory)
+    try:
+        full = client.get(URL, params=PARAMS).json()["data"]
+        response = client.get(URL, params=PARAMS, headers={"Accept": "application/x-ndjson"})
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert [json.loads(line) for line in response.text.splitlines()] == full
+
+        # Mỗi chunk của server-side cursor được flush thành 1 phần của response
+        with factory() as db:
+            chunks = list(iter_ndjson(db, text("SELECT * FROM ping_anomaly_zscore"), {}, chunk_size=16))
+        assert len(chunks) == 7
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
@@ -0,0 +1,51 @@
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.parallel_detection import shard_ids
+from app.services.ping_anomaly_robust_zscore import detect_anomalies_robust
+from app.services.ping_zscore_service import detect_anomalies
+from app.services.test_ping_anomaly_service import add_robust_zscore
+
+GROUP_COLS = ["isp", "account_login_vqt", "server_name"]
+METRICS = ["mean_jitter", "mean_average_latency", "mean_packet_loss_rate"]
+
+
+@pytest.fixture
+def ping_df(make_ping_df):
+    df = make_ping_df(
+        isps=("Viettel", "VNPT", "FPT"),
+        agents=("HNI_Agent_0", "HNI_Agent_1"),
+        servers=("Server_0_Speedtest", "Server_1_Speedtest"),
+    )
+    # Xáo trộn để kiểm tra việc sort + ghép kết quả theo vị trí
+    return df.sample(frac=1, random_state=0)
+
+
+def test_shard_ids_are_stable_per_series(ping_df):
+    df = ping_df
+    shards = shard_ids(df, GROUP_COLS, 5)
+    assert shards.min() >= 0 and shards.max() < 5
+    assert (pd.Series(shards, index=df.index).groupby([df[c] for c in GROUP_COLS]).nunique() == 1).all()
+
+
+@pytest.mark.parametrize("detect", [detect_anomalies, detect_anomalies_robust])
+def test_parallel_matches_serial(detect, ping_df):
+    df = ping_df
+    serial = detect(df.copy(), GROUP_COLS, METRICS, window=12, threshold=2)
+    parallel = detect(df.copy(), GROUP_COLS, METRICS, window=12, threshold=2, workers=2)
+    assert len(serial) > 0
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+def test_parallel_add_robust_zscore_matches_serial(ping_df):
+    df = ping_df
+    kwargs: dict[str, Any] = dict(
+        group_cols=GROUP_COLS, time_col="testing_time", metrics=METRICS, history_points=12, z_threshold=2
+    )
+    serial = add_robust_zscore(df, **kwargs)
+    parallel = add_robust_zscore(df, workers=2, **kwargs)
+    assert len(serial) > 0
+    pd.testing.assert_frame_equal(serial, parallel)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from app.repositories import ping_results_repo
+from app.repositories.ping_results_repo import DETECTION_COLUMNS, METRICS, fetch_ping_columns
+from app.services.anomaly_engine import create_scorer, prepare_series
+
+
+def test_column_chunks_are_typed():
+    assert ping_results_repo._column_chunk("mean_jitter", (1.5, None)).dtype == np.float64
+    assert isinstance(ping_results_repo._column_chunk("isp", ("VNPT", "FPT")), pd.Categorical)
+    times = ping_results_repo._column_chunk("testing_time", (pd.Timestamp("2026-02-01").to_pydatetime(),))
+    assert pd.api.types.is_datetime64_dtype(times)
+
+
+def test_stream_options_are_per_statement():
+    class FakeSession:
+        def execute(self, sql, params=None, execution_options=None):
+            self.execution_options = execution_options
+            return self
+
+        def partitions(self, size):
+            return iter([[("Viettel", 1.5)]])
+
+        def connection(self):
+            raise AssertionError("không được đổi option trên connection của Session")
+
+    db = FakeSession()
+    df = fetch_ping_columns(db, "hour", columns=["isp", "mean_jitter"], chunk_size=17)
+    assert db.execution_options == {"stream_results": True, "max_row_buffer": 17}
+    assert df["mean_jitter"].tolist() == [1.5]
+
+
+def test_columnar_fetch_matches_select_star(ping_db, insert_ping_rows, make_ping_df):
+    df = make_ping_df(isps=("Viettel", "VNPT", "FPT"), decimals=4)
+    df.loc[5, "mean_jitter"] = np.nan
+    insert_ping_rows(df)
+    from_time = pd.Timestamp("2026-02-01 06:00")
+
+    legacy = ping_results_repo.fetch_ping_data(ping_db, "hour", from_time)
+    # chunk nhỏ để test ghép nhiều partition
+    columnar = fetch_ping_columns(ping_db, "hour", from_time=from_time, chunk_size=17)
+
+    assert list(columnar.columns) == DETECTION_COLUMNS
+    assert isinstance(columnar["isp"].dtype, pd.CategoricalDtype)
+    assert all(columnar[m].dtype == np.float64 for m in METRICS)
+
+    keys = ["isp", "testing_time"]
+    legacy = legacy.sort_values(keys).reset_index(drop=True)
+    columnar = columnar.sort_values(keys).reset_index(drop=True)
+    assert (columnar["isp"].astype(str) == legacy["isp"]).all()
+    for m in METRICS:
+        np.testing.assert_allclose(columnar[m], legacy[m].astype(float), equal_nan=True)
+
+    scorer = create_scorer("zscore", window=12, threshold=2)
+    pd.testing.assert_index_equal(
+        scorer.detect(prepare_series(columnar)).index,
+        scorer.detect(prepare_series(legacy)).index,
+    )
+
+    after = fetch_ping_columns(ping_db, "hour", after_time=pd.Timestamp("2026-02-02 22:00"))
+    assert len(after) == 3
+    assert "stream_results" not in ping_db.connection().get_execution_options()
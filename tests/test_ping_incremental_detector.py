@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.repositories.detector_state_repo import SeriesStates
+from app.services.ping_anomaly_robust_zscore import detect_anomalies_robust
+from app.services.ping_incremental_detector import GROUP_COLS, METRICS, IncrementalDetector
+from app.services.ping_zscore_service import detect_anomalies
+
+
+@pytest.mark.parametrize(
+    "detector, full_detect, suffix",
+    [("zscore", detect_anomalies, "__z"), ("robust_zscore", detect_anomalies_robust, "__z_robust")],
+)
+def test_incremental_matches_full_recompute(detector, full_detect, suffix, make_ping_df):
+    df = make_ping_df(60, servers=("Japan_Speedtest", "HCM_Speedtest"))
+    window, threshold = 12, 2
+    cutoff = df["testing_time"].sort_values().iloc[len(df) // 2]
+
+    # Warm-up bằng nửa đầu, lưu/khôi phục state rồi chỉ đẩy các dòng mới
+    warm = IncrementalDetector(detector, METRICS, window)
+    warm.score(df[df["testing_time"] <= cutoff])
+    engine = IncrementalDetector(detector, METRICS, window, states=warm.export_state())
+    new_rows = df[df["testing_time"] > cutoff]
+    incremental = engine.select_anomalies(engine.score(new_rows), threshold)
+
+    full = full_detect(df.copy(), GROUP_COLS, METRICS, window=window, threshold=threshold)
+    full = full[full["testing_time"] > cutoff]
+
+    assert len(incremental) == len(full) > 0
+    z_cols = [f"{m}{suffix}" for m in METRICS]
+    np.testing.assert_allclose(
+        incremental[z_cols].to_numpy(), full[z_cols].to_numpy(), rtol=1e-7, equal_nan=True
+    )
+
+
+def test_late_rows_of_one_series_are_not_lost_behind_another(make_ping_df):
+    df = make_ping_df(30, servers=("Japan_Speedtest", "HCM_Speedtest"))
+    window, threshold = 12, 2
+    late = (df["server_name"] == "HCM_Speedtest") & (df["testing_time"] >= df["testing_time"].iloc[20])
+
+    # Lần 1: HCM mới tới giờ 19, Japan đã tới giờ 29 -> watermark toàn cục là giờ 29
+    first = IncrementalDetector("zscore", METRICS, window)
+    first.score(df[~late])
+    watermark = df.loc[~late, "testing_time"].max()
+
+    # Lần 2: đọc lại khoảng lag trước watermark; các dòng đã xử lý của Japan bị loại, dòng muộn của HCM được giữ
+    reread = df[df["testing_time"] > watermark - pd.Timedelta(hours=12)]
+    engine = IncrementalDetector("zscore", METRICS, window, states=first.export_state(), watermark=watermark)
+    scored = engine.score(reread)
+    assert set(scored["server_name"]) == {"HCM_Speedtest"}
+    assert len(scored) == late.sum()
+
+    incremental = engine.select_anomalies(scored, threshold)
+    full = detect_anomalies(df.copy(), GROUP_COLS, METRICS, window=window, threshold=threshold)
+    expected = full[full["server_name"].eq("HCM_Speedtest") & full["testing_time"].isin(scored["testing_time"])]
+    assert len(incremental) == len(expected) > 0
+    z_cols = [f"{m}__z" for m in METRICS]
+    np.testing.assert_allclose(incremental[z_cols].to_numpy(), expected[z_cols].to_numpy(), rtol=1e-7, equal_nan=True)
+    assert set(engine.export_state()) == {("Viettel", "HNI_Agent_1", "HCM_Speedtest")}
+
+
+def test_only_touched_series_states_are_decoded(make_ping_df):
+    df = make_ping_df(24, servers=("Japan_Speedtest", "HCM_Speedtest"))
+    warm = IncrementalDetector("zscore", METRICS, 12)
+    warm.score(df[df["testing_time"] < df["testing_time"].iloc[12]])
+    states = SeriesStates({key: json.dumps(state) for key, state in warm.export_state().items()})
+
+    engine = IncrementalDetector("zscore", METRICS, 12, states=states)
+    engine.score(df[(df["server_name"] == "Japan_Speedtest") & (df["testing_time"] >= df["testing_time"].iloc[12])])
+    assert set(states._decoded) == {("Viettel", "HNI_Agent_1", "Japan_Speedtest")}
+    assert len(engine.export_state(changed_only=False)) == 2
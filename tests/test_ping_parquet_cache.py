@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from app.core.config import settings
+from app.repositories import ping_parquet_cache
+from app.repositories.ping_parquet_cache import fetch_ping_cached, partition_path
+
+
+def _patch_source(monkeypatch, tmp_path, source: dict) -> list:
+    """Thay Postgres bằng `source["data"]`; trả về list các lần fetch (from_time, to_time)."""
+    calls = []
+
+    def fake_fetch(db, aggregate_level, from_time, to_time=None, columns=None):
+        data = source["data"]
+        calls.append((pd.Timestamp(from_time), to_time))
+        mask = data["testing_time"] >= from_time
+        if to_time is not None:
+            mask &= data["testing_time"] < to_time
+        return data.loc[mask, columns or list(data.columns)].reset_index(drop=True)
+
+    def fake_count(db, aggregate_level, from_time, to_time):
+        source.setdefault("counts", []).append((from_time, to_time))
+        times = source["data"]["testing_time"]
+        times = times[(times >= from_time) & (times < to_time)]
+        return times.dt.floor("D").value_counts().to_dict()
+
+    monkeypatch.setattr(settings, "PING_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PING_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "PING_CACHE_REVALIDATE_DAYS", 2)
+    monkeypatch.setattr(ping_parquet_cache, "fetch_ping_columns", fake_fetch)
+    monkeypatch.setattr(ping_parquet_cache, "count_ping_rows_by_day", fake_count)
+    return calls
+
+
+@pytest.fixture
+def ping_df(make_ping_df):
+    df = make_ping_df(24 * 4)
+    for c in ["isp", "account_login_vqt", "server_name", "aggregate_level"]:
+        df[c] = df[c].astype("category")
+    return df
+
+
+def test_closed_days_are_served_from_parquet(monkeypatch, tmp_path, ping_df):
+    data = ping_df
+    calls = _patch_source(monkeypatch, tmp_path, {"data": data})
+    now = pd.Timestamp("2026-02-04 10:30")
+
+    first = fetch_ping_cached(None, "hour", "2026-02-01 12:00", now=now)
+    assert partition_path("hour", pd.Timestamp("2026-02-03")).exists()
+    assert not partition_path("hour", pd.Timestamp("2026-02-04")).exists()
+
+    calls.clear()
+    second = fetch_ping_cached(None, "hour", "2026-02-01 12:00", now=now)
+    # Lần 2 chỉ còn query partition đang mở
+    assert calls == [(pd.Timestamp("2026-02-04"), None)]
+
+    expected = data[data["testing_time"] >= "2026-02-01 12:00"].reset_index(drop=True)
+    for df in (first, second):
+        pd.testing.assert_frame_equal(
+            df.astype({c: str for c in ["isp", "account_login_vqt", "server_name", "aggregate_level"]}),
+            expected.astype({c: str for c in ["isp", "account_login_vqt", "server_name", "aggregate_level"]}),
+            check_dtype=False,
+        )
+    assert isinstance(second["isp"].dtype, pd.CategoricalDtype)
+
+    projected = fetch_ping_cached(
+        None, "hour", "2026-02-02", "2026-02-03", columns=["isp", "testing_time", "mean_jitter"], now=now
+    )
+    assert list(projected.columns) == ["isp", "testing_time", "mean_jitter"]
+    assert len(projected) == 24
+
+
+def test_late_rows_invalidate_closed_partition(monkeypatch, tmp_path, ping_df):
+    source = {"data": ping_df}
+    calls = _patch_source(monkeypatch, tmp_path, source)
+    now = pd.Timestamp("2026-02-04 10:30")
+    fetch_ping_cached(None, "hour", "2026-02-01", now=now)
+
+    # 1 dòng đến muộn cho ngày 02/02 (đã đóng và đã cache)
+    late = source["data"].iloc[[30]].assign(server_name="Singapore_Speedtest")
+    source["data"] = pd.concat([source["data"], late], ignore_index=True)
+
+    calls.clear()
+    df = fetch_ping_cached(None, "hour", "2026-02-01", now=now)
+    assert calls == [
+        (pd.Timestamp("2026-02-02"), pd.Timestamp("2026-02-03")),
+        (pd.Timestamp("2026-02-04"), None),
+    ]
+    assert len(df) == len(source["data"])
+    assert pq.read_metadata(partition_path("hour", pd.Timestamp("2026-02-02"))).num_rows == 25
+    # Chỉ 2 ngày đã đóng gần nhất được đếm lại, 01/02 không chạm tới Postgres
+    assert source["counts"][-1] == (pd.Timestamp("2026-02-02"), pd.Timestamp("2026-02-04"))
+
+
+def test_old_partitions_are_not_revalidated(monkeypatch, tmp_path, ping_df):
+    source = {"data": ping_df}
+    calls = _patch_source(monkeypatch, tmp_path, source)
+    now = pd.Timestamp("2026-02-06 10:30")
+    fetch_ping_cached(None, "hour", "2026-02-01", "2026-02-03", now=now)
+
+    calls.clear()
+    source["counts"] = []
+    fetch_ping_cached(None, "hour", "2026-02-01", "2026-02-03", now=now)
+    assert calls == [] and source["counts"] == []
+
+
+def test_columns_outside_partition_schema_bypass_cache(monkeypatch, tmp_path, ping_df):
+    source = {"data": ping_df.assign(extra=1.0)}
+    calls = _patch_source(monkeypatch, tmp_path, source)
+    now = pd.Timestamp("2026-02-04 10:30")
+    df = fetch_ping_cached(None, "hour", "2026-02-01", columns=["testing_time", "extra"], now=now)
+    assert calls == [(pd.Timestamp("2026-02-01"), None)]
+    assert list(df.columns) == ["testing_time", "extra"] and len(df) == len(ping_df)
+    assert not partition_path("hour", pd.Timestamp("2026-02-01")).exists()
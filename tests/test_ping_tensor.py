@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.ping_tensor import PingTensor, build_ping_tensor
+
+
+def _rows() -> pd.DataFrame:
+    return pd.DataFrame({
+        "isp": ["Viettel", "Viettel", "VNPT", "Viettel"],
+        "account_login_vqt": ["HNI_Agent_1"] * 4,
+        "server_name": ["Japan_Speedtest", "Japan_Speedtest", "Japan_Speedtest", "HCM_Speedtest"],
+        "testing_time": pd.to_datetime([
+            "2026-02-01 00:00", "2026-02-01 03:00", "2026-02-01 01:00", "2026-02-01 02:00",
+        ]),
+        "mean_jitter": [1.0, 2.0, 3.0, 4.0],
+        "mean_average_latency": [100.0, 110.0, 90.0, 20.0],
+        "mean_packet_loss_rate": [0.0, 0.5, None, 0.1],
+    })
+
+
+def test_build_ping_tensor_layout():
+    tensor = build_ping_tensor(_rows())
+
+    assert tensor.values.shape == (3, 4, 3)
+    assert tensor.values.dtype == np.float32
+    assert tensor.mask.sum() == 4
+    assert tensor.start == pd.Timestamp("2026-02-01 00:00")
+
+    s = tensor.series_index("Viettel", "HNI_Agent_1", "Japan_Speedtest")
+    latency = tensor.metric("mean_average_latency")[s]
+    np.testing.assert_array_equal(tensor.mask[s], [True, False, False, True])
+    np.testing.assert_allclose(latency[[0, 3]], [100.0, 110.0])
+    assert np.isnan(latency[1:3]).all()
+
+    vnpt = tensor.series_index("VNPT", "HNI_Agent_1", "Japan_Speedtest")
+    assert np.isnan(tensor.metric("mean_packet_loss_rate")[vnpt, 1])
+
+
+def test_ping_tensor_round_trip_to_frame():
+    rows = _rows()
+    frame = build_ping_tensor(rows).to_frame()
+    merged = frame.merge(rows, on=["isp", "account_login_vqt", "server_name", "testing_time"], suffixes=("", "_src"))
+    assert len(merged) == len(rows)
+    np.testing.assert_allclose(merged["mean_jitter"], merged["mean_jitter_src"])
+
+
+def test_build_ping_tensor_clips_to_range():
+    tensor = build_ping_tensor(_rows(), start="2026-02-01 01:00", end="2026-02-01 03:00")
+    assert tensor.n_hours == 2
+    assert tensor.mask.sum() == 2
+
+
+def test_gather_rows_maps_values_back_to_input_rows():
+    rows = _rows()
+    tensor = build_ping_tensor(rows, end="2026-02-01 03:00")
+    latency = tensor.gather_rows(tensor.metric("mean_average_latency"))
+    np.testing.assert_allclose(latency, [100.0, np.nan, 90.0, 20.0])
+
+
+def test_gather_rows_requires_row_mapping():
+    tensor = build_ping_tensor(_rows())
+    bare = PingTensor(
+        values=tensor.values, mask=tensor.mask, series_keys=tensor.series_keys,
+        start=tensor.start, metrics=tensor.metrics,
+    )
+    with pytest.raises(ValueError, match="no row mapping"):
+        bare.gather_rows(tensor.values)
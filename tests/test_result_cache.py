@@ -0,0 +1,104 @@
+from sqlalchemy import text
+
+from app.core.result_cache import LRUTTLCache, ResultCache
+from app.db.migrate_internet_kpi_indexes import CHANGE_INDEX_COLUMNS, index_statement
+from app.services import get_kpi_data
+from app.services.get_kpi_data import AggregateLevel
+from tests.helpers import FakeDB
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_ttl_cache_evicts_oldest_and_expires():
+    clock = FakeClock()
+    cache = LRUTTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a vừa dùng -> b là LRU
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    clock.now = 11
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+def test_result_cache_invalidates_on_new_watermark():
+    clock = FakeClock()
+    cache = ResultCache(LRUTTLCache(maxsize=16, ttl=3600, clock=clock), watermark_ttl=5, clock=clock)
+    db = FakeDB("2026-02-05-00")
+    loads = []
+
+    def load():
+        loads.append(1)
+        return [{"date_hour": db.watermark, "kpi_value": len(loads)}]
+
+    args = ("internet_kpi", "internet_kpi.internet_kpi_daily", {"kpi_code": "internet_latency"}, db, load)
+    first = cache.get_or_load(*args)
+    assert cache.get_or_load(*args) == first
+    assert len(loads) == 1 and cache.hits == 1
+    # Watermark được cache trong vài giây -> chỉ 1 query watermark
+    assert db.watermark_queries == 1
+
+    # Dữ liệu mới nhưng watermark cache chưa hết hạn -> vẫn trả kết quả cũ
+    db.watermark = "2026-02-06-00"
+    assert cache.get_or_load(*args) == first
+
+    clock.now = 6
+    refreshed = cache.get_or_load(*args)
+    assert refreshed == [{"date_hour": "2026-02-06-00", "kpi_value": 2}]
+    assert len(loads) == 2 and db.watermark_queries == 2
+
+    other = cache.get_or_load("internet_kpi", "internet_kpi.internet_kpi_daily", {"kpi_code": "internet_jitter"}, db, load)
+    assert other != refreshed and len(loads) == 3
+
+
+def test_disabled_cache_always_loads():
+    cache = ResultCache(LRUTTLCache(maxsize=16, ttl=3600), enabled=False)
+    db = FakeDB("2026-02-05-00")
+    assert cache.get_or_load("ns", "t", {}, db, lambda: [1]) == [1]
+    assert db.watermark_queries == 0
+
+
+def test_weekly_change_watermark_is_pinned_to_requested_key(monkeypatch):
+    monkeypatch.setattr(get_kpi_data, "result_cache", ResultCache(LRUTTLCache(maxsize=16, ttl=3600)))
+    db = FakeDB("W01-2026")
+    get_kpi_data.get_internet_kpi_change_data(AggregateLevel.weekly, "Viettel", "internet_latency", "W1-2026", db)
+
+    sql, params = db.queries[0]
+    assert sql.startswith("SELECT MAX(date_hour) FROM internet_kpi.internet_kpi_weekly_change")
+    assert "date_hour = :date_hour" in sql
+    assert params == {
+        "kpi_code": "internet_latency", "date_hour": "W01-2026", "isp": "Viettel", "location_level": "province",
+    }
+
+
+def test_weekly_change_watermark_across_year_boundary_uses_index(pg_db):
+    db = pg_db
+    table = "pg_temp.internet_kpi_weekly_change"
+    cache = ResultCache(LRUTTLCache(maxsize=16, ttl=3600), watermark_ttl=0)
+    db.execute(text("""
+        CREATE TEMP TABLE internet_kpi_weekly_change AS
+        SELECT 'internet_kpi_' || (g % 50) AS kpi_code, 'Viettel' AS isp, 'province' AS location_level,
+               'W' || lpad((g % 52 + 1)::text, 2, '0') || '-2025' AS date_hour
+        FROM generate_series(1, 50000) g
+    """))
+    db.execute(text(index_statement(table, CHANGE_INDEX_COLUMNS, concurrently=False)))
+    db.execute(text(f"ANALYZE {table}"))
+
+    filters = {"kpi_code": "internet_kpi_1", "isp": "Viettel", "location_level": "province", "date_hour": "W01-2026"}
+    assert cache.watermark(db, table, filters) is None
+    db.execute(text(f"INSERT INTO {table} VALUES ('internet_kpi_1', 'Viettel', 'province', 'W01-2026')"))
+    # Tuần đầu năm mới: watermark đổi dù 'W01-2026' < 'W52-2025' theo chuỗi
+    assert cache.watermark(db, table, filters) == "W01-2026"
+
+    where = " AND ".join(f"{c} = :{c}" for c in filters)
+    plan = "\n".join(r[0] for r in db.execute(text(f"EXPLAIN SELECT MAX(date_hour) FROM {table} WHERE {where}"), filters))
+    assert "Seq Scan" not in plan
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from app.services.parallel_detection import grouped_rolling_stats
+from app.services.rolling_stats import RollingMedianWindow, rolling_median_mad
+
+
+def _pandas_median_mad(x: pd.Series, window: int, min_periods: int):
+    rolling = x.rolling(window=window, min_periods=min_periods)
+    med = rolling.median()
+    mad = rolling.apply(lambda v: np.nanmedian(np.abs(v - np.nanmedian(v))), raw=True)
+    return med.to_numpy(), mad.to_numpy()
+
+
+def test_rolling_median_mad_matches_pandas():
+    rng = np.random.default_rng(0)
+    x = pd.Series(rng.normal(100, 10, 500).round(1))  # round -> nhiều giá trị trùng nhau
+    for window in (1, 2, 5, 24, 72):
+        med, mad = rolling_median_mad(x.to_numpy(), window)
+        exp_med, exp_mad = _pandas_median_mad(x, window, window)
+        np.testing.assert_allclose(med, exp_med, equal_nan=True)
+        np.testing.assert_allclose(mad, exp_mad, equal_nan=True)
+
+
+def test_rolling_median_mad_handles_nan_and_min_periods():
+    rng = np.random.default_rng(1)
+    values = rng.normal(0, 1, 300)
+    values[rng.choice(300, 60, replace=False)] = np.nan
+    x = pd.Series(values)
+
+    med, mad = rolling_median_mad(values, window=20, min_periods=5)
+    exp_med, exp_mad = _pandas_median_mad(x, 20, 5)
+    np.testing.assert_allclose(med, exp_med, equal_nan=True)
+    np.testing.assert_allclose(mad, exp_mad, equal_nan=True)
+
+    # min_periods = window: bất kỳ NaN nào trong window -> NaN (giống pandas)
+    med, _ = rolling_median_mad(values, window=20)
+    exp_med, _ = _pandas_median_mad(x, 20, 20)
+    np.testing.assert_allclose(med, exp_med, equal_nan=True)
+
+
+def test_window_state_counts_valid_points():
+    win = RollingMedianWindow(window=3, min_periods=1)
+    for v in (1.0, np.nan, 5.0, 7.0):
+        win.push(v)
+    assert len(win) == 3
+    assert win.count == 2
+    assert win.median() == 6.0
+    assert win.mad() == 1.0
+
+
+def test_grouped_rolling_median_mad_excludes_current_point():
+    df = pd.DataFrame({
+        "server_name": ["a"] * 6 + ["b"] * 6,
+        "value": [1, 2, 3, 4, 5, 6, 10, 20, 30, 40, 50, 60],
+    })
+    codes = df.groupby("server_name", sort=False).ngroup().to_numpy()
+    medians, mads = grouped_rolling_stats(df[["value"]].to_numpy(dtype=float), codes, "median_mad", window=3)
+
+    grouped = df.groupby("server_name")["value"]
+    exp_med = grouped.transform(lambda s: s.shift(1).rolling(3).median())
+    exp_mad = grouped.transform(
+        lambda s: s.shift(1).rolling(3).apply(lambda v: np.median(np.abs(v - np.median(v))), raw=True)
+    )
+    np.testing.assert_allclose(medians[:, 0], exp_med, equal_nan=True)
+    np.testing.assert_allclose(mads[:, 0], exp_mad, equal_nan=True)
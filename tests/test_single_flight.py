@@ -0,0 +1,45 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core.single_flight import SingleFlight, query_key
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def query():
+        calls.append(1)
+        release.wait(timeout=5)
+        return ["row"]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, "kpi:latency", query) for _ in range(8)]
+        # Chờ tất cả caller vào hàng đợi rồi mới cho query chạy xong
+        while flight.stats()["coalesced"] < 7:
+            time.sleep(0.001)
+        release.set()
+        results = [f.result(timeout=5) for f in futures]
+
+    assert calls == [1]
+    assert all(r == ["row"] for r in results)
+    assert flight.stats() == {"executed": 1, "coalesced": 7, "in_flight": 0}
+
+    # Query đã xong -> lần gọi sau chạy lại (không cache kết quả)
+    assert flight.do("kpi:latency", lambda: ["new"]) == ["new"]
+    assert flight.stats()["executed"] == 2
+
+
+def test_errors_are_shared_and_key_is_released():
+    flight = SingleFlight()
+    with pytest.raises(RuntimeError):
+        flight.do("k", lambda: (_ for _ in ()).throw(RuntimeError("db down")))
+    assert flight.do("k", lambda: 1) == 1
+
+
+def test_query_key_is_order_independent():
+    assert query_key("t", {"a": 1, "b": 2}) == query_key("t", {"b": 2, "a": 1})
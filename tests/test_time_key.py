@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app.db.migrate_internet_kpi_indexes import KPI_INDEX_COLUMNS, index_statement
+from app.services import get_kpi_data
+from app.services.get_kpi_data import AggregateLevel, internet_kpi_batch_query, internet_kpi_query
+from app.services.time_key import date_hour_bounds, date_hour_filter, normalize_key, parse_time_limit, uses_week_key
+
+
+def test_parse_time_limit_formats():
+    assert parse_time_limit("2026-02-05-07") == datetime(2026, 2, 5, 7)
+    assert parse_time_limit("2026-2-5") == datetime(2026, 2, 5)
+    # ISO week -> thứ 2 đầu tuần
+    assert parse_time_limit("W06-2026") == datetime(2026, 2, 2)
+    assert parse_time_limit("2026-03") == datetime(2026, 3, 1)
+    with pytest.raises(ValueError):
+        parse_time_limit("05/02/2026")
+
+
+def test_date_hour_bounds_match_interval_arithmetic():
+    assert date_hour_bounds(AggregateLevel.daily, "2026-02-05-07", 8) == ("2026-01-28-07", "2026-02-05-07")
+    assert date_hour_bounds(AggregateLevel.weekly, "2026-02-02-00", 2) == ("2026-01-19-00", "2026-02-02-00")
+    # Giống Postgres: '2026-03-31' - interval '1 month' = '2026-02-28'
+    assert date_hour_bounds(AggregateLevel.monthly, "2026-03-31-00", 1) == ("2026-02-28-00", "2026-03-31-00")
+    now = datetime(2026, 2, 6, 13, 45)
+    assert date_hour_bounds(AggregateLevel.daily, None, 1, now=now) == ("2026-02-05-00", "2026-02-06-00")
+
+
+@pytest.mark.parametrize("level", list(AggregateLevel))
+def test_kpi_tables_filter_on_date_hour_range(level):
+    # Bảng internet_kpi_* ở mọi level lưu 'YYYY-MM-DD-HH' -> range trên index
+    assert not uses_week_key(level)
+    sql, params = internet_kpi_query(level, "internet_latency", "network", 2, "2026-02-02-00")
+    assert "date_hour >= :from_key AND date_hour <= :to_key" in sql.text
+    assert "to_timestamp" not in sql.text
+    assert (params["from_key"], params["to_key"]) == date_hour_bounds(level, "2026-02-02-00", 2)
+    assert all(len(k) == 13 for k in (params["from_key"], params["to_key"]))
+
+    sql, params = internet_kpi_batch_query(level, ["b", "a"], ["network"], 2, "W06-2026")
+    assert "date_hour >= :from_key AND date_hour <= :to_key" in sql.text
+    assert params["to_key"] == "2026-02-02-00" and params["kpi_codes"] == ["a", "b"]
+
+
+def test_weekly_change_keys_use_iso_week_list():
+    assert uses_week_key(AggregateLevel.weekly, change=True)
+    assert not uses_week_key(AggregateLevel.daily, change=True)
+    assert not uses_week_key(AggregateLevel.monthly, change=True)
+
+    # Qua ranh giới năm: danh sách key theo thời gian, không phải range chuỗi
+    sql, params = date_hour_filter(AggregateLevel.weekly, "W02-2026", 3, change=True)
+    assert sql == "date_hour = ANY(:period_keys)"
+    assert params == {"period_keys": ["W51-2025", "W52-2025", "W01-2026", "W02-2026"]}
+
+    sql, params = date_hour_filter(AggregateLevel.daily, "2026-01-01-00", 1, change=True)
+    assert params == {"from_key": "2025-12-31-00", "to_key": "2026-01-01-00"}
+
+
+def test_normalize_key_per_level():
+    assert normalize_key(AggregateLevel.weekly, "W6-2026", change=True) == "W06-2026"
+    assert normalize_key(AggregateLevel.weekly, "2026-02-04", change=True) == "W06-2026"
+    assert normalize_key(AggregateLevel.daily, "2026-1-20", change=True) == "2026-01-20-00"
+    assert normalize_key(AggregateLevel.monthly, "2026-03", change=True) == "2026-03-01-00"
+    assert normalize_key(AggregateLevel.daily, "garbage", change=True) == "garbage"
+
+
+def test_internet_kpi_query_uses_index_range_scan(pg_db, monkeypatch):
+    db = pg_db
+    db.execute(text("""
+        CREATE TEMP TABLE internet_kpi_daily AS
+        SELECT 'internet_kpi_' || (g % 20) AS kpi_code,
+               (ARRAY['network', 'area', 'province'])[g % 3 + 1] AS location_level,
+               to_char(timestamp '2024-01-01' + (g / 60) * interval '1 hour', 'YYYY-MM-DD-HH24') AS date_hour,
+               random() AS kpi_value
+        FROM generate_series(1, 200000) g
+    """))
+    db.execute(text(index_statement("pg_temp.internet_kpi_daily", KPI_INDEX_COLUMNS, concurrently=False)))
+    db.execute(text("ANALYZE pg_temp.internet_kpi_daily"))
+    monkeypatch.setitem(get_kpi_data.INTERNET_KPI_TABLES, AggregateLevel.daily, "pg_temp.internet_kpi_daily")
+
+    sql, params = internet_kpi_query(AggregateLevel.daily, "internet_kpi_3", "network", 8, "2024-03-01-00")
+    plan = "\n".join(r[0] for r in db.execute(text(f"EXPLAIN {sql.text}"), params))
+
+    assert "Seq Scan" not in plan
+    assert "ix_internet_kpi_daily_kpi_loc_dat" in plan
+    assert "date_hour >=" in plan  # cận thời gian nằm trong Index Cond, không phải Filter
+
+    rows = db.execute(sql, params).mappings().all()
+    assert rows and all("2024-02-22-00" <= r["date_hour"] <= "2024-03-01-00" for r in rows)
+    assert [r["date_hour"] for r in rows] == sorted((r["date_hour"] for r in rows), reverse=True)
@@ -0,0 +1,125 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.repositories import ping_results_repo
+from app.services.anomaly_engine import METRICS, ZScoreScorer, prepare_series
+
+
+def _with_gaps_and_spikes(df: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """Mỗi agent: 3 điểm latency tăng vọt ở cuối, 1 jitter NULL và 5 giờ thiếu dữ liệu."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _, g in df.groupby("account_login_vqt", sort=False):
+        g = g.reset_index(drop=True)
+        hours = len(g)
+        g.loc[rng.choice(np.arange(80, hours), 3, replace=False), "mean_average_latency"] = 300.0
+        g.loc[10, "mean_jitter"] = np.nan
+        frames.append(g.drop(index=rng.choice(hours, 5, replace=False).tolist()))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_sql_backend_matches_pandas(ping_db, insert_ping_rows, make_ping_df):
+    db = ping_db
+    insert_ping_rows(_with_gaps_and_spikes(
+        make_ping_df(120, agents=("HNI_Agent_1", "HCM_Agent_2", "DNG_Agent_3"), decimals=4)
+    ))
+
+    from_time = pd.Timestamp("2026-02-01 12:00")
+    scorer = ZScoreScorer(window=48, threshold=3)
+
+    fetched = ping_results_repo.fetch_ping_data(db, "hour", from_time)
+    expected = scorer.detect(prepare_series(fetched))
+    actual = scorer.detect_sql(db, "hour", from_time)
+
+    assert len(expected) > 0
+    keys = ["account_login_vqt", "testing_time"]
+    expected = expected.sort_values(keys).reset_index(drop=True)
+    actual = actual.sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(actual[keys], expected[keys])
+    for m in METRICS:
+        for col in (f"{m}__z", f"{m}__mean_hist"):
+            np.testing.assert_allclose(
+                actual[col].astype(float), expected[col].astype(float), rtol=1e-6, equal_nan=True
+            )
+
+
+
+# SQLite không có STDDEV_POP: viết lại bằng sqrt(E[x^2] - E[x]^2) trên cùng window (math function có sẵn)
+_STDDEV_POP = re.compile(r"STDDEV_POP\((\w+)\) OVER w")
+
+
+class SQLiteSession:
+    """Chạy SQL do fetch_zscore_anomalies sinh ra trên SQLite in-memory, ghi lại SQL / params gốc."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.engine = create_engine("sqlite://")
+        df.assign(testing_time=df["testing_time"].dt.strftime("%Y-%m-%d %H:%M:%S")).to_sql(
+            "ping_results_aggregate", self.engine, index=False
+        )
+        self.conn = self.engine.connect()
+        self.sql, self.params = "", {}
+
+    def execute(self, sql, params=None):
+        self.sql, self.params = str(sql), params or {}
+        bound = {
+            k: v.strftime("%Y-%m-%d %H:%M:%S") if isinstance(v, pd.Timestamp) else v for k, v in self.params.items()
+        }
+        sql = _STDDEV_POP.sub(
+            r"sqrt(MAX(AVG(\1 * \1) OVER w - AVG(\1) OVER w * AVG(\1) OVER w, 0))", self.sql.replace("::float8", "")
+        )
+        return self.conn.execute(text(sql), bound)
+
+
+def test_generated_window_sql_gates_on_window_and_guards_zero_std(monkeypatch):
+    monkeypatch.setattr(ping_results_repo, "PING_TABLE", "ping_results_aggregate")
+    series = pd.DataFrame({
+        "isp": "Viettel",
+        "account_login_vqt": "HNI_Agent_1",
+        "server_name": "Japan_Speedtest",
+        "aggregate_level": "hour",
+        "testing_time": pd.date_range("2026-02-01", periods=8, freq="h"),
+        "sample_count": 45,
+        # 1 spike ở dòng 1 (chưa đủ window -> bỏ qua), 4 giá trị hằng (std = 0) rồi 1 bước nhảy
+        "mean_average_latency": [100.0, 500.0, 100.0, 100.0, 100.0, 100.0, 130.0, 100.0],
+    })
+    db = SQLiteSession(series)
+
+    result = ping_results_repo.fetch_zscore_anomalies(
+        db, "hour", pd.Timestamp("2026-02-01"), window=3, threshold=3, metrics=["mean_average_latency"],
+        to_time=pd.Timestamp("2026-02-01 07:00"),
+    )
+
+    assert "ROWS BETWEEN 3 PRECEDING AND 1 PRECEDING" in db.sql
+    assert 'CASE WHEN "mean_average_latency__n" = 3' in db.sql
+    assert 'CASE WHEN "mean_average_latency__std" = 0 THEN 1e-9' in db.sql
+    assert "testing_time < :to_time" in db.sql and db.params["threshold"] == 3
+    # Dòng 1 (500) chỉ có 1 giá trị trước -> z NULL; dòng 6 có window hằng 100 -> (130 - 100) / 1e-9;
+    # dòng 7 nằm ngoài to_time
+    assert result["testing_time"].astype(str).tolist() == ["2026-02-01 06:00:00"]
+    assert result.loc[0, "mean_average_latency__z"] == pytest.approx(30 / 1e-9)
+    assert result.loc[0, "mean_average_latency__mean_hist"] == 100
+
+
+def test_sql_window_matches_pandas_without_postgres(monkeypatch, make_ping_df):
+    monkeypatch.setattr(ping_results_repo, "PING_TABLE", "ping_results_aggregate")
+    data = _with_gaps_and_spikes(make_ping_df(120, agents=("HNI_Agent_1", "HCM_Agent_2"), decimals=4))
+    db = SQLiteSession(data)
+    from_time = pd.Timestamp("2026-02-01 12:00")
+    scorer = ZScoreScorer(window=48, threshold=3)
+
+    actual = scorer.detect_sql(db, "hour", from_time)
+    expected = scorer.detect(prepare_series(data[data["testing_time"] >= from_time].copy()))
+
+    assert len(expected) > 0
+    keys = ["account_login_vqt", "testing_time"]
+    expected = expected.sort_values(keys).reset_index(drop=True)
+    actual = actual.sort_values(keys).reset_index(drop=True)
+    assert actual["testing_time"].astype(str).tolist() == expected["testing_time"].astype(str).tolist()
+    for m in METRICS:
+        np.testing.assert_allclose(
+            actual[f"{m}__z"].astype(float), expected[f"{m}__z"].astype(float), rtol=1e-6, equal_nan=True
+        )